@@ -0,0 +1,606 @@
+# backend/alert_store.py
+"""设备提醒存储
+
+AlertStore：进程内存储，有界、带索引、线程安全。
+每个提醒键（如 data_abnormal_D001_I001）对应一个定长环形缓冲区，只保留最近的若干条；
+全局按时间顺序维护一个索引，用于按存活时间淘汰和超出总量上限时淘汰最旧的提醒；
+另外按设备ID和提醒类型建立二级索引，查询时不再遍历全部提醒键。
+每个键记录最近一条未处理提醒的时间，去重检查只需一次字典查找。
+
+TableAlertStore：多个工作进程共享的存储，提醒保存在数据库表中（也可以用本机
+SQLite 文件作为替身）。新增提醒先进入内存缓冲区，由后台线程成批写入，
+数据接入路径不等待写库；处理、清除提醒直接写库，对所有工作进程立即生效。
+
+两种存储都维护一个单调递增的版本号，每次新增、处理、清除提醒后递增，
+changes_since(version) 只返回该版本之后变化的提醒，前端据此轮询。
+add_listener 注册的回调在本进程新增、处理、清除提醒后调用，用于实时推送。
+"""
+import json
+import logging
+import threading
+import time
+from collections import deque, defaultdict, namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine
+
+logger = logging.getLogger(__name__)
+
+ALERT_VERSION_NAME = 'alerts'
+
+# changes_since 一次最多返回的提醒条数，超过时要求调用方整体重新加载
+MAX_CHANGES = 500
+
+_Entry = namedtuple('_Entry', ['seq', 'timestamp', 'alert'])
+
+
+class AlertListeners:
+    """提醒变化回调：kind 为 added（payload 为提醒）、handled（payload 含 alert_key）或 cleared"""
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _notify(self, kind, payload):
+        for callback in list(self._listeners):
+            try:
+                callback(kind, payload)
+            except Exception as e:
+                logger.error(f"提醒变化回调失败: {str(e)}")
+
+
+class AlertStore(AlertListeners):
+    """设备提醒存储（线程安全）"""
+
+    def __init__(self, per_key_limit=50, ttl=24 * 3600, max_alerts=10000, dedupe_window=30 * 60,
+                 clock=time.time):
+        # per_key_limit：每个提醒键最多保留的条数；ttl：提醒存活秒数；
+        # max_alerts：全部提醒的总量上限；dedupe_window：相同未处理提醒的去重窗口（秒）
+        self.per_key_limit = per_key_limit
+        self.ttl = ttl
+        self.max_alerts = max_alerts
+        self.dedupe_window = dedupe_window
+        self._clock = clock
+
+        self._lock = threading.RLock()
+        self._seq = 0
+        self._size = 0
+        self._rings = {}                      # 提醒键 -> deque[_Entry]
+        self._time_index = deque()            # (时间戳, 序号, 提醒键)，按时间顺序
+        self._by_device = defaultdict(set)    # 设备ID -> 提醒键集合
+        self._by_type = defaultdict(set)      # 提醒类型 -> 提醒键集合
+        self._key_meta = {}                   # 提醒键 -> (设备ID, 提醒类型)
+        self._last_unhandled = {}             # 提醒键 -> 最近一条未处理提醒的时间戳
+        self._version = 0
+        self._reset_version = 0               # 最近一次 clear() 时的版本号
+        self._listeners = []
+
+    # ---------- 写入 ----------
+    def should_create(self, alert_key):
+        """去重窗口内没有未处理的相同提醒时返回 True"""
+        with self._lock:
+            last = self._last_unhandled.get(alert_key)
+            return last is None or self._clock() - last >= self.dedupe_window
+
+    def add(self, alert_key, alert):
+        """添加一条提醒（自动填写时间），返回保存的提醒副本"""
+        with self._lock:
+            now = self._clock()
+            self._evict_expired(now)
+
+            alert = dict(alert)
+            alert['time'] = datetime.fromtimestamp(now).isoformat()
+            alert.setdefault('handled', False)
+            self._version += 1
+            alert['version'] = self._version
+
+            ring = self._rings.get(alert_key)
+            if ring is None:
+                ring = self._rings[alert_key] = deque()
+                meta = (alert.get('device_id'), alert.get('alert_type'))
+                self._key_meta[alert_key] = meta
+                if meta[0]:
+                    self._by_device[meta[0]].add(alert_key)
+                if meta[1]:
+                    self._by_type[meta[1]].add(alert_key)
+
+            if len(ring) >= self.per_key_limit:
+                ring.popleft()
+                self._size -= 1
+
+            self._seq += 1
+            ring.append(_Entry(self._seq, now, alert))
+            self._time_index.append((now, self._seq, alert_key))
+            self._size += 1
+            self._last_unhandled[alert_key] = now
+
+            while self._size > self.max_alerts:
+                self._evict_oldest()
+            if len(self._time_index) > 2 * self.max_alerts:
+                self._compact_index()
+            saved = dict(alert, alert_key=alert_key)
+        self._notify('added', saved)
+        return saved
+
+    def mark_handled(self, alert_key):
+        """把某个提醒键下的全部提醒标记为已处理，键不存在时返回 False"""
+        with self._lock:
+            ring = self._rings.get(alert_key)
+            if ring is None:
+                return False
+            self._version += 1
+            for entry in ring:
+                if not entry.alert.get('handled'):
+                    entry.alert['handled'] = True
+                    entry.alert['version'] = self._version
+            self._last_unhandled.pop(alert_key, None)
+        self._notify('handled', {'alert_key': alert_key})
+        return True
+
+    def clear(self):
+        with self._lock:
+            self._version += 1
+            self._reset_version = self._version
+            self._rings.clear()
+            self._time_index.clear()
+            self._by_device.clear()
+            self._by_type.clear()
+            self._key_meta.clear()
+            self._last_unhandled.clear()
+            self._size = 0
+        self._notify('cleared', {})
+
+    def flush(self):
+        """进程内存储没有待写入的数据"""
+
+    @property
+    def version(self):
+        return self._version
+
+    def __contains__(self, alert_key):
+        with self._lock:
+            return alert_key in self._rings
+
+    def __len__(self):
+        return self._size
+
+    # ---------- 查询 ----------
+    def query(self, device_id=None, alert_type=None, since=None, include_handled=False, per_key=None):
+        """按设备和类型查询提醒，返回按时间倒序排列的副本列表
+
+        since：只返回该时间戳之后的提醒；per_key：每个提醒键最多取最近几条
+        """
+        with self._lock:
+            self._evict_expired(self._clock())
+            if device_id and alert_type:
+                keys = self._by_device.get(device_id, set()) & self._by_type.get(alert_type, set())
+            elif device_id:
+                keys = self._by_device.get(device_id, ())
+            elif alert_type:
+                keys = self._by_type.get(alert_type, ())
+            else:
+                keys = self._rings.keys()
+
+            result = []
+            for key in keys:
+                entries = self._rings[key]
+                if per_key:
+                    entries = list(entries)[-per_key:]
+                for entry in entries:
+                    if since is not None and entry.timestamp < since:
+                        continue
+                    if not include_handled and entry.alert.get('handled'):
+                        continue
+                    result.append((entry.timestamp, entry.seq, dict(entry.alert, alert_key=key)))
+
+        result.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [item[2] for item in result]
+
+    def changes_since(self, version, limit=MAX_CHANGES):
+        """返回版本号大于 version 的提醒
+
+        reset 为真时调用方应丢弃本地数据，重新查询全部提醒
+        （提醒已被整体清除，或变化条数超过 limit）。
+        """
+        with self._lock:
+            current = self._version
+            if version == current:
+                return {'version': current, 'changed': False, 'reset': False, 'alerts': []}
+            if version > current or version < self._reset_version:
+                return {'version': current, 'changed': True, 'reset': True, 'alerts': []}
+            changed = [
+                (entry.alert['version'], dict(entry.alert, alert_key=key))
+                for key, ring in self._rings.items() for entry in ring
+                if entry.alert['version'] > version
+            ]
+        changed.sort(key=lambda item: item[0])
+        reset = len(changed) > limit
+        return {'version': current, 'changed': True, 'reset': reset,
+                'alerts': [] if reset else [item[1] for item in changed]}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'memory',
+                'version': self._version,
+                'alerts': self._size,
+                'keys': len(self._rings),
+                'unhandled_keys': len(self._last_unhandled),
+                'index_size': len(self._time_index),
+                'max_alerts': self.max_alerts,
+                'per_key_limit': self.per_key_limit,
+                'ttl_seconds': self.ttl
+            }
+
+    # ---------- 淘汰（调用方持有锁） ----------
+    def _evict_expired(self, now):
+        cutoff = now - self.ttl
+        while self._time_index and self._time_index[0][0] < cutoff:
+            self._evict_oldest()
+
+    def _evict_oldest(self):
+        _, seq, key = self._time_index.popleft()
+        ring = self._rings.get(key)
+        # 环形缓冲区溢出时已经丢弃的提醒，在索引中会被跳过
+        if ring and ring[0].seq == seq:
+            ring.popleft()
+            self._size -= 1
+            if not ring:
+                self._drop_key(key)
+
+    def _drop_key(self, key):
+        del self._rings[key]
+        device_id, alert_type = self._key_meta.pop(key)
+        for index, value in ((self._by_device, device_id), (self._by_type, alert_type)):
+            if value and value in index:
+                index[value].discard(key)
+                if not index[value]:
+                    del index[value]
+        self._last_unhandled.pop(key, None)
+
+    def _compact_index(self):
+        """去掉索引中已被环形缓冲区丢弃的条目"""
+        live = {entry.seq for ring in self._rings.values() for entry in ring}
+        self._time_index = deque(item for item in self._time_index if item[1] in live)
+
+
+class TableAlertStore(AlertListeners):
+    """数据库表中的共享提醒存储（线程安全，多进程共享）"""
+
+    def __init__(self, engine_getter, alert_table, version_table, ttl=24 * 3600, dedupe_window=30 * 60, batch_size=200, flush_interval=0.5, max_pending=10000,
+                 check_interval=1.0, create_tables=False):
+        # alert_table：device_alert 表；version_table：data_version 表（版本号记在 name='alerts' 一行）
+        # create_tables：使用独立的 SQLite 文件时由本类建表
+        self._engine_getter = engine_getter
+        self.alert_table = alert_table
+        self.version_table = version_table
+        self.ttl = ttl
+        self.dedupe_window = dedupe_window
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self.check_interval = check_interval
+        self._create_tables = create_tables
+
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._schema_ready = not create_tables
+
+        self._pending = deque()       # 尚未写库的提醒 (提醒键, 提醒, 时间)
+        self._last_unhandled = {}     # 提醒键 -> 最近一条未处理提醒的时间戳（来自数据库和本进程新增）
+        self._version = None          # 本进程最近一次读到的版本号
+        self._last_check = 0.0
+        self._query_cache = {}        # (设备ID, 提醒类型, 是否包含已处理) -> (版本号, 行列表)
+        self._last_purge = 0.0
+
+        self._flushed = 0
+        self._dropped = 0
+        self._failed_flushes = 0
+        self._listeners = []
+
+    # ---------- 写入 ----------
+    def should_create(self, alert_key):
+        """去重窗口内没有未处理的相同提醒时返回 True（其他进程的提醒按检查间隔同步）"""
+        self._refresh_if_changed()
+        with self._lock:
+            last = self._last_unhandled.get(alert_key)
+            return last is None or time.time() - last >= self.dedupe_window
+
+    def add(self, alert_key, alert):
+        """放入写入缓冲区后立即返回，由后台线程成批写库"""
+        now = time.time()
+        alert = dict(alert)
+        alert['time'] = datetime.fromtimestamp(now).isoformat()
+        alert['handled'] = False
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                self._pending.popleft()
+                self._dropped += 1
+                logger.warning("提醒写入缓冲区已满，丢弃最旧的一条提醒")
+            self._pending.append((alert_key, alert, now))
+            self._last_unhandled[alert_key] = now
+            self._ensure_started()
+            if len(self._pending) >= self.batch_size:
+                self._wakeup.set()
+        saved = dict(alert, alert_key=alert_key)
+        self._notify('added', saved)
+        return saved
+
+    def mark_handled(self, alert_key):
+        """把某个提醒键下的全部提醒标记为已处理，键不存在时返回 False"""
+        self.flush()
+        c = self.alert_table.c
+        with self._engine().begin() as conn:
+            exists = conn.execute(
+                self.alert_table.select().with_only_columns(c.alert_id).where(c.alert_key == alert_key).limit(1)
+            ).first()
+            if not exists:
+                return False
+            version = self._bump_version(conn)
+            conn.execute(
+                self.alert_table.update().where(c.alert_key == alert_key, c.handled == False)  # noqa: E712
+                .values(handled=True, handled_at=datetime.now(), version=version)
+            )
+        with self._lock:
+            self._last_unhandled.pop(alert_key, None)
+        self._invalidate()
+        self._notify('handled', {'alert_key': alert_key})
+        return True
+
+    def clear(self):
+        """所有提醒标记为已处理（保留记录，其他进程通过 changes_since 获知）"""
+        self.flush()
+        c = self.alert_table.c
+        with self._engine().begin() as conn:
+            version = self._bump_version(conn)
+            conn.execute(
+                self.alert_table.update().where(c.handled == False)  # noqa: E712
+                .values(handled=True, handled_at=datetime.now(), version=version)
+            )
+        with self._lock:
+            self._last_unhandled.clear()
+        self._invalidate()
+        self._notify('cleared', {})
+
+    def flush(self):
+        """把缓冲区中的提醒写入数据库"""
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+                if not batch:
+                    return
+                rows = [{
+                    'alert_key': key,
+                    'device_id': alert.get('device_id'),
+                    'indicator_id': alert.get('indicator_id'),
+                    'alert_type': alert.get('alert_type'),
+                    'message': (alert.get('message') or '')[:500],
+                    'payload': json.dumps(alert, ensure_ascii=False, default=str),
+                    'handled': False,
+                    'created_at': datetime.fromtimestamp(created),
+                } for key, alert, created in batch]
+                with self._engine().begin() as conn:
+                    version = self._bump_version(conn)
+                    for row in rows:
+                        row['version'] = version
+                    conn.execute(self.alert_table.insert(), rows)
+                with self._lock:
+                    for _ in batch:
+                        self._pending.popleft()
+                    self._flushed += len(batch)
+                self._invalidate()
+
+    # ---------- 后台写入线程 ----------
+    def _ensure_started(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='alert-writer', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            try:
+                self.flush()
+                self._purge_expired()
+            except Exception as e:
+                with self._lock:
+                    self._failed_flushes += 1
+                logger.error(f"提醒写入数据库失败，稍后重试: {str(e)}")
+                time.sleep(min(30.0, self.flush_interval * 4))
+
+    def _purge_expired(self):
+        """定期删除超过存活时间的提醒"""
+        if time.monotonic() - self._last_purge < 600:
+            return
+        self._last_purge = time.monotonic()
+        cutoff = datetime.now() - timedelta(seconds=self.ttl)
+        with self._engine().begin() as conn:
+            deleted = conn.execute(
+                self.alert_table.delete().where(self.alert_table.c.created_at < cutoff)
+            ).rowcount
+        if deleted:
+            logger.info(f"已删除 {deleted} 条过期提醒")
+
+    # ---------- 查询 ----------
+    def query(self, device_id=None, alert_type=None, since=None, include_handled=False, per_key=None):
+        """按设备和类型查询提醒，返回按时间倒序排列的列表（包含尚未写库的提醒）
+
+        数据库结果按版本号缓存，版本号不变时不重复查询。
+        """
+        version = self._refresh_if_changed()
+        cache_key = (device_id, alert_type, include_handled)
+        with self._lock:
+            cached = self._query_cache.get(cache_key)
+            pending = list(self._pending)
+        if cached and cached[0] == version:
+            rows = cached[1]
+        else:
+            rows = self._load_rows(device_id, alert_type, include_handled)
+            with self._lock:
+                self._query_cache[cache_key] = (version, rows)
+
+        items = [(ts, alert_id, key, alert) for ts, alert_id, key, alert in rows]
+        for key, alert, created in pending:
+            if device_id and alert.get('device_id') != device_id:
+                continue
+            if alert_type and alert.get('alert_type') != alert_type:
+                continue
+            items.append((created, float('inf'), key, alert))
+
+        if per_key:
+            latest = defaultdict(list)
+            for item in sorted(items, key=lambda item: (item[0], item[1]), reverse=True):
+                if len(latest[item[2]]) < per_key:
+                    latest[item[2]].append(item)
+            items = [item for group in latest.values() for item in group]
+
+        cutoff = time.time() - self.ttl
+        result = [
+            (ts, alert_id, dict(alert, alert_key=key)) for ts, alert_id, key, alert in items
+            if ts >= cutoff and (since is None or ts >= since)
+        ]
+        result.sort(key=lambda item: (item[0], item[1]), reverse=True)
+        return [item[2] for item in result]
+
+    def _load_rows(self, device_id, alert_type, include_handled):
+        c = self.alert_table.c
+        query = self.alert_table.select().where(
+            c.created_at >= datetime.now() - timedelta(seconds=self.ttl)
+        )
+        if device_id:
+            query = query.where(c.device_id == device_id)
+        if alert_type:
+            query = query.where(c.alert_type == alert_type)
+        if not include_handled:
+            query = query.where(c.handled == False)  # noqa: E712
+        with self._engine().connect() as conn:
+            return [
+                (row.created_at.timestamp(), row.alert_id, row.alert_key, self._row_to_alert(row))
+                for row in conn.execute(query)
+            ]
+
+    @staticmethod
+    def _row_to_alert(row):
+        alert = json.loads(row.payload) if row.payload else {}
+        alert.update({
+            'alert_id': row.alert_id,
+            'time': row.created_at.isoformat(),
+            'handled': bool(row.handled),
+            'version': row.version
+        })
+        return alert
+
+    def changes_since(self, version, limit=MAX_CHANGES):
+        """返回版本号大于 version 的提醒；版本号未变化时只执行一次主键查询"""
+        with self._engine().connect() as conn:
+            current = self._read_version(conn)
+            if version == current:
+                return {'version': current, 'changed': False, 'reset': False, 'alerts': []}
+            if version > current:
+                return {'version': current, 'changed': True, 'reset': True, 'alerts': []}
+            c = self.alert_table.c
+            rows = conn.execute(
+                self.alert_table.select().where(c.version > version)
+                .order_by(c.version, c.alert_id).limit(limit + 1)
+            ).all()
+        if len(rows) > limit:
+            return {'version': current, 'changed': True, 'reset': True, 'alerts': []}
+        return {
+            'version': current, 'changed': True, 'reset': False,
+            'alerts': [dict(self._row_to_alert(row), alert_key=row.alert_key) for row in rows]
+        }
+
+    @property
+    def version(self):
+        return self._refresh_if_changed(force=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'backend': 'table',
+                'version': self._version,
+                'pending': len(self._pending),
+                'flushed': self._flushed,
+                'dropped': self._dropped,
+                'failed_flushes': self._failed_flushes,
+                'unhandled_keys': len(self._last_unhandled),
+                'ttl_seconds': self.ttl
+            }
+
+    # ---------- 版本号 ----------
+    def _engine(self):
+        engine = self._engine_getter()
+        if not self._schema_ready:
+            self.version_table.create(engine, checkfirst=True)
+            self.alert_table.create(engine, checkfirst=True)
+            self._schema_ready = True
+        return engine
+
+    def _read_version(self, conn):
+        version = conn.execute(
+            self.version_table.select().with_only_columns(self.version_table.c.version)
+            .where(self.version_table.c.name == ALERT_VERSION_NAME)
+        ).scalar()
+        return version or 0
+
+    def _bump_version(self, conn):
+        """在当前事务中递增版本号并返回新值"""
+        c = self.version_table.c
+        updated = conn.execute(
+            self.version_table.update().where(c.name == ALERT_VERSION_NAME).values(version=c.version + 1)
+        ).rowcount
+        if not updated:
+            conn.execute(self.version_table.insert().values(name=ALERT_VERSION_NAME, version=1))
+        return self._read_version(conn)
+
+    def _invalidate(self):
+        self._last_check = 0.0
+
+    def _refresh_if_changed(self, force=False):
+        """按检查间隔比对版本号，变化时重新加载去重窗口内未处理的提醒键"""
+        now = time.monotonic()
+        if not force and self._version is not None and now - self._last_check < self.check_interval:
+            return self._version
+        c = self.alert_table.c
+        with self._engine().connect() as conn:
+            version = self._read_version(conn)
+            if version != self._version:
+                rows = conn.execute(
+                    self.alert_table.select()
+                    .with_only_columns(c.alert_key, c.created_at)
+                    .where(c.handled == False,  # noqa: E712
+                           c.created_at >= datetime.now() - timedelta(seconds=self.dedupe_window))
+                ).all()
+                last_unhandled = {}
+                for key, created_at in rows:
+                    last_unhandled[key] = max(last_unhandled.get(key, 0.0), created_at.timestamp())
+                with self._lock:
+                    # 保留本进程尚未写库的提醒
+                    for key, _, created in self._pending:
+                        last_unhandled[key] = max(last_unhandled.get(key, 0.0), created)
+                    self._last_unhandled = last_unhandled
+                    self._version = version
+                    self._query_cache.clear()
+        self._last_check = time.monotonic()
+        return version
+
+
+def create_alert_store(backend, engine_getter, alert_table, version_table, **options):
+    """按配置创建提醒存储
+
+    backend：memory（默认，进程内）；table（应用数据库中的 device_alert 表）；
+    sqlite:///路径（本机多个工作进程共用的 SQLite 文件）
+    """
+    store_options = {k: v for k, v in options.items() if k in ('ttl', 'dedupe_window')}
+    if backend in (None, '', 'memory'):
+        return AlertStore(per_key_limit=options.get('per_key_limit', 50),
+                          max_alerts=options.get('max_alerts', 10000), **store_options)
+    if backend == 'table':
+        return TableAlertStore(engine_getter, alert_table, version_table, **store_options)
+    if backend.startswith('sqlite:'):
+        engine = create_engine(backend, connect_args={'timeout': 30})
+        return TableAlertStore(lambda: engine, alert_table, version_table, create_tables=True, **store_options)
+    raise ValueError(f'未知的提醒存储类型: {backend}')
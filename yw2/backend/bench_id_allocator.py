@@ -0,0 +1,133 @@
+# backend/bench_id_allocator.py
+"""数据ID生成方式基准测试：SELECT MAX(data_id) 与号段分配器对比
+
+用法（默认对 YW2_DATABASE_URI 指向的库执行，可用 SQLite 作为本地替身）：
+    YW2_DATABASE_URI=sqlite:////tmp/yw2_bench.db python bench_id_allocator.py --rows 1000000
+"""
+import argparse
+import multiprocessing
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, text
+
+from app import app, db, RegionInfo, MonitorIndicator, MonitorDevice, EnvironmentData
+from id_allocator import DataIdAllocator
+
+BENCH_PREFIX = 'BENCH'
+
+
+def prepare_reference_data():
+    """准备基准测试需要的区域、指标和设备"""
+    region_id = f'{BENCH_PREFIX}R1'
+    if not RegionInfo.query.get(region_id):
+        db.session.add(RegionInfo(region_id=region_id, region_name='基准测试区域'))
+    indicator_id = f'{BENCH_PREFIX}I1'
+    if not MonitorIndicator.query.get(indicator_id):
+        db.session.add(MonitorIndicator(indicator_id=indicator_id, indicator_name='基准测试指标',
+                                        unit='mg/L', standard_upper=10.0, standard_lower=5.0,
+                                        monitor_freq='小时'))
+    device_id = f'{BENCH_PREFIX}D1'
+    if not MonitorDevice.query.get(device_id):
+        db.session.add(MonitorDevice(device_id=device_id, device_type='基准测试传感器',
+                                     region_id=region_id, operation_status='正常'))
+    db.session.commit()
+    return region_id, indicator_id, device_id
+
+
+def fill_rows(target_rows, chunk_size=10000):
+    """把 environment_data 填充到 target_rows 行"""
+    region_id, indicator_id, device_id = prepare_reference_data()
+    existing = EnvironmentData.query.count()
+    if existing >= target_rows:
+        print(f"已有 {existing} 行，跳过填充")
+        return
+
+    allocator = DataIdAllocator(lambda: db.engine, block_size=chunk_size)
+    table = EnvironmentData.__table__
+    base_time = datetime.now() - timedelta(days=365)
+    start = time.perf_counter()
+    inserted = 0
+    while existing + inserted < target_rows:
+        size = min(chunk_size, target_rows - existing - inserted)
+        ids = allocator.next_ids(size)
+        rows = [{
+            'data_id': data_id,
+            'indicator_id': indicator_id,
+            'device_id': device_id,
+            'region_id': region_id,
+            'collection_time': base_time + timedelta(seconds=inserted + i),
+            'monitor_value': 7.5,
+            'data_quality': '中',
+            'is_abnormal': False,
+            'abnormal_reason': None
+        } for i, data_id in enumerate(ids)]
+        db.session.execute(table.insert(), rows)
+        db.session.commit()
+        inserted += size
+        if inserted % 100000 < chunk_size:
+            print(f"  已填充 {existing + inserted} 行")
+    print(f"填充 {inserted} 行耗时 {time.perf_counter() - start:.1f}秒")
+
+
+def _max_worker(uri, count, queue):
+    """旧方式：每次 SELECT MAX(data_id) 后加1"""
+    engine = create_engine(uri)
+    ids = []
+    with engine.connect() as conn:
+        for _ in range(count):
+            max_id = conn.execute(text("SELECT MAX(data_id) FROM environment_data")).scalar()
+            ids.append(f"ED{int(max_id[2:]) + 1:06d}" if max_id and max_id[2:].isdigit() else "ED000001")
+    engine.dispose()
+    queue.put(ids)
+
+
+def _allocator_worker(uri, count, block_size, queue):
+    """新方式：号段分配器"""
+    engine = create_engine(uri)
+    allocator = DataIdAllocator(lambda: engine, block_size=block_size)
+    ids = [allocator.next_id() for _ in range(count)]
+    engine.dispose()
+    queue.put(ids)
+
+
+def run_workers(target, args, processes):
+    queue = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=target, args=args + (queue,)) for _ in range(processes)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    all_ids = [i for _ in workers for i in queue.get()]
+    for w in workers:
+        w.join()
+    elapsed = time.perf_counter() - start
+    return elapsed, len(all_ids), len(all_ids) - len(set(all_ids))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='数据ID生成方式基准测试')
+    parser.add_argument('--rows', type=int, default=1000000, help='environment_data 目标行数')
+    parser.add_argument('--ids', type=int, default=2000, help='每个进程生成的ID数量')
+    parser.add_argument('--processes', type=int, default=4, help='并发进程数')
+    parser.add_argument('--block-size', type=int, default=100, help='号段大小')
+    args = parser.parse_args()
+
+    uri = app.config['SQLALCHEMY_DATABASE_URI']
+    with app.app_context():
+        db.create_all()
+        fill_rows(args.rows)
+        db.engine.dispose()
+
+    print(f"\n数据库: {uri.split('@')[-1]}")
+    print(f"并发进程: {args.processes}，每进程ID数: {args.ids}")
+
+    elapsed, total, duplicates = run_workers(_max_worker, (uri, args.ids), args.processes)
+    print(f"SELECT MAX():  {total / elapsed:10.0f} ID/秒，重复ID {duplicates} 个")
+
+    elapsed, total, duplicates = run_workers(_allocator_worker, (uri, args.ids, args.block_size),
+                                             args.processes)
+    print(f"号段分配器:     {total / elapsed:10.0f} ID/秒，重复ID {duplicates} 个")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,629 @@
+# backend/bench_suite.py
+"""监测后端负载生成与基准测试
+
+子命令：
+    load   快速生成合成数据：区域、指标、数千台设备和数百万条环境数据
+           （按块 Core 批量写入，计数表和汇总表在同一事务中维护）
+    fleet  模拟设备群按指定速率调用 upload、batch-upload 接口，统计写入延迟和实际吞吐量
+    read   逐个测量读接口的延迟（p50/p95/p99）和吞吐量，保存为JSON基线
+    diff   比较两个基线文件，列出变慢的接口（有退化时退出码为1）
+
+默认在进程内通过 Flask 测试客户端调用接口，数据库为 YW2_DATABASE_URI（本地 MySQL，
+或以 SQLite 作为替身）；fleet、read 指定 --base-url 时通过HTTP调用正在运行的服务。
+
+用法：
+    export YW2_DATABASE_URI=sqlite:////tmp/yw2_bench.db
+    python bench_suite.py load --devices 2000 --rows 2000000
+    python bench_suite.py fleet --devices 500 --rate 200 --duration 60
+    python bench_suite.py read --requests 200 --output baseline.json
+    python bench_suite.py diff baseline.json current.json --threshold 0.2
+"""
+import argparse
+import http.client
+import itertools
+import json
+import platform
+import sys
+import threading
+import time
+import urllib.parse
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+BENCH_PREFIX = 'BN'
+
+# 基准测试指标：(名称, 单位, 下限, 上限, 监测频率)
+BENCH_INDICATORS = [
+    ('PM2.5', 'μg/m³', 0.0, 35.0, '小时'),
+    ('水质PH值', 'pH', 6.5, 8.5, '日'),
+    ('土壤湿度', '%', 20.0, 80.0, '日'),
+    ('温度', '°C', -10.0, 35.0, '小时'),
+    ('湿度', '%', 20.0, 90.0, '小时'),
+    ('噪音', 'dB', 20.0, 60.0, '小时'),
+    ('水质溶解氧', 'mg/L', 5.0, 10.0, '日'),
+    ('风速', 'm/s', 0.0, 15.0, '小时'),
+]
+BENCH_DEVICE_TYPES = ['空气质量传感器', '水质监测仪', '土壤传感器', '温湿度传感器', '噪音监测仪', '气象站']
+BENCH_CALIBRATION_CYCLES = ['30天', '3月', '6月', '1年']
+
+DATA_QUALITIES = np.array(['优', '良', '中', '差'])
+DATA_QUALITY_WEIGHTS = [0.3, 0.4, 0.2, 0.1]
+
+UPLOAD_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def _app_module():
+    # 只有进程内调用和生成数据时才需要应用和数据库配置，HTTP 模式不导入
+    import app as app_module
+    return app_module
+
+
+# ============ 接口调用 ============
+class InProcessClient:
+    """通过 Flask 测试客户端调用接口（每个线程一个客户端）"""
+
+    def __init__(self):
+        self._app = _app_module().app
+        self._local = threading.local()
+
+    @property
+    def target(self):
+        uri = self._app.config['SQLALCHEMY_DATABASE_URI']
+        return f"in-process ({uri.split('@')[-1]})"
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, 'client', None)
+        if client is None:
+            client = self._local.client = self._app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.get_data()
+
+
+class HttpClient:
+    """通过HTTP调用运行中的服务（每个线程一条保持连接）"""
+
+    def __init__(self, base_url, timeout=30):
+        parsed = urllib.parse.urlsplit(base_url)
+        self._connection_class = http.client.HTTPSConnection if parsed.scheme == 'https' \
+            else http.client.HTTPConnection
+        self._netloc = parsed.netloc
+        self._prefix = parsed.path.rstrip('/')
+        self._timeout = timeout
+        self._local = threading.local()
+        self.target = base_url
+
+    def request(self, method, path, body=None):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connection_class(self._netloc, timeout=self._timeout)
+        payload = None if body is None else json.dumps(body).encode('utf-8')
+        headers = {'Content-Type': 'application/json'} if payload is not None else {}
+        try:
+            conn.request(method, self._prefix + path, body=payload, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            # 连接失效时丢弃，下次请求重新建立
+            conn.close()
+            self._local.conn = None
+            raise
+
+
+def make_client(base_url=None):
+    return HttpClient(base_url) if base_url else InProcessClient()
+
+
+def get_json(client, path):
+    status, body = client.request('GET', path)
+    if status >= 400:
+        raise RuntimeError(f'{path} 返回 {status}')
+    return json.loads(body)
+
+
+# ============ 统计 ============
+def summarize_latencies(latencies_ms, errors, elapsed):
+    """请求延迟（毫秒）汇总为 p50/p95/p99、平均值、最大值和吞吐量"""
+    summary = {'requests': len(latencies_ms), 'errors': errors}
+    if latencies_ms:
+        values = np.asarray(latencies_ms, dtype=float)
+        p50, p95, p99 = np.percentile(values, [50, 95, 99])
+        summary.update({
+            'p50_ms': round(float(p50), 3),
+            'p95_ms': round(float(p95), 3),
+            'p99_ms': round(float(p99), 3),
+            'mean_ms': round(float(values.mean()), 3),
+            'max_ms': round(float(values.max()), 3),
+        })
+    summary['throughput_rps'] = round(len(latencies_ms) / elapsed, 2) if elapsed > 0 else None
+    return summary
+
+
+def compare_baselines(baseline, current, threshold=0.2, metric='p95_ms', min_delta_ms=1.0):
+    """比较两个基线，返回 [(接口, 基线值, 当前值, 变化比例, 是否退化)]
+
+    当前值超过基线的 (1 + threshold) 倍且绝对差值不小于 min_delta_ms 时视为退化
+    （过滤亚毫秒接口的测量抖动）；只在一方出现的接口不比较。
+    """
+    result = []
+    for name, stats in baseline['endpoints'].items():
+        other = current['endpoints'].get(name)
+        if other is None or stats.get(metric) is None or other.get(metric) is None:
+            continue
+        before, after = stats[metric], other[metric]
+        change = (after - before) / before if before else None
+        regressed = after > before * (1 + threshold) and after - before >= min_delta_ms
+        result.append((name, before, after, change, regressed))
+    return result
+
+
+# ============ 合成数据 ============
+def prepare_bench_fleet(region_count, device_count):
+    """创建基准测试用的区域、指标和设备（已存在的跳过），返回 (指标列表, 设备列表)
+
+    指标为 (indicator_id, 下限, 上限)，设备为 (device_id, region_id)。
+    设备通过ORM写入，校准到期字段由模型事件维护。
+    """
+    app_module = _app_module()
+    db = app_module.db
+    RegionInfo, MonitorIndicator, MonitorDevice = \
+        app_module.RegionInfo, app_module.MonitorIndicator, app_module.MonitorDevice
+
+    region_ids = [f'{BENCH_PREFIX}R{i:03d}' for i in range(1, region_count + 1)]
+    existing = set(db.session.execute(db.select(RegionInfo.region_id)
+                                      .where(RegionInfo.region_id.in_(region_ids))).scalars())
+    db.session.add_all(RegionInfo(region_id=region_id, region_name=f'基准测试区域{region_id[-3:]}')
+                       for region_id in region_ids if region_id not in existing)
+
+    indicators = []
+    existing = set(db.session.execute(db.select(MonitorIndicator.indicator_id)
+                                      .where(MonitorIndicator.indicator_id.like(f'{BENCH_PREFIX}I%'))).scalars())
+    for i, (name, unit, lower, upper, freq) in enumerate(BENCH_INDICATORS, 1):
+        indicator_id = f'{BENCH_PREFIX}I{i:02d}'
+        if indicator_id not in existing:
+            db.session.add(MonitorIndicator(indicator_id=indicator_id, indicator_name=f'基准测试{name}', unit=unit,
+                                            standard_lower=lower, standard_upper=upper, monitor_freq=freq))
+        indicators.append((indicator_id, lower, upper))
+
+    devices = []
+    existing = set(db.session.execute(db.select(MonitorDevice.device_id)
+                                      .where(MonitorDevice.device_id.like(f'{BENCH_PREFIX}D%'))).scalars())
+    rng = np.random.default_rng(0)
+    today = date.today()
+    for i in range(device_count):
+        device_id = f'{BENCH_PREFIX}D{i + 1:05d}'
+        region_id = region_ids[i % region_count]
+        if device_id not in existing:
+            db.session.add(MonitorDevice(
+                device_id=device_id,
+                device_type=BENCH_DEVICE_TYPES[i % len(BENCH_DEVICE_TYPES)],
+                region_id=region_id,
+                install_time=today - timedelta(days=int(rng.integers(0, 730))),
+                calibration_cycle=BENCH_CALIBRATION_CYCLES[i % len(BENCH_CALIBRATION_CYCLES)],
+                operation_status='正常' if i % 20 else '离线',
+                comm_proto='MQTT'
+            ))
+        devices.append((device_id, region_id))
+
+    app_module.bump_data_version(app_module.REFERENCE_DATA_VERSION)
+    db.session.commit()
+    return indicators, devices
+
+
+def generate_readings(series, start_index, count, total, start_time, span_seconds, abnormal_rate, rng):
+    """生成一块合成环境数据（不含数据ID），返回数据行字典列表
+
+    series 为 [(device_id, region_id, indicator_id, 下限, 上限)]，各序列轮流采集；
+    采集时间在 [start_time, start_time + span_seconds) 内按行号均匀递增，
+    约 abnormal_rate 比例的数据超出阈值范围。
+    """
+    positions = np.arange(start_index, start_index + count)
+    series_index = positions % len(series)
+    lowers = np.array([item[3] for item in series])[series_index]
+    uppers = np.array([item[4] for item in series])[series_index]
+    widths = uppers - lowers
+
+    values = lowers + widths * rng.uniform(0.1, 0.9, count)
+    abnormal = rng.random(count) < abnormal_rate
+    high = rng.random(count) < 0.7
+    excess = widths * rng.uniform(0.05, 0.5, count)
+    values = np.where(abnormal, np.where(high, uppers + excess, lowers - excess), values).round(4)
+    offsets = positions * (span_seconds / total) + rng.uniform(0, 1, count)
+    qualities = rng.choice(DATA_QUALITIES, size=count, p=DATA_QUALITY_WEIGHTS)
+
+    rows = []
+    for i in range(count):
+        device_id, region_id, indicator_id, lower, upper = series[series_index[i]]
+        value = float(values[i])
+        is_abnormal = value > upper or value < lower
+        rows.append({
+            'indicator_id': indicator_id,
+            'device_id': device_id,
+            'region_id': region_id,
+            'collection_time': start_time + timedelta(seconds=float(offsets[i])),
+            'monitor_value': value,
+            'data_quality': str(qualities[i]),
+            'is_abnormal': is_abnormal,
+            'abnormal_reason': f"监测值 {value} {'>' if value > upper else '<'} 阈值范围 [{lower}, {upper}]"
+            if is_abnormal else None
+        })
+    return rows
+
+
+def load_synthetic_data(rows, devices=2000, regions=20, indicators_per_device=2, days=365,
+                        abnormal_rate=0.02, chunk_size=20000, seed=1):
+    """生成 rows 条覆盖最近 days 天的环境数据，返回 (写入行数, 耗时秒)"""
+    app_module = _app_module()
+    db = app_module.db
+    indicators, fleet = prepare_bench_fleet(regions, devices)
+    per_device = max(1, min(indicators_per_device, len(indicators)))
+    series = [(device_id, region_id) + indicators[(i + k) % len(indicators)]
+              for i, (device_id, region_id) in enumerate(fleet) for k in range(per_device)]
+
+    rng = np.random.default_rng(seed)
+    start_time = datetime.utcnow() - timedelta(days=days)
+    span_seconds = days * 86400
+    started = time.perf_counter()
+    for chunk_start in range(0, rows, chunk_size):
+        count = min(chunk_size, rows - chunk_start)
+        chunk = generate_readings(series, chunk_start, count, rows, start_time, span_seconds, abnormal_rate, rng)
+        for row, data_id in zip(chunk, app_module.data_id_allocator.next_ids(count)):
+            row['data_id'] = data_id
+        app_module.insert_environment_rows(chunk)
+        db.session.commit()
+        done = chunk_start + count
+        if done % (chunk_size * 10) < chunk_size or done == rows:
+            elapsed = time.perf_counter() - started
+            print(f"  已写入 {done} 行，{done / elapsed:.0f} 行/秒")
+    return rows, time.perf_counter() - started
+
+
+# ============ 模拟设备群 ============
+def discover_fleet(client, device_count):
+    """从接口读取设备和指标，返回 [(device_id, region_id, indicator_id, 下限, 上限)]
+
+    优先使用基准测试设备和指标（没有时使用全部），每台设备对应一个指标。
+    """
+    devices = get_json(client, '/api/devices/all')['devices']
+    indicators = get_json(client, '/api/indicators')['indicators']
+    if not devices or not indicators:
+        raise RuntimeError('没有可用的设备或指标，请先执行 load 子命令')
+    devices = [device for device in devices if device['device_id'].startswith(f'{BENCH_PREFIX}D')] or devices
+    indicators = [indicator for indicator in indicators
+                  if indicator['indicator_id'].startswith(f'{BENCH_PREFIX}I')] or indicators
+    devices = devices[:device_count]
+    return [
+        (device['device_id'], device['region_id'], indicator['indicator_id'],
+         float(indicator['standard_lower']), float(indicator['standard_upper']))
+        for device, indicator in zip(devices, itertools.cycle(indicators))
+    ]
+
+
+def make_reading(fleet_item, rng, abnormal_rate):
+    device_id, region_id, indicator_id, lower, upper = fleet_item
+    width = upper - lower
+    if rng.random() < abnormal_rate:
+        value = upper + width * rng.uniform(0.05, 0.5)
+    else:
+        value = lower + width * rng.uniform(0.1, 0.9)
+    return {
+        'device_id': device_id,
+        'region_id': region_id,
+        'indicator_id': indicator_id,
+        'monitor_value': round(float(value), 4),
+        'collection_time': datetime.utcnow().strftime(UPLOAD_TIME_FORMAT),
+        'data_quality': str(rng.choice(DATA_QUALITIES, p=DATA_QUALITY_WEIGHTS)),
+    }
+
+
+def run_fleet(client, fleet, rate, duration, workers=8, batch_ratio=0.2, batch_size=50,
+              abnormal_rate=0.02, async_upload=False, batch_mode=None, seed=1):
+    """模拟设备群以 rate 条/秒（全部设备合计）上报 duration 秒
+
+    设备平均分给各工作线程，每个线程按固定间隔轮流产生读数（开环调度：落后时不等待，
+    调度延迟计入 max_lag_ms，可据此判断服务是否跟得上）。
+    前 batch_ratio 比例的设备攒满 batch_size 条后调用 batch-upload，其余设备每条调用 upload。
+    返回 {'upload': 统计, 'batch_upload': 统计, 'readings': 条数, 'readings_per_sec': 实际速率, ...}
+    """
+    upload_path = '/api/environment/data/upload' + ('?async=1' if async_upload else '')
+    batch_path = '/api/environment/data/batch-upload' + (f'?mode={batch_mode}' if batch_mode else '')
+    batch_devices = {item[0] for item in fleet[:int(len(fleet) * batch_ratio)]}
+    workers = max(1, min(workers, len(fleet)))
+    interval = workers / rate
+    lock = threading.Lock()
+    stats = {'upload': ([], [0]), 'batch_upload': ([], [0])}
+    totals = {'readings': 0, 'max_lag_ms': 0.0}
+
+    def send(kind, path, body, readings):
+        started = time.perf_counter()
+        try:
+            status, _ = client.request('POST', path, body)
+            ok = status < 400
+        except Exception:
+            ok = False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        with lock:
+            stats[kind][0].append(elapsed_ms)
+            if ok:
+                totals['readings'] += readings
+            else:
+                stats[kind][1][0] += 1
+
+    def worker(index, deadline):
+        rng = np.random.default_rng(seed + index)
+        devices = itertools.cycle(fleet[index::workers])
+        buffers = {}
+        next_time = time.perf_counter()
+        max_lag = 0.0
+        while next_time < deadline:
+            lag = time.perf_counter() - next_time
+            if lag < 0:
+                time.sleep(-lag)
+            else:
+                max_lag = max(max_lag, lag)
+            item = next(devices)
+            reading = make_reading(item, rng, abnormal_rate)
+            if item[0] in batch_devices:
+                buffer = buffers.setdefault(item[0], [])
+                buffer.append(reading)
+                if len(buffer) >= batch_size:
+                    send('batch_upload', batch_path, buffer, len(buffer))
+                    buffers[item[0]] = []
+            else:
+                send('upload', upload_path, reading, 1)
+            next_time += interval
+        for buffer in buffers.values():
+            if buffer:
+                send('batch_upload', batch_path, buffer, len(buffer))
+        with lock:
+            totals['max_lag_ms'] = max(totals['max_lag_ms'], max_lag * 1000)
+
+    started = time.perf_counter()
+    deadline = started + duration
+    threads = [threading.Thread(target=worker, args=(i, deadline), daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    result = {kind: summarize_latencies(latencies, errors[0], elapsed)
+              for kind, (latencies, errors) in stats.items()}
+    result.update({
+        'readings': totals['readings'],
+        'readings_per_sec': round(totals['readings'] / elapsed, 2),
+        'target_readings_per_sec': rate,
+        'max_lag_ms': round(totals['max_lag_ms'], 3),
+    })
+    return result
+
+
+# ============ 读接口基准 ============
+def read_endpoints(client):
+    """全部读接口：{名称: 路径}，路径中的数据ID、设备、指标取自库中最新的一条数据"""
+    latest = get_json(client, '/api/environment/data/all?per_page=1&cursor=')['data']
+    if not latest:
+        raise RuntimeError('环境数据为空，请先执行 load 子命令')
+    sample = latest[0]
+    today = date.today()
+    week_ago = (today - timedelta(days=7)).isoformat()
+    month_ago = (today - timedelta(days=30)).isoformat()
+    today = today.isoformat()
+    return {
+        'health': '/api/health',
+        'regions': '/api/regions',
+        'indicators': '/api/indicators',
+        'indicator_detail': f"/api/indicators/{sample['indicator_id']}",
+        'devices_all': '/api/devices/all',
+        'devices_management': '/api/devices/management',
+        'devices_status_summary': '/api/devices/status-summary',
+        'devices_need_calibration': '/api/devices/need-calibration',
+        'devices_types': '/api/devices/types',
+        'stats_dashboard': '/api/stats/dashboard',
+        'stats_daily': '/api/stats/daily?days=30',
+        'report_30d': f'/api/environment/report?start_date={month_ago}&end_date={today}',
+        'data_recent': '/api/environment/data/recent',
+        'data_all_first_page': '/api/environment/data/all?page=1&per_page=20',
+        'data_all_page_50': '/api/environment/data/all?page=50&per_page=20',
+        'data_all_cursor': '/api/environment/data/all?per_page=100&cursor=',
+        'data_all_filtered': f"/api/environment/data/all?indicator_id={sample['indicator_id']}"
+                             f"&start_date={week_ago}&end_date={today}",
+        'data_by_id': f"/api/environment/data/{sample['data_id']}",
+        'data_abnormal_7d': f'/api/environment/data/abnormal?start_date={week_ago}',
+        'data_count': '/api/environment/data/count',
+        'data_abnormal_count': '/api/environment/data/abnormal-count',
+        'data_by_alert': f"/api/environment/data/by-alert?device_id={sample['device_id']}"
+                         f"&indicator_id={sample['indicator_id']}",
+        'alerts_device': '/api/alerts/device',
+        'alerts_changes': '/api/alerts/changes?since=0',
+        'alerts_stats': '/api/alerts/stats',
+        'ingest_metrics': '/api/environment/data/upload/metrics',
+        'jobs': '/api/jobs',
+    }
+
+
+def measure_endpoint(client, path, requests=100, concurrency=1, warmup=5):
+    """对一个接口发出 requests 次 GET 请求（concurrency 个线程），返回延迟统计"""
+    for _ in range(warmup):
+        client.request('GET', path)
+
+    tickets = itertools.count()
+    lock = threading.Lock()
+    latencies = []
+    errors = [0]
+
+    def worker():
+        local_latencies = []
+        local_errors = 0
+        while next(tickets) < requests:
+            started = time.perf_counter()
+            try:
+                status, _ = client.request('GET', path)
+                ok = status < 400
+            except Exception:
+                ok = False
+            local_latencies.append((time.perf_counter() - started) * 1000)
+            if not ok:
+                local_errors += 1
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(max(1, concurrency))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return summarize_latencies(latencies, errors[0], time.perf_counter() - started)
+
+
+def run_read_benchmark(client, requests=100, concurrency=1, warmup=5, only=None):
+    """测量全部（或名称包含 only 中任一项的）读接口，返回基线字典"""
+    endpoints = read_endpoints(client)
+    if only:
+        endpoints = {name: path for name, path in endpoints.items() if any(part in name for part in only)}
+    data_count = get_json(client, '/api/environment/data/count').get('count')
+
+    results = {}
+    for name, path in endpoints.items():
+        results[name] = dict(measure_endpoint(client, path, requests, concurrency, warmup), path=path)
+        stats = results[name]
+        print(f"  {name:28s} p50 {stats.get('p50_ms', 0):8.2f}ms  p95 {stats.get('p95_ms', 0):8.2f}ms  "
+              f"p99 {stats.get('p99_ms', 0):8.2f}ms  {stats['throughput_rps']:8.1f} 次/秒"
+              + (f"  错误 {stats['errors']}" if stats['errors'] else ''))
+    return {
+        'meta': {
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'target': client.target,
+            'data_count': data_count,
+            'requests': requests,
+            'concurrency': concurrency,
+            'warmup': warmup,
+            'python': platform.python_version(),
+        },
+        'endpoints': results,
+    }
+
+
+# ============ 命令行 ============
+def _write_json(payload, path):
+    text = json.dumps(payload, ensure_ascii=False, indent=2)
+    if path:
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+        print(f"结果已保存到 {path}")
+    else:
+        print(text)
+
+
+def _ensure_schema():
+    app_module = _app_module()
+    with app_module.app.app_context():
+        app_module.db.create_all()
+
+
+def cmd_load(args):
+    app_module = _app_module()
+    _ensure_schema()
+    with app_module.app.app_context():
+        rows, elapsed = load_synthetic_data(
+            args.rows, devices=args.devices, regions=args.regions,
+            indicators_per_device=args.indicators_per_device, days=args.days,
+            abnormal_rate=args.abnormal_rate, chunk_size=args.chunk_size, seed=args.seed
+        )
+    print(f"写入 {rows} 行耗时 {elapsed:.1f}秒（{rows / elapsed:.0f} 行/秒）")
+
+
+def cmd_fleet(args):
+    if not args.base_url:
+        _ensure_schema()
+    client = make_client(args.base_url)
+    fleet = discover_fleet(client, args.devices)
+    print(f"目标: {client.target}，设备 {len(fleet)} 台，{args.rate} 条/秒，持续 {args.duration} 秒")
+    result = run_fleet(client, fleet, args.rate, args.duration, workers=args.workers,
+                       batch_ratio=args.batch_ratio, batch_size=args.batch_size,
+                       abnormal_rate=args.abnormal_rate, async_upload=args.async_upload,
+                       batch_mode=args.batch_mode, seed=args.seed)
+    result['meta'] = {'created_at': datetime.now().isoformat(timespec='seconds'), 'target': client.target,
+                      'devices': len(fleet), 'duration': args.duration}
+    _write_json(result, args.output)
+
+
+def cmd_read(args):
+    if not args.base_url:
+        _ensure_schema()
+    client = make_client(args.base_url)
+    print(f"目标: {client.target}")
+    baseline = run_read_benchmark(client, requests=args.requests, concurrency=args.concurrency,
+                                  warmup=args.warmup, only=args.only)
+    _write_json(baseline, args.output)
+
+
+def cmd_diff(args):
+    with open(args.baseline, encoding='utf-8') as f:
+        baseline = json.load(f)
+    with open(args.current, encoding='utf-8') as f:
+        current = json.load(f)
+    rows = compare_baselines(baseline, current, threshold=args.threshold, metric=args.metric)
+    regressions = 0
+    for name, before, after, change, regressed in rows:
+        regressions += regressed
+        change_text = f'{change:+.1%}' if change is not None else '-'
+        print(f"{'退化' if regressed else '    '}  {name:28s} {before:10.2f} -> {after:10.2f} ms  {change_text}")
+    print(f"\n共比较 {len(rows)} 个接口（{args.metric}），退化 {regressions} 个")
+    return 1 if regressions else 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='监测后端负载生成与基准测试')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    load = subparsers.add_parser('load', help='生成合成数据')
+    load.add_argument('--rows', type=int, default=1000000, help='环境数据条数')
+    load.add_argument('--devices', type=int, default=2000, help='设备数')
+    load.add_argument('--regions', type=int, default=20, help='区域数')
+    load.add_argument('--indicators-per-device', type=int, default=2, help='每台设备监测的指标数')
+    load.add_argument('--days', type=int, default=365, help='数据覆盖最近多少天')
+    load.add_argument('--abnormal-rate', type=float, default=0.02, help='异常数据比例')
+    load.add_argument('--chunk-size', type=int, default=20000, help='每个事务写入的行数')
+    load.add_argument('--seed', type=int, default=1)
+    load.set_defaults(func=cmd_load)
+
+    fleet = subparsers.add_parser('fleet', help='模拟设备群上报数据')
+    fleet.add_argument('--base-url', help='服务地址（如 http://localhost:5001），不指定时在进程内调用')
+    fleet.add_argument('--devices', type=int, default=500, help='模拟的设备数')
+    fleet.add_argument('--rate', type=float, default=100, help='全部设备合计每秒上报的读数')
+    fleet.add_argument('--duration', type=float, default=30, help='持续秒数')
+    fleet.add_argument('--workers', type=int, default=8, help='并发线程数')
+    fleet.add_argument('--batch-ratio', type=float, default=0.2, help='使用 batch-upload 的设备比例')
+    fleet.add_argument('--batch-size', type=int, default=50, help='batch-upload 每批条数')
+    fleet.add_argument('--batch-mode', choices=['bulk', 'legacy'], help='batch-upload 的 mode 参数')
+    fleet.add_argument('--async-upload', action='store_true', help='upload 使用异步写入队列（?async=1）')
+    fleet.add_argument('--abnormal-rate', type=float, default=0.02, help='异常读数比例')
+    fleet.add_argument('--seed', type=int, default=1)
+    fleet.add_argument('--output', help='结果JSON文件，不指定时输出到屏幕')
+    fleet.set_defaults(func=cmd_fleet)
+
+    read = subparsers.add_parser('read', help='测量读接口延迟并保存基线')
+    read.add_argument('--base-url', help='服务地址（如 http://localhost:5001），不指定时在进程内调用')
+    read.add_argument('--requests', type=int, default=100, help='每个接口的请求次数')
+    read.add_argument('--concurrency', type=int, default=1, help='每个接口的并发线程数')
+    read.add_argument('--warmup', type=int, default=5, help='每个接口预热的请求次数')
+    read.add_argument('--only', nargs='*', help='只测量名称包含这些文字的接口')
+    read.add_argument('--output', help='基线JSON文件，不指定时输出到屏幕')
+    read.set_defaults(func=cmd_read)
+
+    diff = subparsers.add_parser('diff', help='比较两个基线文件')
+    diff.add_argument('baseline')
+    diff.add_argument('current')
+    diff.add_argument('--threshold', type=float, default=0.2, help='超过基线该比例视为退化')
+    diff.add_argument('--metric', default='p95_ms', choices=['p50_ms', 'p95_ms', 'p99_ms', 'mean_ms'])
+    diff.set_defaults(func=cmd_diff)
+
+    args = parser.parse_args(argv)
+    return args.func(args) or 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
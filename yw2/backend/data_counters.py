@@ -0,0 +1,199 @@
+# backend/data_counters.py
+"""环境数据计数器：按 区域 x 指标 x 日期 维护数据条数和异常条数
+
+写入、修改、删除和重新计算异常的代码在同一事务中把增量累加到计数表，仪表盘
+只需汇总计数表（行数只与区域、指标和天数有关，与环境数据表大小无关）。
+
+计数表可能因为绕过应用的修改（手工SQL、存储过程）而产生偏差，由定期执行的
+校对任务修正：在同一事务快照中比较实际统计值与计数值，只把差值作为增量写回，
+因此校对期间并发提交的写入不会被覆盖。
+"""
+from collections import defaultdict
+from datetime import date, datetime
+
+from sqlalchemy import Table, case, func, select
+
+
+def as_date(value):
+    """把 DATE() 的结果统一为 date（SQLite 返回字符串）"""
+    if value is None or isinstance(value, date) and not isinstance(value, datetime):
+        return value
+    if isinstance(value, datetime):
+        return value.date()
+    return date.fromisoformat(str(value)[:10])
+
+
+def data_tables_of(data_tables):
+    """统一为数据表元组（环境数据分为热表和归档表时两张表都要统计）"""
+    if isinstance(data_tables, Table):
+        return (data_tables,)
+    return tuple(data_tables)
+
+
+def _dialect_name(conn):
+    # conn 可以是 Session（get_bind）或 Connection（dialect）
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    return bind.dialect.name
+
+
+class CounterDeltas:
+    """待写入的计数增量：{(区域, 指标, 日期): [数据条数, 异常条数]}"""
+
+    def __init__(self):
+        self._items = defaultdict(lambda: [0, 0])
+
+    def add(self, region_id, indicator_id, collection_time, is_abnormal, sign=1):
+        stat_date = as_date(collection_time) if collection_time is not None else datetime.utcnow().date()
+        item = self._items[(region_id, indicator_id, stat_date)]
+        item[0] += sign
+        if is_abnormal:
+            item[1] += sign
+
+    def add_counts(self, region_id, indicator_id, stat_date, total, abnormal):
+        item = self._items[(region_id, indicator_id, as_date(stat_date))]
+        item[0] += total
+        item[1] += abnormal
+
+    def add_rows(self, rows, sign=1):
+        """按写入的数据行（字典）累加"""
+        for row in rows:
+            self.add(row['region_id'], row['indicator_id'], row.get('collection_time'),
+                     row.get('is_abnormal'), sign)
+
+    def rows(self):
+        """非零增量，按主键排序（减少并发更新时的死锁）"""
+        return [
+            {'region_id': key[0], 'indicator_id': key[1], 'stat_date': key[2],
+             'total_count': counts[0], 'abnormal_count': counts[1]}
+            for key, counts in sorted(self._items.items())
+            if counts[0] or counts[1]
+        ]
+
+    def __bool__(self):
+        return any(counts[0] or counts[1] for counts in self._items.values())
+
+
+class DataCounters:
+    """计数表的读写（不持有连接，由调用方传入会话或连接并控制事务）"""
+
+    def __init__(self, table):
+        # table 主键为 (region_id, indicator_id, stat_date)，另有 total_count、abnormal_count
+        self.table = table
+
+    def apply(self, conn, deltas):
+        """把增量累加到计数表（插入或累加），返回写入的行数"""
+        rows = deltas.rows()
+        if rows:
+            conn.execute(self._upsert(_dialect_name(conn)), rows)
+        return len(rows)
+
+    def _upsert(self, dialect_name):
+        t = self.table
+        if dialect_name == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(t)
+            return stmt.on_duplicate_key_update(
+                total_count=t.c.total_count + stmt.inserted.total_count,
+                abnormal_count=t.c.abnormal_count + stmt.inserted.abnormal_count
+            )
+        if dialect_name in ('sqlite', 'postgresql'):
+            if dialect_name == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+            stmt = insert(t)
+            return stmt.on_conflict_do_update(
+                index_elements=[t.c.region_id, t.c.indicator_id, t.c.stat_date],
+                set_={'total_count': t.c.total_count + stmt.excluded.total_count,
+                      'abnormal_count': t.c.abnormal_count + stmt.excluded.abnormal_count}
+            )
+        raise NotImplementedError(f'计数表不支持的数据库: {dialect_name}')
+
+    def totals(self, conn, recent_since, today):
+        """汇总全部计数：数据总数、异常总数、recent_since（日期）以来的异常数、today 当天的数据数"""
+        t = self.table
+        row = conn.execute(select(
+            func.coalesce(func.sum(t.c.total_count), 0),
+            func.coalesce(func.sum(t.c.abnormal_count), 0),
+            func.coalesce(func.sum(case((t.c.stat_date >= recent_since, t.c.abnormal_count), else_=0)), 0),
+            func.coalesce(func.sum(case((t.c.stat_date >= today, t.c.total_count), else_=0)), 0)
+        )).one()
+        return {'total_count': int(row[0]), 'abnormal_count': int(row[1]),
+                'recent_abnormal_count': int(row[2]), 'today_count': int(row[3])}
+
+    def count(self, conn, region_id=None, indicator_id=None):
+        """数据条数，可按区域、指标过滤"""
+        t = self.table
+        query = select(func.coalesce(func.sum(t.c.total_count), 0))
+        if region_id:
+            query = query.where(t.c.region_id == region_id)
+        if indicator_id:
+            query = query.where(t.c.indicator_id == indicator_id)
+        return int(conn.execute(query).scalar())
+
+    def daily(self, conn, since):
+        """since（日期）以来每天的数据条数和异常条数"""
+        t = self.table
+        rows = conn.execute(
+            select(t.c.stat_date, func.sum(t.c.total_count), func.sum(t.c.abnormal_count))
+            .where(t.c.stat_date >= since)
+            .group_by(t.c.stat_date)
+            .order_by(t.c.stat_date)
+        ).all()
+        return [{'date': as_date(row[0]).isoformat(), 'total_count': int(row[1]), 'abnormal_count': int(row[2])}
+                for row in rows]
+
+    def is_empty(self, conn):
+        return conn.execute(select(self.table.c.stat_date).limit(1)).first() is None
+
+    def date_range(self, conn, data_tables):
+        """计数表与数据表覆盖的日期范围 (最早, 最晚)，都为空时返回 (None, None)
+
+        data_tables 为一张数据表或多张数据表（热表、归档表）。
+        """
+        t = self.table
+        values = list(conn.execute(select(func.min(t.c.stat_date), func.max(t.c.stat_date))).one())
+        for data_table in data_tables_of(data_tables):
+            values += conn.execute(
+                select(func.min(data_table.c.collection_time), func.max(data_table.c.collection_time))
+            ).one()
+        dates = [as_date(value) for value in values if value is not None]
+        if not dates:
+            return None, None
+        return min(dates), max(dates)
+
+    def reconcile(self, conn, data_tables, start, end):
+        """校对 [start, end) 日期范围内的计数，返回 (检查的键数, 修正的键数)
+
+        conn 应处于一个事务中：各次读取来自同一快照，差值以增量方式写回。
+        """
+        t = self.table
+        actual = []
+        for data_table in data_tables_of(data_tables):
+            day = func.date(data_table.c.collection_time)
+            actual += conn.execute(
+                select(data_table.c.region_id, data_table.c.indicator_id, day,
+                       func.count(), func.sum(case((data_table.c.is_abnormal == True, 1), else_=0)))  # noqa: E712
+                .where(data_table.c.collection_time >= datetime.combine(start, datetime.min.time()),
+                       data_table.c.collection_time < datetime.combine(end, datetime.min.time()))
+                .group_by(data_table.c.region_id, data_table.c.indicator_id, day)
+            ).all()
+        stored = conn.execute(
+            select(t.c.region_id, t.c.indicator_id, t.c.stat_date, t.c.total_count, t.c.abnormal_count)
+            .where(t.c.stat_date >= start, t.c.stat_date < end)
+        ).all()
+
+        deltas = CounterDeltas()
+        keys = set()
+        for region_id, indicator_id, stat_date, total, abnormal in actual:
+            keys.add((region_id, indicator_id, as_date(stat_date)))
+            deltas.add_counts(region_id, indicator_id, stat_date, int(total), int(abnormal or 0))
+        for region_id, indicator_id, stat_date, total, abnormal in stored:
+            keys.add((region_id, indicator_id, as_date(stat_date)))
+            deltas.add_counts(region_id, indicator_id, stat_date, -int(total), -int(abnormal))
+
+        corrected = self.apply(conn, deltas)
+        if corrected:
+            conn.execute(t.delete().where(t.c.stat_date >= start, t.c.stat_date < end,
+                                          t.c.total_count == 0, t.c.abnormal_count == 0))
+        return len(keys), corrected
@@ -0,0 +1,167 @@
+# backend/data_export.py
+"""环境数据批量导出：Parquet、Arrow IPC 或 gzip 压缩的 CSV
+
+数据按块（服务端游标每次取回的行）写出，每块一个 Parquet 行组 / Arrow 记录批，
+内存占用只取决于块大小，与导出的总行数无关。列式格式按列整体转换（pyarrow 在 C 中完成），
+不逐行构造对象。
+
+安装了 pyarrow 时支持 parquet 和 arrow（IPC 流格式），未安装时只能导出 csv。
+"""
+import csv
+import gzip
+import io
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # 未安装 pyarrow 时只支持 CSV
+    pa = None
+    pq = None
+
+# 格式 -> (文件扩展名, MIME 类型, 是否需要 pyarrow)
+EXPORT_FORMATS = {
+    'parquet': ('.parquet', 'application/vnd.apache.parquet', True),
+    'arrow': ('.arrows', 'application/vnd.apache.arrow.stream', True),
+    'csv': ('.csv.gz', 'application/gzip', False),
+}
+
+# 字段类型：string、timestamp（不带时区的UTC时间）、float、bool
+FIELD_KINDS = ('string', 'timestamp', 'float', 'bool')
+
+
+def available_formats():
+    return [fmt for fmt, (_, _, needs_arrow) in EXPORT_FORMATS.items() if pa is not None or not needs_arrow]
+
+
+def resolve_format(requested=None):
+    """确定导出格式：未指定时优先 parquet，未安装 pyarrow 时使用 csv；不支持的格式抛出 ValueError"""
+    if not requested:
+        return 'parquet' if pa is not None else 'csv'
+    if requested not in EXPORT_FORMATS:
+        raise ValueError(f"不支持的导出格式: {requested}（可选 {', '.join(EXPORT_FORMATS)}）")
+    if requested not in available_formats():
+        raise ValueError(f'未安装 pyarrow，无法导出 {requested} 格式（可使用 csv）')
+    return requested
+
+
+def file_extension(fmt):
+    return EXPORT_FORMATS[fmt][0]
+
+
+def mime_type(fmt):
+    return EXPORT_FORMATS[fmt][1]
+
+
+def _arrow_type(kind):
+    return {'string': pa.string(), 'timestamp': pa.timestamp('us'), 'float': pa.float64(), 'bool': pa.bool_()}[kind]
+
+
+class ExportWriter:
+    """按块写出导出文件
+
+    sink 为可写的二进制文件对象（写完后不关闭）；fields 为 (字段名, 类型) 列表，
+    write(rows) 的每行是与 fields 顺序一致的元组。
+    """
+
+    def __init__(self, sink, fmt, fields):
+        self.format = fmt
+        self.fields = fields
+        self.rows = 0
+        self.row_groups = 0
+        if fmt == 'csv':
+            self._text = io.TextIOWrapper(gzip.GzipFile(fileobj=sink, mode='wb', compresslevel=6),
+                                          encoding='utf-8', newline='')
+            self._csv = csv.writer(self._text)
+            self._csv.writerow([name for name, _ in fields])
+            return
+        if pa is None:
+            raise ValueError(f'未安装 pyarrow，无法导出 {fmt} 格式')
+        self._schema = pa.schema([pa.field(name, _arrow_type(kind)) for name, kind in fields])
+        target = pa.PythonFile(sink, mode='w')
+        if fmt == 'parquet':
+            self._writer = pq.ParquetWriter(target, self._schema, compression='zstd')
+        else:
+            self._writer = pa.ipc.new_stream(target, self._schema)
+
+    def write(self, rows):
+        """写出一块数据（一个行组）"""
+        if not rows:
+            return
+        if self.format == 'csv':
+            self._csv.writerows(rows)
+        else:
+            columns = list(zip(*rows))
+            arrays = []
+            for (name, kind), values in zip(self.fields, columns):
+                if kind == 'float':
+                    # 数据库的定点数（Decimal）转换为浮点数
+                    values = [None if value is None else float(value) for value in values]
+                arrays.append(pa.array(values, type=_arrow_type(kind)))
+            batch = pa.RecordBatch.from_arrays(arrays, schema=self._schema)
+            if self.format == 'parquet':
+                self._writer.write_table(pa.Table.from_batches([batch]))
+            else:
+                self._writer.write_batch(batch)
+        self.rows += len(rows)
+        self.row_groups += 1
+
+    def close(self):
+        if self.format == 'csv':
+            self._text.close()  # 同时写出 gzip 尾部
+        else:
+            self._writer.close()
+
+    def stats(self):
+        return {'format': self.format, 'rows': self.rows, 'row_groups': self.row_groups}
+
+
+def write_export(batches, sink, fmt, fields, progress=None):
+    """把 batches（行元组的分块）写入 sink，返回导出统计；progress(rows) 在每块写出后调用"""
+    writer = ExportWriter(sink, fmt, fields)
+    for rows in batches:
+        writer.write(rows)
+        if progress:
+            progress(writer.rows)
+    writer.close()
+    return writer.stats()
+
+
+class _ChunkSink(io.RawIOBase):
+    """收集写入的字节，由流式响应逐块取走"""
+
+    def __init__(self):
+        super().__init__()
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        data = bytes(data)
+        self._chunks.append(data)
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def stream_export(batches, fmt, fields):
+    """流式导出：每写出一块就产出已编码的字节（用作HTTP流式响应的内容）"""
+    sink = _ChunkSink()
+    writer = ExportWriter(sink, fmt, fields)
+    for rows in batches:
+        writer.write(rows)
+        data = sink.drain()
+        if data:
+            yield data
+    writer.close()
+    data = sink.drain()
+    if data:
+        yield data
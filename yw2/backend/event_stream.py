@@ -0,0 +1,430 @@
+# backend/event_stream.py
+"""实时推送：Server-Sent Events（SSE）
+
+EventHub：进程内的事件缓冲区。写入路径调用 publish 追加事件（新数据、提醒变化、设备状态变化），
+每个事件只序列化一次，保存在有界的环形缓冲区中，按递增的序号读取。
+
+EventStreamServer：在一个后台线程中运行 asyncio 事件循环，所有订阅连接都是同一线程中的协程，
+订阅者增加时不增加线程，也不访问数据库。每个连接记住自己读到的序号，有新事件时一次写出
+缓冲区中之后的全部事件；连接断开后浏览器带 Last-Event-ID 自动重连，从断开处继续。
+读取太慢、需要的事件已被挤出缓冲区，或服务重启后（事件编号的纪元不同）推送 reset 事件，
+由前端整体重新加载。
+
+EventForwarder：多个工作进程部署时只有调度进程运行推送服务，其他进程的事件经本机
+HTTP（POST {path}/publish）转发给它，在那里发布。转发地址只在单独的发布端口上提供，
+该端口默认只监听本机地址，不经过反向代理；事件类型限定为 EVENT_TYPES。
+"""
+import asyncio
+import hmac
+import http.client
+import itertools
+import json
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit, parse_qs
+
+logger = logging.getLogger(__name__)
+
+# 推送的事件类型（与前端 liveStream.js 订阅的类型一致）
+EVENT_TYPES = frozenset({'readings', 'readings_bulk', 'alert', 'device_status', 'reference', 'reset'})
+LOOPBACK_HOSTS = ('127.0.0.1', '::1', 'localhost')
+
+
+class EventHub:
+    """有界事件缓冲区（线程安全）"""
+
+    def __init__(self, capacity=10000):
+        # 事件编号为 "纪元-序号"，纪元区分进程的每次启动
+        self.epoch = format(int(time.time() * 1000), 'x')
+        self._lock = threading.Lock()
+        self._events = deque(maxlen=capacity)   # (序号, SSE 帧)
+        self._seq = 0
+        self._listeners = []
+        self._published = 0
+
+    @property
+    def seq(self):
+        return self._seq
+
+    def add_listener(self, callback):
+        """有新事件时调用 callback()（在 publish 的调用线程中执行，应尽快返回）"""
+        self._listeners.append(callback)
+
+    def publish(self, event, data):
+        """发布事件；事件类型不在 EVENT_TYPES 中时抛出 ValueError"""
+        if event not in EVENT_TYPES:
+            raise ValueError(f'未知的事件类型: {event!r}')
+        payload = json.dumps(data, ensure_ascii=False, default=str, separators=(',', ':'))
+        with self._lock:
+            self._seq += 1
+            frame = f"id: {self.epoch}-{self._seq}\nevent: {event}\ndata: {payload}\n\n".encode('utf-8')
+            self._events.append((self._seq, frame))
+            self._published += 1
+        for callback in list(self._listeners):
+            callback()
+
+    def parse_event_id(self, event_id):
+        """把客户端的 Last-Event-ID 解析为序号；不是本纪元的编号返回 None"""
+        epoch, _, seq = (event_id or '').partition('-')
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return min(int(seq), self._seq)
+
+    def frames_since(self, seq):
+        """返回 (序号之后的事件帧, 最新序号, 是否完整)；需要的事件已被挤出缓冲区时不完整"""
+        with self._lock:
+            if not self._events or self._events[-1][0] <= seq:
+                return [], self._seq, True
+            first = self._events[0][0]
+            if first > seq + 1:
+                return [], self._seq, False
+            # 从尾部取最近的事件，只访问需要返回的部分
+            count = self._seq - seq
+            newest = itertools.islice(reversed(self._events), count)
+            return [frame for _, frame in newest][::-1], self._seq, True
+
+    def stats(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self._seq, 'buffered': len(self._events),
+                    'published': self._published}
+
+
+class EventStreamServer:
+    """单线程 asyncio SSE 服务
+
+    path 为订阅地址；heartbeat 秒内没有事件时发送注释行保持连接；
+    write_timeout 秒内写不出去的连接视为已断开；max_subscribers 为同时订阅的连接上限。
+    publish_port 不为 None 时在 publish_host:publish_port 上单独监听 {path}/publish，接收其他
+    工作进程转发的事件（订阅端口上不提供）；设置了 publish_token 时要求请求头 X-Stream-Token
+    与之相同。发布端口监听非本机地址时必须设置 publish_token。
+    """
+
+    MAX_PUBLISH_BODY = 16 * 1024 * 1024
+
+    def __init__(self, hub, host='0.0.0.0', port=5002, path='/api/stream', heartbeat=15.0,
+                 write_timeout=30.0, max_subscribers=10000, retry_ms=3000, publish_token=None,
+                 publish_host='127.0.0.1', publish_port=None):
+        if publish_port is not None and publish_host not in LOOPBACK_HOSTS and not publish_token:
+            raise ValueError(f'发布端口监听 {publish_host} 时必须设置转发口令')
+        self.hub = hub
+        self.host = host
+        self.port = port
+        self.publish_host = publish_host
+        self.publish_port = publish_port
+        self.path = path
+        self.heartbeat = heartbeat
+        self.write_timeout = write_timeout
+        self.max_subscribers = max_subscribers
+        self.retry_ms = retry_ms
+        self.publish_token = publish_token
+        self._loop = None
+        self._server = None
+        self._publish_server = None
+        self._thread = None
+        self._ready = threading.Event()
+        self._changed = None         # 当前的变化通知，有新事件时置位并换成新的
+        self._wake_pending = False
+        self._listening = False
+        self._subscribers = 0
+        self._connections = 0
+        self._forwarded = 0
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, timeout=5.0):
+        """在后台线程中启动服务，等待端口监听成功；返回是否启动成功"""
+        if self.running:
+            return True
+        self._ready.clear()
+        self._thread = threading.Thread(target=self._run, name='event-stream', daemon=True)
+        self._thread.start()
+        self._ready.wait(timeout)
+        return self._server is not None
+
+    def stop(self, timeout=5.0):
+        """关闭监听端口和全部订阅连接，停止后台线程"""
+        if self.running and self._server:
+            asyncio.run_coroutine_threadsafe(self._shutdown(), self._loop).result(timeout)
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join(timeout)
+
+    async def _shutdown(self):
+        self._server.close()
+        if self._publish_server:
+            self._publish_server.close()
+        tasks = [task for task in asyncio.all_tasks() if task is not asyncio.current_task()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _run(self):
+        loop = self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._changed = asyncio.Event()
+        self._wake_pending = False
+        try:
+            self._server = loop.run_until_complete(asyncio.start_server(self._handle, self.host, self.port))
+            self.port = self._server.sockets[0].getsockname()[1]
+            if self.publish_port is not None:
+                self._publish_server = loop.run_until_complete(
+                    asyncio.start_server(self._handle_publish, self.publish_host, self.publish_port))
+                self.publish_port = self._publish_server.sockets[0].getsockname()[1]
+            if not self._listening:
+                self._listening = True
+                self.hub.add_listener(self._on_publish)
+            logger.info(f"实时推送服务已启动: http://{self.host}:{self.port}{self.path}")
+        except OSError as e:
+            logger.error(f"实时推送服务启动失败: {str(e)}")
+            if self._server:
+                self._server.close()
+            self._server = None
+            return
+        finally:
+            self._ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            loop.close()
+
+    def _on_publish(self):
+        # 多次 publish 合并为一次跨线程唤醒
+        if not self.running or self._loop.is_closed():
+            return
+        if not self._wake_pending:
+            self._wake_pending = True
+            self._loop.call_soon_threadsafe(self._wake)
+
+    def _wake(self):
+        self._wake_pending = False
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def _read_request(self, reader):
+        """读取请求行和请求头，返回 (方法, 地址, 请求头)；请求行无效时方法和地址为 None"""
+        request_line = await asyncio.wait_for(reader.readline(), self.write_timeout)
+        headers = {}
+        while True:
+            line = await asyncio.wait_for(reader.readline(), self.write_timeout)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+        parts = request_line.decode('latin-1').split()
+        if len(parts) < 2:
+            return None, None, headers
+        return parts[0], urlsplit(parts[1]), headers
+
+    async def _handle_publish(self, reader, writer):
+        """发布端口：只接受 POST {path}/publish"""
+        try:
+            method, url, headers = await self._read_request(reader)
+            if method != 'POST' or url.path != self.path + '/publish':
+                await self._reply(writer, '404 Not Found', '未知的地址')
+                return
+            await self._publish(reader, writer, headers)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"实时推送转发连接异常: {str(e)}")
+        finally:
+            writer.close()
+
+    async def _handle(self, reader, writer):
+        self._connections += 1
+        try:
+            method, url, headers = await self._read_request(reader)
+            if not url or method not in ('GET', 'OPTIONS') or url.path != self.path:
+                await self._reply(writer, '404 Not Found', '未知的地址')
+                return
+            if method == 'OPTIONS':
+                await self._reply(writer, '204 No Content', '')
+                return
+            if self._subscribers >= self.max_subscribers:
+                await self._reply(writer, '503 Service Unavailable', '订阅连接数已达上限')
+                return
+
+            last_event_id = headers.get('last-event-id') or parse_qs(url.query).get('last_event_id', [None])[0]
+            await self._stream(writer, last_event_id)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            logger.error(f"实时推送连接异常: {str(e)}")
+        finally:
+            self._connections -= 1
+            writer.close()
+
+    async def _publish(self, reader, writer, headers):
+        """发布转发来的事件，请求体为 [[事件类型, 数据], ...]；有无效的事件时整批拒绝"""
+        if self.publish_token and not hmac.compare_digest(headers.get('x-stream-token', '').encode('latin-1'),
+                                                          self.publish_token.encode('utf-8')):
+            await self._reply(writer, '403 Forbidden', '不允许转发事件')
+            return
+        # 浏览器跨站请求无法不经预检发送 JSON 类型的请求体
+        if headers.get('content-type', '').split(';')[0].strip() != 'application/json':
+            await self._reply(writer, '415 Unsupported Media Type', '请求体应为 JSON')
+            return
+        length = headers.get('content-length', '')
+        if not length.isdigit() or int(length) > self.MAX_PUBLISH_BODY:
+            await self._reply(writer, '400 Bad Request', '请求体长度无效')
+            return
+        body = await asyncio.wait_for(reader.readexactly(int(length)), self.write_timeout)
+        try:
+            events = json.loads(body)
+        except ValueError:
+            await self._reply(writer, '400 Bad Request', '请求体不是有效的 JSON')
+            return
+        if not isinstance(events, list) or not all(
+                isinstance(item, list) and len(item) == 2 and item[0] in EVENT_TYPES for item in events):
+            await self._reply(writer, '400 Bad Request', '事件格式无效或事件类型未知')
+            return
+        for event, data in events:
+            self.hub.publish(event, data)
+        self._forwarded += len(events)
+        await self._reply(writer, '204 No Content', '')
+
+    async def _reply(self, writer, status, body):
+        body = body.encode('utf-8')
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: text/plain; charset=utf-8\r\nContent-Length: {len(body)}\r\n"
+            f"Access-Control-Allow-Origin: *\r\nAccess-Control-Allow-Headers: Last-Event-ID\r\n"
+            f"Connection: close\r\n\r\n".encode('latin-1') + body
+        )
+        await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+    async def _stream(self, writer, last_event_id):
+        hub = self.hub
+        self._subscribers += 1
+        try:
+            writer.write(
+                b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream; charset=utf-8\r\n"
+                b"Cache-Control: no-cache\r\nConnection: keep-alive\r\nX-Accel-Buffering: no\r\n"
+                b"Access-Control-Allow-Origin: *\r\n\r\n"
+                + f"retry: {self.retry_ms}\n\n".encode('latin-1')
+            )
+            cursor = hub.parse_event_id(last_event_id)
+            if cursor is None:
+                # 首次连接只接收之后的事件；带着其他纪元的编号重连说明服务重启过，需要整体重新加载
+                cursor = hub.seq
+                if last_event_id:
+                    writer.write(self._reset_frame(cursor))
+            await asyncio.wait_for(writer.drain(), self.write_timeout)
+
+            while True:
+                changed = self._changed
+                frames, latest, complete = hub.frames_since(cursor)
+                if not complete:
+                    frames = [self._reset_frame(latest)]
+                cursor = latest
+                if frames:
+                    writer.write(b''.join(frames))
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+                    continue
+                try:
+                    await asyncio.wait_for(changed.wait(), self.heartbeat)
+                except asyncio.TimeoutError:
+                    writer.write(b': ping\n\n')
+                    await asyncio.wait_for(writer.drain(), self.write_timeout)
+        finally:
+            self._subscribers -= 1
+
+    def _reset_frame(self, seq):
+        return f"id: {self.hub.epoch}-{seq}\nevent: reset\ndata: {{}}\n\n".encode('utf-8')
+
+    def stats(self):
+        return {'running': self.running, 'port': self.port, 'publish_port': self.publish_port,
+                'subscribers': self._subscribers,
+                'connections': self._connections, 'forwarded': self._forwarded, **self.hub.stats()}
+
+
+class EventForwarder:
+    """把事件转发给运行推送服务的进程
+
+    publish 只放入有界队列，不阻塞写入路径；后台线程把积压的事件合并为一次 POST 发出。
+    推送服务不可用（调度进程切换中）时事件被丢弃，恢复后先发送 reset，由前端整体重新加载。
+    url 为空时不转发。
+    """
+
+    def __init__(self, url=None, token=None, capacity=10000, batch_size=500, timeout=2.0):
+        self.url = url
+        self.token = token
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self._queue = queue.Queue(maxsize=capacity)
+        self._thread = None
+        self._lock = threading.Lock()
+        self._lost = False
+        self._sent = 0
+        self._dropped = 0
+        self._failures = 0
+
+    @property
+    def enabled(self):
+        return bool(self.url)
+
+    def publish(self, event, data):
+        if not self.enabled:
+            return
+        self._ensure_thread()
+        try:
+            self._queue.put_nowait((event, data))
+        except queue.Full:
+            self._dropped += 1
+            self._lost = True
+
+    def _ensure_thread(self):
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='event-forwarder', daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self.flush(batch)
+
+    def flush(self, batch):
+        """发送一批事件，返回是否成功"""
+        if self._lost:
+            batch = [('reset', {})] + batch
+        try:
+            self._post(json.dumps(batch, ensure_ascii=False, default=str).encode('utf-8'))
+        except (OSError, http.client.HTTPException) as e:
+            self._failures += 1
+            self._dropped += len(batch)
+            if not self._lost:
+                logger.warning(f"转发实时推送事件失败: {str(e)}")
+            self._lost = True
+            return False
+        self._lost = False
+        self._sent += len(batch)
+        return True
+
+    def _post(self, body):
+        url = urlsplit(self.url)
+        connection = http.client.HTTPConnection(url.hostname, url.port or 80, timeout=self.timeout)
+        try:
+            headers = {'Content-Type': 'application/json'}
+            if self.token:
+                headers['X-Stream-Token'] = self.token
+            connection.request('POST', url.path, body, headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status >= 300:
+                raise http.client.HTTPException(f'HTTP {response.status}')
+        finally:
+            connection.close()
+
+    def stats(self):
+        return {'url': self.url, 'queued': self._queue.qsize(), 'sent': self._sent,
+                'dropped': self._dropped, 'failures': self._failures}
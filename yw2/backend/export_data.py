@@ -0,0 +1,71 @@
+# backend/export_data.py
+"""环境数据批量导出（命令行）
+
+与 /api/environment/data/export 使用相同的实现：服务端游标分块读取，按行组写出 Parquet、
+Arrow IPC 流或 gzip 压缩的 CSV，内存占用与导出行数无关。数据库为 YW2_DATABASE_URI。
+
+用法：
+    python export_data.py --start 2024-01-01 --end 2024-03-31 --output env_q1.parquet
+    python export_data.py --start 2024-01-01 --end 2024-01-01 --region R001 --format csv --output - > day.csv.gz
+"""
+import argparse
+import os
+import sys
+import time
+
+import data_export
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='环境数据批量导出')
+    parser.add_argument('--start', required=True, help='开始日期（YYYY-MM-DD 或 YYYY-MM-DD HH:MM:SS）')
+    parser.add_argument('--end', required=True, help='结束日期（只有日期时包含当天）')
+    parser.add_argument('--region', help='只导出该区域')
+    parser.add_argument('--indicator', help='只导出该指标')
+    parser.add_argument('--format', choices=list(data_export.EXPORT_FORMATS),
+                        help='导出格式，默认 parquet（未安装 pyarrow 时为 csv）')
+    parser.add_argument('--row-group-size', type=int, help='每个行组的行数')
+    parser.add_argument('--output', help='输出文件，- 表示标准输出；默认按时间范围和格式命名')
+    args = parser.parse_args(argv)
+
+    # 解析参数后再导入应用（--help 不需要数据库配置）
+    import app as app_module
+
+    try:
+        params = app_module.export_params({
+            'start_date': args.start, 'end_date': args.end, 'region_id': args.region,
+            'indicator_id': args.indicator, 'format': args.format, 'row_group_size': args.row_group_size,
+        })
+    except ValueError as e:
+        parser.error(str(e))
+    output = args.output or app_module.export_file_name(params)
+
+    last_report = [0.0]
+
+    def progress(rows):
+        now = time.monotonic()
+        if now - last_report[0] >= 1.0:
+            last_report[0] = now
+            print(f'\r已导出 {rows} 条', end='', file=sys.stderr, flush=True)
+
+    with app_module.app.app_context():
+        if output == '-':
+            result = app_module.export_environment_data(sys.stdout.buffer, params, progress=progress)
+            sys.stdout.buffer.flush()
+        else:
+            try:
+                with open(output + '.part', 'wb') as f:
+                    result = app_module.export_environment_data(f, params, progress=progress)
+                os.replace(output + '.part', output)
+            except BaseException:
+                if os.path.exists(output + '.part'):
+                    os.remove(output + '.part')
+                raise
+
+    print(f"\r已导出 {result['rows']} 条，{result['row_groups']} 个行组，格式 {result['format']}，"
+          f"耗时 {result['elapsed_seconds']}s" + ('' if output == '-' else f" -> {output}"), file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
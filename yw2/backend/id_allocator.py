@@ -0,0 +1,119 @@
+# backend/id_allocator.py
+"""按号段预留的数据ID分配器
+
+每个进程从 id_sequence 表中一次预留一段连续的号码（号段），
+之后在内存中逐个发放，不再对 environment_data 执行 SELECT MAX()。
+号段预留依赖数据库行锁，多进程并发时号段之间互不重叠。
+"""
+import logging
+import threading
+
+from sqlalchemy import text
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BLOCK_SIZE = 100
+
+
+class DataIdAllocator:
+    """环境数据ID分配器（线程安全，多进程安全）"""
+
+    def __init__(self, engine_getter, seq_name='environment_data', prefix='ED',
+                 width=6, block_size=DEFAULT_BLOCK_SIZE, seed_table='environment_data',
+                 seed_column='data_id'):
+        # engine_getter 延迟获取引擎，避免在应用上下文之外访问 db.engine
+        self._engine_getter = engine_getter
+        self.seq_name = seq_name
+        self.prefix = prefix
+        self.width = width
+        self.block_size = block_size
+        self.seed_table = seed_table
+        self.seed_column = seed_column
+
+        self._lock = threading.Lock()
+        self._next = 0
+        self._end = 0  # 当前号段的上界（不含）
+
+    def format_id(self, num):
+        return f"{self.prefix}{num:0{self.width}d}"
+
+    def next_id(self):
+        """获取一个新的数据ID"""
+        return self.format_id(self.reserve(1)[0])
+
+    def next_ids(self, count):
+        """批量获取数据ID，返回列表"""
+        return [self.format_id(num) for num in self.reserve(count)]
+
+    def reserve(self, count):
+        """从本地号段中取出 count 个编号，不足时向数据库预留新号段"""
+        if count <= 0:
+            return []
+
+        with self._lock:
+            numbers = []
+            while len(numbers) < count:
+                if self._next >= self._end:
+                    # 大批量请求时一次预留足够的号段，减少往返
+                    need = count - len(numbers)
+                    self._next, self._end = self._reserve_block(max(self.block_size, need))
+                take = min(count - len(numbers), self._end - self._next)
+                numbers.extend(range(self._next, self._next + take))
+                self._next += take
+            return numbers
+
+    def _reserve_block(self, size):
+        """在独立事务中预留号段，返回 (起始编号, 结束编号)"""
+        engine = self._engine_getter()
+        for attempt in range(2):
+            with engine.begin() as conn:
+                # UPDATE 会持有该行的写锁直到提交，随后的 SELECT 读到的是本事务写入的值，
+                # 因此并发进程拿到的号段一定不重叠
+                updated = conn.execute(
+                    text("UPDATE id_sequence SET next_val = next_val + :size WHERE seq_name = :name"),
+                    {'size': size, 'name': self.seq_name}
+                ).rowcount
+                if updated:
+                    end = conn.execute(
+                        text("SELECT next_val FROM id_sequence WHERE seq_name = :name"),
+                        {'name': self.seq_name}
+                    ).scalar()
+                    logger.debug(f"预留号段 {self.seq_name}: [{end - size}, {end})")
+                    return end - size, end
+
+            if attempt == 0:
+                self._init_sequence(engine)
+
+        raise RuntimeError(f"无法初始化序列: {self.seq_name}")
+
+    def _init_sequence(self, engine):
+        """首次使用时根据现有数据的最大编号初始化序列"""
+        start = self._current_max(engine) + 1
+        try:
+            with engine.begin() as conn:
+                conn.execute(
+                    text("INSERT INTO id_sequence (seq_name, next_val) VALUES (:name, :start)"),
+                    {'name': self.seq_name, 'start': start}
+                )
+            logger.info(f"序列 {self.seq_name} 初始化完成，起始编号: {start}")
+        except Exception as e:
+            # 其他进程已完成初始化
+            logger.info(f"序列 {self.seq_name} 已由其他进程初始化: {str(e)}")
+
+    def _current_max(self, engine):
+        """获取现有数据中的最大编号（只在序列初始化时执行一次）"""
+        # 编号超过6位后字符串比较会出错，因此先按长度再按值排序
+        sql = text(
+            f"SELECT {self.seed_column} FROM {self.seed_table} "
+            f"WHERE {self.seed_column} LIKE :prefix "
+            f"ORDER BY LENGTH({self.seed_column}) DESC, {self.seed_column} DESC LIMIT 1"
+        )
+        with engine.connect() as conn:
+            max_id = conn.execute(sql, {'prefix': f"{self.prefix}%"}).scalar()
+
+        if max_id:
+            try:
+                return int(max_id[len(self.prefix):])
+            except ValueError:
+                logger.warning(f"无法解析最大编号 {max_id}，序列从1开始")
+        return 0
@@ -0,0 +1,367 @@
+# backend/ingest_queue.py
+"""环境数据异步写入队列
+
+接口线程校验数据后把记录放进有界内存队列，立即返回；后台写入线程按条数或时间
+成批写库。每条记录入队前先追加到本地落盘文件（按段轮转），写库成功后删除已
+全部落库的旧段；进程崩溃后重启时把落盘文件中尚未入库的记录补写回数据库。
+
+多个工作进程可以共用同一个落盘目录：每个进程在其中创建自己的子目录并对子目录
+中的锁文件加排他锁，进程退出后锁自动释放，其他进程启动时只接管未被加锁的子目录。
+
+写库失败时只有暂时性错误（连接断开、锁等待超时等，由 is_transient 判断）退避重试；
+其他错误（外键、唯一约束等）把该批记录二分拆开重写，定位出无法写入的单条记录，
+移入落盘目录中的死信文件（dead-letter.jsonl）并记录日志，不阻塞后续记录。
+补写落盘文件时无法解析的行同样移入死信文件。
+"""
+import glob
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+try:
+    import fcntl
+except ImportError:  # Windows 开发环境没有 fcntl，按单进程处理
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SPILL_FILE_PATTERN = 'ingest-*.jsonl'
+OWNER_LOCK_FILE = 'owner.lock'
+DEAD_LETTER_FILE = 'dead-letter.jsonl'
+
+
+def _encode_row(row):
+    data = dict(row)
+    if isinstance(data.get('collection_time'), datetime):
+        data['collection_time'] = data['collection_time'].isoformat()
+    return json.dumps(data, ensure_ascii=False)
+
+
+def _decode_row(line):
+    data = json.loads(line)
+    if data.get('collection_time'):
+        data['collection_time'] = datetime.fromisoformat(data['collection_time'])
+    return data
+
+
+class IngestQueueFull(Exception):
+    """队列已满（调用方应返回 429）"""
+
+
+def _default_is_transient(error):
+    return isinstance(error, (ConnectionError, TimeoutError))
+
+
+class IngestQueue:
+    """有界异步写入队列（线程安全）"""
+
+    def __init__(self, writer, maxsize=10000, batch_size=500, flush_interval=1.0,
+                 spill_dir=None, segment_size=10000, fsync=False, existing_ids=None, is_transient=None,
+                 max_retry_delay=30.0):
+        # writer(rows)：在一个事务中写入并提交一批记录，失败时抛出异常
+        # existing_ids(data_ids)：返回已在库中的ID集合，用于补写时去重
+        # is_transient(error)：写库异常是否为暂时性错误（重试可能成功）
+        self._writer = writer
+        self._existing_ids = existing_ids
+        self._is_transient = is_transient or _default_is_transient
+        self.max_retry_delay = max_retry_delay
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_dir = spill_dir
+        self.segment_size = segment_size
+        self.fsync = fsync
+
+        self._items = deque()  # (入队时间, 段号, 记录)
+        self._cond = threading.Condition()
+        self._thread = None
+        self._stopping = False
+
+        # 落盘文件
+        self._owner_dir = None
+        self._owner_lock = None
+        self._segment = 0
+        self._segment_count = 0
+        self._spill_file = None
+
+        # 指标
+        self._accepted = 0
+        self._rejected = 0
+        self._flushed_rows = 0
+        self._flush_count = 0
+        self._failed_flushes = 0
+        self._dead_lettered = 0
+        self._last_flush_ms = 0.0
+        self._max_flush_ms = 0.0
+        self._total_flush_ms = 0.0
+
+    # ---------- 生命周期 ----------
+    def start(self):
+        """补写上次遗留的落盘记录并启动后台写入线程（重复调用无副作用）"""
+        with self._cond:
+            if self._thread is not None:
+                return
+            if self.spill_dir:
+                os.makedirs(self.spill_dir, exist_ok=True)
+                self._recover_orphans()
+                self._claim_owner_dir()
+                self._open_segment(1)
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name='ingest-writer', daemon=True)
+            self._thread.start()
+        logger.info(f"异步写入队列已启动，容量 {self.maxsize}，批量 {self.batch_size}，间隔 {self.flush_interval}秒")
+
+    def stop(self, timeout=10.0):
+        """停止写入线程，退出前写完队列中的剩余记录"""
+        with self._cond:
+            if self._thread is None:
+                return
+            self._stopping = True
+            self._cond.notify_all()
+            thread = self._thread
+        thread.join(timeout)
+        with self._cond:
+            self._thread = None
+            if self._spill_file:
+                self._spill_file.close()
+                self._spill_file = None
+            if self._owner_dir and not self._items:
+                # 正常退出且已全部写库，删除自己的落盘目录
+                shutil.rmtree(self._owner_dir, ignore_errors=True)
+            if self._owner_lock:
+                self._owner_lock.close()
+                self._owner_lock = None
+            self._owner_dir = None
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    # ---------- 入队 ----------
+    def submit(self, row):
+        """提交一条记录；队列已满时抛出 IngestQueueFull"""
+        with self._cond:
+            if len(self._items) >= self.maxsize:
+                self._rejected += 1
+                raise IngestQueueFull()
+            # 先落盘再入队，保证已确认的记录不会因崩溃丢失
+            self._spill(row)
+            self._items.append((time.monotonic(), self._segment, row))
+            self._accepted += 1
+            # 队列由空变为非空时唤醒写入线程开始计时；攒满一批时立即写入
+            if len(self._items) == 1 or len(self._items) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _spill(self, row):
+        if not self._spill_file:
+            return
+        if self._segment_count >= self.segment_size:
+            self._open_segment(self._segment + 1)
+        self._spill_file.write(_encode_row(row) + '\n')
+        self._spill_file.flush()
+        if self.fsync:
+            os.fsync(self._spill_file.fileno())
+        self._segment_count += 1
+
+    def _segment_path(self, segment):
+        return os.path.join(self._owner_dir, f'ingest-{segment:012d}.jsonl')
+
+    def _open_segment(self, segment):
+        if self._spill_file:
+            self._spill_file.close()
+        self._segment = segment
+        self._segment_count = 0
+        self._spill_file = open(self._segment_path(segment), 'a', encoding='utf-8')
+
+    # ---------- 写入线程 ----------
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._stopping and not self._batch_ready():
+                    timeout = self._time_to_deadline()
+                    self._cond.wait(timeout)
+                if self._stopping and not self._items:
+                    return
+                batch = [self._items.popleft() for _ in range(min(self.batch_size, len(self._items)))]
+
+            self._flush(batch)
+
+    def _batch_ready(self):
+        if not self._items:
+            return False
+        if len(self._items) >= self.batch_size:
+            return True
+        return time.monotonic() - self._items[0][0] >= self.flush_interval
+
+    def _time_to_deadline(self):
+        if not self._items:
+            return None
+        return max(0.0, self.flush_interval - (time.monotonic() - self._items[0][0]))
+
+    def _flush(self, batch):
+        rows = [item[2] for item in batch]
+        start = time.perf_counter()
+        written = self._write(rows, retry=True)
+
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        with self._cond:
+            self._flushed_rows += written
+            self._flush_count += 1
+            self._last_flush_ms = elapsed_ms
+            self._max_flush_ms = max(self._max_flush_ms, elapsed_ms)
+            self._total_flush_ms += elapsed_ms
+            self._release_segments()
+
+    def _write(self, rows, retry):
+        """写入一批记录，返回写入的条数
+
+        暂时性错误：retry 时退避重试（记录仍在落盘文件中，重试期间队列满时接口返回 429），
+        否则抛出；其他错误：二分拆批重写，单条仍失败时移入死信文件。
+        """
+        attempt = 0
+        while True:
+            try:
+                self._writer(rows)
+                return len(rows)
+            except Exception as e:
+                with self._cond:
+                    self._failed_flushes += 1
+                if self._is_transient(e):
+                    if not retry:
+                        raise
+                    attempt += 1
+                    logger.error(f"异步写入失败（第{attempt}次），稍后重试: {str(e)}")
+                    time.sleep(min(self.max_retry_delay, 0.5 * 2 ** min(attempt, 6)))
+                    continue
+                if len(rows) == 1:
+                    self._dead_letter(rows[0], e)
+                    return 0
+                logger.warning(f"异步写入 {len(rows)} 条记录失败，拆分后重写: {str(e)}")
+                middle = len(rows) // 2
+                return self._write(rows[:middle], retry) + self._write(rows[middle:], retry)
+
+    def _dead_letter(self, row, error, raw=None):
+        """把无法写入（或无法解析）的记录追加到死信文件"""
+        with self._cond:
+            self._dead_lettered += 1
+        entry = {'failed_at': datetime.utcnow().isoformat(), 'error': str(error)}
+        if raw is not None:
+            entry['raw'] = raw
+        else:
+            entry['row'] = json.loads(_encode_row(row))
+            logger.error(f"记录 {row.get('data_id')} 无法写入，已移入死信文件: {str(error)}")
+        if not self.spill_dir:
+            return
+        with open(os.path.join(self.spill_dir, DEAD_LETTER_FILE), 'a', encoding='utf-8') as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + '\n')
+
+    def _release_segments(self):
+        """删除记录已全部落库的旧段文件（调用方持有锁）"""
+        if not self.spill_dir:
+            return
+        if not self._owner_dir:
+            return
+        oldest_pending = self._items[0][1] if self._items else self._segment
+        for path in glob.glob(os.path.join(self._owner_dir, SPILL_FILE_PATTERN)):
+            segment = int(os.path.basename(path)[len('ingest-'):-len('.jsonl')])
+            if segment < oldest_pending:
+                os.remove(path)
+
+    # ---------- 崩溃恢复 ----------
+    @staticmethod
+    def _try_lock(path):
+        """对锁文件加非阻塞排他锁，成功时返回已打开的文件对象"""
+        lock_file = open(path, 'a')
+        if fcntl is None:
+            return lock_file
+        try:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock_file
+        except OSError:
+            lock_file.close()
+            return None
+
+    def _claim_owner_dir(self):
+        # 先在临时名下加锁再改名，避免其他进程在加锁前把它当作遗留目录接管
+        tmp_dir = tempfile.mkdtemp(prefix=f'claim-{os.getpid()}-', dir=self.spill_dir)
+        self._owner_lock = self._try_lock(os.path.join(tmp_dir, OWNER_LOCK_FILE))
+        self._owner_dir = os.path.join(self.spill_dir, 'worker-' + os.path.basename(tmp_dir)[len('claim-'):])
+        os.rename(tmp_dir, self._owner_dir)
+
+    def _recover_orphans(self):
+        """接管已退出进程留下的落盘目录"""
+        for owner_dir in sorted(glob.glob(os.path.join(self.spill_dir, 'worker-*'))):
+            try:
+                lock_file = self._try_lock(os.path.join(owner_dir, OWNER_LOCK_FILE))
+            except FileNotFoundError:
+                continue  # 已被其他进程接管并删除
+            if lock_file is None:
+                continue  # 所属进程仍在运行
+            try:
+                self._recover_spill_files(owner_dir)
+                shutil.rmtree(owner_dir, ignore_errors=True)
+            except Exception as e:
+                # 数据库暂时不可用：保留目录，下次启动时再补写
+                logger.error(f"补写落盘目录 {owner_dir} 失败，保留待下次启动补写: {str(e)}")
+            finally:
+                lock_file.close()
+
+    def _recover_spill_files(self, owner_dir):
+        paths = sorted(glob.glob(os.path.join(owner_dir, SPILL_FILE_PATTERN)))
+        recovered = 0
+        for path in paths:
+            rows = []
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if not line:
+                        continue
+                    try:
+                        row = _decode_row(line)
+                        if not isinstance(row, dict) or not row.get('data_id'):
+                            raise ValueError('不是有效的记录')
+                        rows.append(row)
+                    except (ValueError, TypeError, AttributeError) as e:
+                        # 崩溃时可能留下半行，或文件已损坏：移入死信文件，继续补写其他记录
+                        logger.warning(f"跳过无法解析的落盘记录: {path}")
+                        self._dead_letter(None, e, raw=line)
+
+            for start in range(0, len(rows), self.batch_size):
+                chunk = rows[start:start + self.batch_size]
+                if self._existing_ids:
+                    existing = self._existing_ids([row['data_id'] for row in chunk])
+                    chunk = [row for row in chunk if row['data_id'] not in existing]
+                if chunk:
+                    # 暂时性错误抛出（保留落盘目录），其他错误拆批定位后移入死信文件
+                    recovered += self._write(chunk, retry=False)
+            os.remove(path)
+
+        if paths:
+            logger.info(f"已从 {len(paths)} 个落盘文件补写 {recovered} 条记录")
+
+    # ---------- 指标 ----------
+    def metrics(self):
+        with self._cond:
+            return {
+                'running': self.running,
+                'queue_depth': len(self._items),
+                'capacity': self.maxsize,
+                'oldest_item_age_ms': round((time.monotonic() - self._items[0][0]) * 1000, 1) if self._items else 0,
+                'accepted': self._accepted,
+                'rejected': self._rejected,
+                'flushed_rows': self._flushed_rows,
+                'flush_count': self._flush_count,
+                'failed_flushes': self._failed_flushes,
+                'dead_lettered': self._dead_lettered,
+                'last_flush_latency_ms': round(self._last_flush_ms, 2),
+                'max_flush_latency_ms': round(self._max_flush_ms, 2),
+                'avg_flush_latency_ms': round(self._total_flush_ms / self._flush_count, 2) if self._flush_count else 0,
+                'spill_dir': self._owner_dir,
+                'spill_segment': self._segment if self._owner_dir else None
+            }
@@ -0,0 +1,328 @@
+# backend/job_runner.py
+"""后台任务：把耗时操作（重新计算异常、生成报告、导出等）移出HTTP请求
+
+任务提交后写入 background_job 表并交给进程内线程池执行，接口立即返回任务ID；
+执行过程中定期把进度写回表中，前端通过 /api/jobs/<id> 轮询进度和结果。
+取消请求同样写入表中，因此可以由任意工作进程发起；任务函数在汇报进度时检查
+取消标记并抛出 JobCancelled 退出。
+
+运行中的任务定期刷新心跳时间，进程重启后，心跳超时的未完成任务标记为已中断。
+"""
+import json
+import logging
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+JOB_PENDING = 'pending'
+JOB_RUNNING = 'running'
+JOB_SUCCEEDED = 'succeeded'
+JOB_FAILED = 'failed'
+JOB_CANCELLED = 'cancelled'
+JOB_INTERRUPTED = 'interrupted'
+
+ACTIVE_STATUSES = (JOB_PENDING, JOB_RUNNING)
+
+
+class JobCancelled(Exception):
+    """任务已被取消（由任务函数在检查点抛出）"""
+
+
+def _dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=str)
+
+
+class JobContext:
+    """传给任务函数的上下文：汇报进度、检查取消"""
+
+    def __init__(self, runner, job_id, cancel_event):
+        self._runner = runner
+        self.job_id = job_id
+        self._cancel_event = cancel_event
+        self.rows_processed = 0
+        self.rows_total = None
+        self.message = None
+        self._last_write = 0.0
+
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+
+    def set_total(self, rows_total):
+        self.rows_total = rows_total
+        self._write(force=True)
+
+    def progress(self, rows_processed, rows_total=None, message=None):
+        """更新进度（按间隔写库）；任务已被取消时抛出 JobCancelled"""
+        self.rows_processed = rows_processed
+        if rows_total is not None:
+            self.rows_total = rows_total
+        if message is not None:
+            self.message = message
+        self._write()
+        self.check_cancelled()
+
+    def check_cancelled(self):
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+
+    def _write(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_write < self._runner.progress_interval:
+            return
+        self._last_write = now
+        if self._runner._write_progress(self.job_id, self.rows_processed, self.rows_total, self.message):
+            # 取消请求可能来自其他工作进程
+            self._cancel_event.set()
+
+
+class JobRunner:
+    """后台任务执行器（线程安全）"""
+
+    def __init__(self, engine_getter, table, context_factory=None, max_workers=2,
+                 progress_interval=1.0, heartbeat_interval=10.0):
+        # table：background_job 表对象；context_factory：返回任务执行所需的上下文（如应用上下文）
+        self._engine_getter = engine_getter
+        self.table = table
+        self._context_factory = context_factory or nullcontext
+        self.max_workers = max_workers
+        self.progress_interval = progress_interval
+        self.heartbeat_interval = heartbeat_interval
+
+        self._handlers = {}
+        self._lock = threading.Lock()
+        self._executor = None
+        self._heartbeat_thread = None
+        self._stopping = threading.Event()
+        self._running = {}  # job_id -> 取消事件
+
+    # ---------- 注册与提交 ----------
+    def register(self, job_type, func):
+        """注册任务类型；func(ctx, **params) 的返回值作为任务结果保存"""
+        self._handlers[job_type] = func
+
+    @property
+    def job_types(self):
+        return sorted(self._handlers)
+
+    def submit(self, job_type, params=None):
+        """创建任务记录并放入线程池，返回任务ID"""
+        if job_type not in self._handlers:
+            raise ValueError(f'未知的任务类型: {job_type}')
+        params = params or {}
+        job_id = uuid.uuid4().hex
+        now = datetime.utcnow()
+        with self._engine_getter().begin() as conn:
+            conn.execute(self.table.insert().values(
+                job_id=job_id, job_type=job_type, status=JOB_PENDING, params=_dumps(params),
+                rows_processed=0, cancel_requested=False, created_at=now, updated_at=now
+            ))
+
+        cancel_event = threading.Event()
+        with self._lock:
+            self._ensure_started()
+            self._running[job_id] = cancel_event
+            self._executor.submit(self._run, job_id, job_type, params, cancel_event)
+        logger.info(f"后台任务已提交: {job_type} {job_id}")
+        return job_id
+
+    def _ensure_started(self):
+        if self._executor is None:
+            self._stopping.clear()
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='job-worker')
+            self._heartbeat_thread = threading.Thread(target=self._heartbeat, name='job-heartbeat', daemon=True)
+            self._heartbeat_thread.start()
+
+    def shutdown(self, wait=True):
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._stopping.set()
+            for cancel_event in self._running.values():
+                cancel_event.set()
+        if executor:
+            executor.shutdown(wait=wait)
+
+    # ---------- 执行 ----------
+    def _run(self, job_id, job_type, params, cancel_event):
+        c = self.table.c
+        try:
+            with self._context_factory():
+                with self._engine_getter().begin() as conn:
+                    started = conn.execute(
+                        self.table.update()
+                        .where(c.job_id == job_id, c.status == JOB_PENDING)
+                        .values(status=JOB_RUNNING, started_at=datetime.utcnow(), updated_at=datetime.utcnow())
+                    ).rowcount
+                if not started:
+                    return  # 开始执行前已被取消
+
+                ctx = JobContext(self, job_id, cancel_event)
+                start = time.perf_counter()
+                try:
+                    result = self._handlers[job_type](ctx, **params)
+                except JobCancelled:
+                    self._finish(job_id, ctx, JOB_CANCELLED)
+                    logger.info(f"后台任务已取消: {job_type} {job_id}")
+                except Exception as e:
+                    logger.exception(f"后台任务失败: {job_type} {job_id}")
+                    self._finish(job_id, ctx, JOB_FAILED, error=str(e))
+                else:
+                    if ctx.rows_total is not None:
+                        ctx.rows_processed = max(ctx.rows_processed, ctx.rows_total)
+                    self._finish(job_id, ctx, JOB_SUCCEEDED, result=result)
+                    logger.info(f"后台任务完成: {job_type} {job_id}，耗时 {time.perf_counter() - start:.1f}秒")
+        except Exception as e:
+            logger.error(f"更新后台任务状态失败: {job_id} {str(e)}")
+        finally:
+            with self._lock:
+                self._running.pop(job_id, None)
+
+    def _finish(self, job_id, ctx, status, result=None, error=None):
+        now = datetime.utcnow()
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                self.table.update().where(self.table.c.job_id == job_id).values(
+                    status=status, rows_processed=ctx.rows_processed, rows_total=ctx.rows_total,
+                    message=ctx.message, result=_dumps(result) if result is not None else None,
+                    error=error, finished_at=now, updated_at=now
+                )
+            )
+
+    def _write_progress(self, job_id, rows_processed, rows_total, message):
+        """写入进度并返回是否已请求取消"""
+        c = self.table.c
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                self.table.update().where(c.job_id == job_id).values(
+                    rows_processed=rows_processed, rows_total=rows_total, message=message,
+                    updated_at=datetime.utcnow()
+                )
+            )
+            return bool(conn.execute(
+                self.table.select().with_only_columns(c.cancel_requested).where(c.job_id == job_id)
+            ).scalar())
+
+    def _heartbeat(self):
+        """定期刷新本进程运行中任务的心跳时间，长时间没有汇报进度的任务也不会被误判为中断"""
+        c = self.table.c
+        while not self._stopping.wait(self.heartbeat_interval):
+            with self._lock:
+                job_ids = list(self._running)
+            if not job_ids:
+                continue
+            try:
+                with self._engine_getter().begin() as conn:
+                    conn.execute(
+                        self.table.update()
+                        .where(c.job_id.in_(job_ids), c.status.in_(ACTIVE_STATUSES))
+                        .values(updated_at=datetime.utcnow())
+                    )
+                    cancelled = conn.execute(
+                        self.table.select().with_only_columns(c.job_id)
+                        .where(c.job_id.in_(job_ids), c.cancel_requested == True)  # noqa: E712
+                    ).scalars().all()
+                with self._lock:
+                    for job_id in cancelled:
+                        if job_id in self._running:
+                            self._running[job_id].set()
+            except Exception as e:
+                logger.error(f"刷新后台任务心跳失败: {str(e)}")
+
+    # ---------- 查询与取消 ----------
+    def get(self, job_id):
+        with self._engine_getter().connect() as conn:
+            row = conn.execute(self.table.select().where(self.table.c.job_id == job_id)).first()
+        return self._to_dict(row) if row else None
+
+    def list(self, status=None, job_type=None, limit=20):
+        query = self.table.select()
+        if status:
+            query = query.where(self.table.c.status == status)
+        if job_type:
+            query = query.where(self.table.c.job_type == job_type)
+        query = query.order_by(self.table.c.created_at.desc()).limit(limit)
+        with self._engine_getter().connect() as conn:
+            return [self._to_dict(row, include_result=False) for row in conn.execute(query)]
+
+    def cancel(self, job_id):
+        """请求取消任务；尚未开始的任务直接标记为已取消。返回取消后的任务信息"""
+        c = self.table.c
+        now = datetime.utcnow()
+        with self._engine_getter().begin() as conn:
+            conn.execute(
+                self.table.update().where(c.job_id == job_id, c.status.in_(ACTIVE_STATUSES))
+                .values(cancel_requested=True, updated_at=now)
+            )
+            conn.execute(
+                self.table.update().where(c.job_id == job_id, c.status == JOB_PENDING)
+                .values(status=JOB_CANCELLED, finished_at=now)
+            )
+        with self._lock:
+            if job_id in self._running:
+                self._running[job_id].set()
+        return self.get(job_id)
+
+    def recover(self):
+        """把心跳超时的未完成任务标记为已中断（进程重启后调用），返回处理条数"""
+        c = self.table.c
+        now = datetime.utcnow()
+        stale_before = now - timedelta(seconds=self.heartbeat_interval * 3)
+        with self._lock:
+            local = list(self._running)
+        query = self.table.update().where(c.status.in_(ACTIVE_STATUSES), c.updated_at < stale_before)
+        if local:
+            query = query.where(c.job_id.notin_(local))
+        with self._engine_getter().begin() as conn:
+            count = conn.execute(
+                query.values(status=JOB_INTERRUPTED, error='工作进程已退出，任务中断',
+                             finished_at=now, updated_at=now)
+            ).rowcount
+        if count:
+            logger.warning(f"已将 {count} 个中断的后台任务标记为 {JOB_INTERRUPTED}")
+        return count
+
+    def _to_dict(self, row, include_result=True):
+        data = dict(row._mapping)
+        processed = data.get('rows_processed') or 0
+        total = data.get('rows_total')
+        started_at = data.get('started_at')
+        finished_at = data.get('finished_at')
+
+        elapsed = None
+        if started_at:
+            elapsed = ((finished_at or datetime.utcnow()) - started_at).total_seconds()
+
+        progress = None
+        eta = None
+        if total:
+            progress = round(min(100.0, processed * 100.0 / total), 1)
+            if data['status'] == JOB_RUNNING and processed and elapsed:
+                eta = round(elapsed * (total - processed) / processed, 1)
+        if data['status'] == JOB_SUCCEEDED:
+            progress = 100.0
+
+        result = {
+            'job_id': data['job_id'],
+            'job_type': data['job_type'],
+            'status': data['status'],
+            'params': json.loads(data['params']) if data.get('params') else {},
+            'progress': progress,
+            'rows_processed': processed,
+            'rows_total': total,
+            'eta_seconds': eta,
+            'elapsed_seconds': round(elapsed, 1) if elapsed is not None else None,
+            'message': data.get('message'),
+            'error': data.get('error'),
+            'cancel_requested': bool(data.get('cancel_requested')),
+            'created_at': data['created_at'].isoformat() if data.get('created_at') else None,
+            'started_at': started_at.isoformat() if started_at else None,
+            'finished_at': finished_at.isoformat() if finished_at else None
+        }
+        if include_result:
+            result['result'] = json.loads(data['result']) if data.get('result') else None
+        return result
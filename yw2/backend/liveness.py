@@ -0,0 +1,188 @@
+# backend/liveness.py
+"""设备在线状态跟踪：按上报心跳判断设备是否离线
+
+写入环境数据时在内存中记录设备的最后上报时间（O(1)，不访问数据库）。每台在线设备在
+时间轮中最多有一个到期检查：到期时若期间有新的上报，按最后上报时间重新排期，否则判定离线。
+离线判定只需推进时间轮、检查经过的槽位，与设备总数无关，也不扫描环境数据表。
+
+状态变化累积在待写入集合中，由调用方定期取出，用一条 UPDATE 批量写回设备表。
+"""
+import threading
+import time
+
+
+class TimerWheel:
+    """哈希时间轮：按到期的时间刻度把键放入槽位，推进时只检查经过的槽位
+
+    tick 为刻度长度（秒），slots 为槽位数；到期时间超过一圈的键留在槽位中，等所在的圈到来。
+    键只在到期刻度完全过去后返回（不会提前，最多延迟一个刻度）。
+    """
+
+    def __init__(self, tick=1.0, slots=3600, start=None):
+        self.tick = tick
+        self._slots = [dict() for _ in range(slots)]  # 键 -> 到期刻度
+        self._current = self._tick_of(time.time() if start is None else start)
+        self._size = 0
+
+    def _tick_of(self, timestamp):
+        return int(timestamp // self.tick)
+
+    def __len__(self):
+        return self._size
+
+    def schedule(self, key, deadline):
+        """在 deadline（时间戳）到期；同一个键只能排期一次，重新排期前应先 cancel"""
+        tick = max(self._tick_of(deadline), self._current + 1)
+        slot = self._slots[tick % len(self._slots)]
+        if key not in slot:
+            self._size += 1
+        slot[key] = tick
+        return tick
+
+    def cancel(self, key, tick):
+        if self._slots[tick % len(self._slots)].pop(key, None) is not None:
+            self._size -= 1
+
+    def advance(self, now):
+        """推进到 now，返回已到期的键列表"""
+        target = self._tick_of(now)
+        if target <= self._current:
+            return []
+        # 到期刻度 <= last 的键已经完全过期；一次推进超过一圈时每个槽位只检查一次
+        last = target - 1
+        first = max(self._current + 1, target - len(self._slots))
+        expired = []
+        for tick in range(first, target):
+            slot = self._slots[tick % len(self._slots)]
+            due = [key for key, key_tick in slot.items() if key_tick <= last]
+            for key in due:
+                del slot[key]
+            expired.extend(due)
+        self._size -= len(expired)
+        self._current = last
+        return expired
+
+
+class LivenessTracker:
+    """按心跳跟踪设备在线状态（线程安全）
+
+    设备的超时时间为期望上报间隔的 tolerance 倍；期望间隔取设备上报过的各指标中最短的，
+    还没有上报时使用 default_interval。
+    """
+
+    def __init__(self, default_interval=86400, tolerance=2.0, tick=1.0, slots=3600, clock=time.time):
+        self.default_interval = default_interval
+        self.tolerance = tolerance
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._wheel = TimerWheel(tick, slots, start=clock())
+        self._scheduled = {}   # 在线设备 -> 时间轮中的到期刻度
+        self._last_seen = {}
+        self._interval = {}
+        self._tracked = set()
+        self._changes = {}     # 设备 -> True（恢复在线）/ False（离线），等待写回
+
+    def _timeout(self, device_id):
+        return self._interval.get(device_id, self.default_interval) * self.tolerance
+
+    def _set_online(self, device_id, since):
+        self._scheduled[device_id] = self._wheel.schedule(device_id, since + self._timeout(device_id))
+
+    def _set_offline(self, device_id):
+        tick = self._scheduled.pop(device_id, None)
+        if tick is not None:
+            self._wheel.cancel(device_id, tick)
+
+    def sync(self, statuses):
+        """按设备表对齐跟踪的设备：statuses 为 {设备: True 在线 / False 离线 / None 其他状态}
+
+        新设备开始跟踪（在线设备从现在计时），已删除的设备停止跟踪；
+        在线/离线与设备表不一致且没有待写回的变化时以设备表为准（手工修改、其他进程写回），
+        其他状态（如故障）不调整。
+        """
+        now = self._clock()
+        with self._lock:
+            for device_id in self._tracked - set(statuses):
+                self._set_offline(device_id)
+                self._tracked.discard(device_id)
+                self._last_seen.pop(device_id, None)
+                self._interval.pop(device_id, None)
+                self._changes.pop(device_id, None)
+            for device_id, online in statuses.items():
+                self._tracked.add(device_id)
+                if online is None or device_id in self._changes:
+                    continue
+                if online and device_id not in self._scheduled:
+                    self._set_online(device_id, max(self._last_seen.get(device_id, now), now))
+                elif not online and device_id in self._scheduled:
+                    self._set_offline(device_id)
+
+    def heartbeat(self, device_id, interval=None, seen_at=None):
+        """记录一次上报，返回是否计为心跳
+
+        interval 为所报指标的期望间隔（秒）；seen_at 为采集时间戳，早于超时时间的历史数据
+        （补录、导入）不计为心跳，晚于当前时间的按当前时间计。
+        """
+        now = self._clock()
+        seen_at = now if seen_at is None else min(seen_at, now)
+        with self._lock:
+            previous_timeout = self._timeout(device_id)
+            if interval and interval < self._interval.get(device_id, float('inf')):
+                self._interval[device_id] = interval
+            if seen_at + self._timeout(device_id) <= now:
+                return False
+            self._tracked.add(device_id)
+            if seen_at > self._last_seen.get(device_id, float('-inf')):
+                self._last_seen[device_id] = seen_at
+            if device_id not in self._scheduled:
+                self._set_online(device_id, self._last_seen[device_id])
+                self._changes[device_id] = True
+            elif self._timeout(device_id) < previous_timeout:
+                # 超时时间变短（首次收到高频指标）：按新的超时时间提前到期检查
+                self._set_offline(device_id)
+                self._set_online(device_id, self._last_seen[device_id])
+            return True
+
+    def check(self, now=None):
+        """推进时间轮，返回本次判定离线的设备数"""
+        now = self._clock() if now is None else now
+        went_offline = 0
+        with self._lock:
+            for device_id in self._wheel.advance(now):
+                self._scheduled.pop(device_id, None)
+                deadline = self._last_seen.get(device_id, float('-inf')) + self._timeout(device_id)
+                if deadline > now:
+                    # 期间有新的上报：按最后上报时间重新排期
+                    self._scheduled[device_id] = self._wheel.schedule(device_id, deadline)
+                elif device_id in self._tracked:
+                    self._changes[device_id] = False
+                    went_offline += 1
+        return went_offline
+
+    def drain_changes(self):
+        """取出待写回的变化：(恢复在线的设备, 离线的设备)"""
+        with self._lock:
+            changes, self._changes = self._changes, {}
+        online = sorted(device_id for device_id, value in changes.items() if value)
+        offline = sorted(device_id for device_id, value in changes.items() if not value)
+        return online, offline
+
+    def restore_changes(self, online, offline):
+        """写回失败时放回待写入集合（期间产生的新变化优先）"""
+        with self._lock:
+            for device_ids, value in ((online, True), (offline, False)):
+                for device_id in device_ids:
+                    self._changes.setdefault(device_id, value)
+
+    def is_online(self, device_id):
+        with self._lock:
+            return device_id in self._scheduled
+
+    def stats(self):
+        with self._lock:
+            return {
+                'tracked': len(self._tracked),
+                'online': len(self._scheduled),
+                'pending_changes': len(self._changes),
+                'timers': len(self._wheel),
+            }
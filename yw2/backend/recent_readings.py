@@ -0,0 +1,197 @@
+# backend/recent_readings.py
+"""最近环境数据的内存窗口
+
+/api/environment/data/recent 按采集时间倒序取最近的若干条数据（可按区域、指标过滤），仪表盘每次刷新都会请求。
+这里在内存中按 (采集时间, 数据ID) 排序保存最新的数据：一个全局索引，每个区域、每个指标各一个索引，
+各自有条数上限。
+
+每个索引有一个下界：数据库中排序键不小于下界、属于该索引的数据都在索引中。查询时从索引尾部（最新）
+向前取，取满 limit 条，或者查询的起始时间不早于下界时，结果与数据库查询相同；否则返回 None，
+由调用方查询数据库，再用查询结果加载该索引（seed）。
+
+已提交的修改按 (旧数据, 新数据) 应用：新增的数据加入所属索引，修改的数据从旧位置移除后按新值加入，
+删除的数据移除；超过上限时丢弃最旧的数据并提高下界，早于下界的数据不保存。
+加载期间提交的修改记在有界的修改日志中，加载后重新应用一遍，加载结果不会丢失并发的修改；
+日志已不完整或期间调用过 clear 时放弃加载。
+"""
+import itertools
+import threading
+from bisect import bisect_left
+from collections import deque
+
+
+class _Index:
+    """按排序键升序保存的数据，lower 为下界"""
+
+    __slots__ = ('keys', 'rows', 'lower')
+
+    def __init__(self, lower):
+        self.keys = []
+        self.rows = []
+        self.lower = lower
+
+    def put(self, key, row, capacity):
+        if key < self.lower:
+            return
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            self.rows[pos] = row
+            return
+        self.keys.insert(pos, key)
+        self.rows.insert(pos, row)
+        if len(self.keys) > capacity:
+            drop = len(self.keys) - capacity
+            del self.keys[:drop]
+            del self.rows[:drop]
+            self.lower = self.keys[0]
+
+    def remove(self, key):
+        pos = bisect_left(self.keys, key)
+        if pos < len(self.keys) and self.keys[pos] == key:
+            del self.keys[pos]
+            del self.rows[pos]
+
+
+class RecentReadings:
+    """最近数据窗口（线程安全）
+
+    数据为字典，至少包含 data_id、collection_time 和 dimensions 中的字段；
+    capacity 为全局索引的条数上限，key_capacity 为每个区域/指标索引的条数上限，capacity 为 0 时不使用窗口。
+    """
+
+    def __init__(self, capacity=2000, key_capacity=1000, dimensions=('region_id', 'indicator_id'), log_size=10000):
+        self.capacity = capacity
+        self.key_capacity = key_capacity
+        self.dimensions = dimensions
+        self._lock = threading.Lock()
+        self._indexes = {}                  # None -> 全局索引，(字段, 值) -> 区域/指标索引；只有加载过的索引
+        self._log = deque(maxlen=log_size)  # (修改序号, 旧数据, 新数据)
+        self._seq = 0
+        self._cleared = 0                   # 最近一次 clear 的修改序号
+        self._hits = 0
+        self._misses = 0
+        self._seeded = 0
+
+    @property
+    def enabled(self):
+        return self.capacity > 0
+
+    @staticmethod
+    def sort_key(row):
+        return row['collection_time'], row['data_id']
+
+    def _index_keys(self, row):
+        yield None
+        for field in self.dimensions:
+            yield field, row[field]
+
+    def _capacity(self, index_key):
+        return self.capacity if index_key is None else self.key_capacity
+
+    def _apply(self, indexes, old, new):
+        if old is not None:
+            key = self.sort_key(old)
+            for index_key in self._index_keys(old):
+                index = indexes.get(index_key)
+                if index is not None:
+                    index.remove(key)
+        if new is not None:
+            key = self.sort_key(new)
+            for index_key in self._index_keys(new):
+                index = indexes.get(index_key)
+                if index is not None:
+                    index.put(key, new, self._capacity(index_key))
+
+    def apply(self, changes):
+        """应用已提交的修改：changes 为 (旧数据, 新数据) 列表，新增时旧数据为 None，删除时新数据为 None"""
+        if not self.enabled:
+            return
+        with self._lock:
+            for old, new in changes:
+                self._seq += 1
+                self._log.append((self._seq, old, new))
+                self._apply(self._indexes, old, new)
+
+    def clear(self):
+        """丢弃全部索引（无法逐条应用的批量修改提交后调用），之后的查询重新从数据库加载"""
+        with self._lock:
+            self._seq += 1
+            self._cleared = self._seq
+            self._indexes = {}
+            self._log.clear()
+
+    def token(self):
+        """当前的修改序号：在查询数据库之前取得，加载时据此重新应用查询期间提交的修改"""
+        with self._lock:
+            return self._seq
+
+    def query(self, since, limit, **filters):
+        """采集时间不早于 since、满足 字段=值 过滤条件（值为 None 的不过滤）的最新 limit 条数据（倒序）
+
+        窗口无法确定结果与数据库一致时返回 None。
+        """
+        filters = {field: value for field, value in filters.items() if value is not None}
+        bound = (since, '')
+        with self._lock:
+            for index_key in list(filters.items()) or [None]:
+                index = self._indexes.get(index_key)
+                if index is None:
+                    continue
+                rows = []
+                for pos in range(len(index.keys) - 1, -1, -1):
+                    if len(rows) >= limit or index.keys[pos] < bound:
+                        break
+                    row = index.rows[pos]
+                    if all(row[field] == value for field, value in filters.items()):
+                        rows.append(row)
+                if len(rows) >= limit or index.lower <= bound:
+                    self._hits += 1
+                    return rows
+            self._misses += 1
+            return None
+
+    def seed(self, rows, since, limit, token, **filters):
+        """用数据库查询结果加载索引，返回是否加载
+
+        rows 为与 query 相同条件下数据库返回的结果（倒序，最多 limit 条），token 为查询数据库前取得的修改序号。
+        同时按多个字段过滤的结果不能代表任何一个索引，不加载。
+        """
+        filters = {field: value for field, value in filters.items() if value is not None}
+        if not self.enabled or len(filters) > 1 or limit <= 0:
+            return False
+        index_key = next(iter(filters.items()), None)
+        capacity = self._capacity(index_key)
+        # 取满 limit 条时只有不早于最后一条的数据是完整的
+        lower = self.sort_key(rows[-1]) if len(rows) >= limit else (since, '')
+        kept = rows[:capacity][::-1]
+
+        with self._lock:
+            if self._cleared > token:
+                return False
+            if self._seq > token and (not self._log or self._log[0][0] > token + 1):
+                return False
+            index = _Index(lower)
+            index.keys = [self.sort_key(row) for row in kept]
+            index.rows = kept
+            if len(rows) > capacity:
+                index.lower = index.keys[0]
+            # 查询期间提交的修改（数据库结果可能已包含，重新应用的结果相同）
+            pending = list(itertools.takewhile(lambda entry: entry[0] > token, reversed(self._log)))
+            for _, old, new in reversed(pending):
+                self._apply({index_key: index}, old, new)
+            self._indexes[index_key] = index
+            self._seeded += 1
+            return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                'enabled': self.enabled,
+                'capacity': self.capacity,
+                'key_capacity': self.key_capacity,
+                'indexes': len(self._indexes),
+                'rows': sum(len(index.keys) for index in self._indexes.values()),
+                'hits': self._hits,
+                'misses': self._misses,
+                'seeded': self._seeded,
+            }
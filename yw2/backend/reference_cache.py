@@ -0,0 +1,115 @@
+# backend/reference_cache.py
+"""参考数据缓存：监测指标、监测设备、区域信息
+
+三张表很少变化，但几乎每条监测数据都要查询。这里在进程内保存一份只读快照，
+快照带有版本号；增删改接口提交后递增 data_version 表中的版本号，
+其他工作进程按固定间隔比对版本号，发现变化时整体重新加载。
+"""
+import logging
+import threading
+import time
+from collections import namedtuple
+
+logger = logging.getLogger(__name__)
+
+IndicatorRef = namedtuple('IndicatorRef', [
+    'indicator_id', 'indicator_name', 'unit', 'standard_upper', 'standard_lower', 'monitor_freq'
+])
+DeviceRef = namedtuple('DeviceRef', [
+    'device_id', 'device_type', 'region_id', 'install_time', 'calibration_cycle',
+    'operation_status', 'comm_proto'
+])
+RegionRef = namedtuple('RegionRef', ['region_id', 'region_name'])
+
+# generation：本进程第几次加载（版本号相同而定期重新加载时也会变化）
+ReferenceSnapshot = namedtuple('ReferenceSnapshot', ['version', 'indicators', 'devices', 'regions', 'generation'])
+
+
+class ReferenceDataCache:
+    """带版本号的进程内参考数据缓存（线程安全）"""
+
+    def __init__(self, loader, version_reader, check_interval=2.0, max_age=300.0):
+        # loader() -> (indicators, devices, regions)，三个以主键为键的字典
+        # version_reader() -> 数据库中当前的版本号
+        # max_age：区域表由其他业务线维护，不经过本系统的接口，因此定期强制重新加载
+        self._loader = loader
+        self._version_reader = version_reader
+        self.check_interval = check_interval
+        self.max_age = max_age
+
+        self._lock = threading.Lock()
+        self._snapshot = None
+        self._last_check = 0.0
+        self._loaded_at = 0.0
+        self._generation = 0
+        # 上一次因未命中而强制比对版本号的时间
+        self._last_miss_check = None
+
+    def snapshot(self, force_check=False):
+        """返回当前快照；超过检查间隔时先比对数据库版本号"""
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and not force_check and now - self._last_check < self.check_interval:
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and not force_check and time.monotonic() - self._last_check < self.check_interval:
+                return snapshot
+
+            version = self._version_reader()
+            expired = time.monotonic() - self._loaded_at >= self.max_age
+            if snapshot is None or snapshot.version != version or expired:
+                indicators, devices, regions = self._loader()
+                self._generation += 1
+                snapshot = ReferenceSnapshot(version, indicators, devices, regions, self._generation)
+                self._snapshot = snapshot
+                self._loaded_at = time.monotonic()
+                logger.info(f"参考数据缓存已加载，版本 {version}: "
+                            f"指标 {len(indicators)} 个，设备 {len(devices)} 台，区域 {len(regions)} 个")
+            self._last_check = time.monotonic()
+            return snapshot
+
+    def invalidate(self):
+        """本进程修改参考数据后调用，下次访问时立即比对版本号"""
+        self._last_check = 0.0
+
+    @property
+    def version(self):
+        return self.snapshot().version
+
+    def _lookup(self, table, key):
+        if key is None:
+            return None
+        value = getattr(self.snapshot(), table).get(key)
+        if value is None and self._miss_check_due():
+            # 未命中时可能是其他进程刚新增的数据，强制比对一次版本号
+            value = getattr(self.snapshot(force_check=True), table).get(key)
+        return value
+
+    def _miss_check_due(self):
+        """未命中时的强制比对每个检查间隔最多一次：大量未知ID的数据不会逐条读取版本号"""
+        now = time.monotonic()
+        with self._lock:
+            if self._last_miss_check is not None and now - self._last_miss_check < self.check_interval:
+                return False
+            self._last_miss_check = now
+            return True
+
+    def indicator(self, indicator_id):
+        return self._lookup('indicators', indicator_id)
+
+    def device(self, device_id):
+        return self._lookup('devices', device_id)
+
+    def region(self, region_id):
+        return self._lookup('regions', region_id)
+
+    def indicators(self):
+        return self.snapshot().indicators
+
+    def devices(self):
+        return self.snapshot().devices
+
+    def regions(self):
+        return self.snapshot().regions
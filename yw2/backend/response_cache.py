@@ -0,0 +1,55 @@
+# backend/response_cache.py
+"""按数据版本缓存序列化后的接口响应
+
+参考数据接口（指标、区域、设备类型等）的结果只在参考数据变化后才会不同。这里保存序列化后的
+响应体，与生成时的数据版本标记一起存放；版本标记不变时直接返回保存的字节，不再查询数据库。
+
+ETag 取响应体的摘要：数据重新加载但内容不变时 ETag 不变，各工作进程生成的 ETag 也一致，
+客户端带 If-None-Match 重新验证时返回 304。Last-Modified 为内容最近一次变化的时间。
+"""
+import hashlib
+import threading
+from collections import namedtuple
+from datetime import datetime, timezone
+
+CachedResponse = namedtuple('CachedResponse', ['tag', 'body', 'etag', 'last_modified'])
+
+
+class ResponseCache:
+    """进程内的响应缓存（线程安全），每个键只保存最新版本的响应体"""
+
+    def __init__(self, clock=None):
+        self._clock = clock or (lambda: datetime.now(timezone.utc))
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key, tag):
+        """版本标记一致时返回缓存的响应，否则返回 None"""
+        entry = self._entries.get(key)
+        if entry is not None and entry.tag == tag:
+            self._hits += 1
+            return entry
+        self._misses += 1
+        return None
+
+    def put(self, key, tag, body):
+        etag = hashlib.blake2b(body, digest_size=12).hexdigest()
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is not None and previous.etag == etag:
+                last_modified = previous.last_modified
+            else:
+                # HTTP 日期只精确到秒
+                last_modified = self._clock().replace(microsecond=0)
+            entry = self._entries[key] = CachedResponse(tag, body, etag, last_modified)
+        return entry
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        return {'entries': len(self._entries), 'hits': self._hits, 'misses': self._misses,
+                'bytes': sum(len(entry.body) for entry in list(self._entries.values()))}
@@ -0,0 +1,381 @@
+# backend/rollups.py
+"""环境数据按小时、按天的汇总表
+
+汇总维度为 (设备, 指标, 区域, 时间桶)，保存条数、有值条数、合计、最小值、最大值、
+异常条数和各数据质量等级的条数。
+
+- 写入：与数据在同一事务中按采集时间所在的时间桶累加（迟到的数据同样累加到原来的桶）；
+- 修改、删除：最小值/最大值无法扣减，把受影响的时间桶标记为待重算，提交前从原始数据重算；
+- 异常状态重新计算：只累加异常条数的变化；
+- 批量重建：按日期范围从原始数据重建小时表，再由小时表重建天表（补齐历史数据、修正偏差）。
+
+报告按时间范围拆分：整天读天表，不满一天的整点小时读小时表，不满一小时的首尾读原始数据。
+
+原始数据可以分为热表和归档表两张表，重建和读取原始数据时合并两张表（归档只移动
+数据行，汇总值不变）。
+"""
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+from sqlalchemy import case, func, select, literal, union_all
+
+ROLLUP_DIMENSIONS = ('device_id', 'indicator_id', 'region_id')
+
+# 数据质量等级对应的计数列
+QUALITY_COLUMNS = {'优': 'excellent_count', '良': 'good_count', '中': 'medium_count', '差': 'poor_count'}
+# 数据质量为空时按列默认值计入（增量累加和从原始数据重算使用同一规则）
+DEFAULT_DATA_QUALITY = '中'
+
+ADDITIVE_MEASURES = ('record_count', 'value_count', 'value_sum', 'abnormal_count') + tuple(QUALITY_COLUMNS.values())
+MEASURES = ADDITIVE_MEASURES + ('value_min', 'value_max')
+
+# 从原始数据汇总时用到的列
+RAW_COLUMNS = ROLLUP_DIMENSIONS + ('collection_time', 'monitor_value', 'is_abnormal', 'data_quality')
+
+# 报告使用的时间段：kind 为 raw（原始数据）、hourly 或 daily
+TimeSegment = namedtuple('TimeSegment', ['kind', 'start', 'end'])
+
+
+def floor_hour(value):
+    return value.replace(minute=0, second=0, microsecond=0)
+
+
+def floor_day(value):
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _ceil(value, floor, step):
+    floored = floor(value)
+    return floored if floored == value else floored + step
+
+
+def split_time_range(start, end):
+    """把 [start, end) 拆分为原始数据、小时汇总和天汇总三类时间段"""
+    first_hour = _ceil(start, floor_hour, timedelta(hours=1))
+    last_hour = floor_hour(end)
+    if first_hour >= last_hour:
+        return [TimeSegment('raw', start, end)] if start < end else []
+
+    segments = []
+    if start < first_hour:
+        segments.append(TimeSegment('raw', start, first_hour))
+    first_day = _ceil(first_hour, floor_day, timedelta(days=1))
+    last_day = floor_day(last_hour)
+    if first_day >= last_day:
+        segments.append(TimeSegment('hourly', first_hour, last_hour))
+    else:
+        if first_hour < first_day:
+            segments.append(TimeSegment('hourly', first_hour, first_day))
+        segments.append(TimeSegment('daily', first_day, last_day))
+        if last_day < last_hour:
+            segments.append(TimeSegment('hourly', last_day, last_hour))
+    if last_hour < end:
+        segments.append(TimeSegment('raw', last_hour, end))
+    return segments
+
+
+def empty_measures():
+    measures = dict.fromkeys(ADDITIVE_MEASURES, 0)
+    measures['value_min'] = None
+    measures['value_max'] = None
+    return measures
+
+
+def merge_measures(target, source):
+    """把 source 的汇总值合并到 target（就地修改）"""
+    for name in ADDITIVE_MEASURES:
+        target[name] += source[name] or 0
+    for name, pick in (('value_min', min), ('value_max', max)):
+        if source[name] is not None:
+            target[name] = source[name] if target[name] is None else pick(target[name], source[name])
+    return target
+
+
+class RollupDeltas:
+    """待写入汇总表的增量与待重算的时间桶"""
+
+    def __init__(self):
+        self._items = {}  # (设备, 指标, 区域, 小时) -> 汇总值
+        self.dirty = set()
+
+    def _measures(self, device_id, indicator_id, region_id, collection_time):
+        key = (device_id, indicator_id, region_id, floor_hour(collection_time))
+        measures = self._items.get(key)
+        if measures is None:
+            measures = self._items[key] = empty_measures()
+        return measures
+
+    def add(self, row):
+        """累加一条新写入的数据（字典，字段与 environment_data 相同）"""
+        collection_time = row.get('collection_time') or datetime.utcnow()
+        measures = self._measures(row['device_id'], row['indicator_id'], row['region_id'], collection_time)
+        measures['record_count'] += 1
+        value = row.get('monitor_value')
+        if value is not None:
+            value = float(value)
+            measures['value_count'] += 1
+            measures['value_sum'] += value
+            measures['value_min'] = value if measures['value_min'] is None else min(measures['value_min'], value)
+            measures['value_max'] = value if measures['value_max'] is None else max(measures['value_max'], value)
+        if row.get('is_abnormal'):
+            measures['abnormal_count'] += 1
+        quality_column = QUALITY_COLUMNS.get(row.get('data_quality') or DEFAULT_DATA_QUALITY)
+        if quality_column:
+            measures[quality_column] += 1
+
+    def add_rows(self, rows):
+        for row in rows:
+            self.add(row)
+
+    def add_abnormal(self, device_id, indicator_id, region_id, collection_time, delta):
+        """已有数据的异常状态变化"""
+        self._measures(device_id, indicator_id, region_id, collection_time)['abnormal_count'] += delta
+
+    def mark_dirty(self, device_id, indicator_id, region_id, collection_time):
+        """数据被修改或删除，所在时间桶需要从原始数据重算"""
+        self.dirty.add((device_id, indicator_id, region_id, floor_hour(collection_time or datetime.utcnow())))
+
+    def hourly_rows(self):
+        return [
+            dict(zip(ROLLUP_DIMENSIONS, key[:3]), bucket_time=key[3], **measures)
+            for key, measures in sorted(self._items.items())
+            if key not in self.dirty
+        ]
+
+    def daily_rows(self):
+        days = {}
+        for key, measures in self._items.items():
+            if key in self.dirty:
+                continue
+            day_key = key[:3] + (key[3].date(),)
+            merge_measures(days.setdefault(day_key, empty_measures()), measures)
+        return [
+            dict(zip(ROLLUP_DIMENSIONS, key[:3]), stat_date=key[3], **measures)
+            for key, measures in sorted(days.items())
+        ]
+
+    def __bool__(self):
+        return bool(self._items or self.dirty)
+
+
+def _dialect_name(conn):
+    # conn 可以是 Session（get_bind）或 Connection（dialect）
+    bind = conn.get_bind() if hasattr(conn, 'get_bind') else conn
+    return bind.dialect.name
+
+
+class DataRollups:
+    """汇总表的读写（不持有连接，由调用方传入会话或连接并控制事务）"""
+
+    def __init__(self, hourly_table, daily_table, data_table, archive_table=None):
+        # hourly_table 主键 (bucket_time, 设备, 指标, 区域)；daily_table 主键 (stat_date, 设备, 指标, 区域)
+        # archive_table 为归档的原始数据（列与 data_table 相同），可以没有
+        self.hourly = hourly_table
+        self.daily = daily_table
+        self.data_tables = (data_table,) if archive_table is None else (data_table, archive_table)
+
+    def _raw_source(self, where):
+        """原始数据的查询来源，返回 (来源, 外层条件)
+
+        where(列集合) 返回过滤条件列表。有归档表时每张表分别过滤后 UNION ALL，
+        使过滤条件在各自的表上使用索引。
+        """
+        if len(self.data_tables) == 1:
+            table = self.data_tables[0]
+            return table, where(table.c)
+        branches = [select(*(table.c[name] for name in RAW_COLUMNS)).where(*where(table.c))
+                    for table in self.data_tables]
+        return union_all(*branches).subquery('raw'), []
+
+    # ---------- 增量维护 ----------
+    def apply(self, conn, deltas):
+        """写入增量并重算被修改的时间桶"""
+        dialect_name = _dialect_name(conn)
+        hourly_rows = deltas.hourly_rows()
+        if hourly_rows:
+            conn.execute(self._upsert(self.hourly, 'bucket_time', dialect_name), hourly_rows)
+        daily_rows = deltas.daily_rows()
+        if daily_rows:
+            conn.execute(self._upsert(self.daily, 'stat_date', dialect_name), daily_rows)
+        for device_id, indicator_id, region_id, bucket_time in sorted(deltas.dirty):
+            self._rebuild_bucket(conn, device_id, indicator_id, region_id, bucket_time)
+
+    def _upsert(self, table, time_column, dialect_name):
+        c = table.c
+        if dialect_name == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+            stmt = insert(table)
+            new = stmt.inserted
+            least, greatest = func.least, func.greatest
+        elif dialect_name in ('sqlite', 'postgresql'):
+            if dialect_name == 'sqlite':
+                from sqlalchemy.dialects.sqlite import insert
+                # SQLite 的多参数 min()/max() 是标量函数
+                least, greatest = func.min, func.max
+            else:
+                from sqlalchemy.dialects.postgresql import insert
+                least, greatest = func.least, func.greatest
+            stmt = insert(table)
+            new = stmt.excluded
+        else:
+            raise NotImplementedError(f'汇总表不支持的数据库: {dialect_name}')
+
+        values = {name: c[name] + new[name] for name in ADDITIVE_MEASURES}
+        # 任一方为 NULL（没有监测值）时取另一方
+        values['value_min'] = least(func.coalesce(c.value_min, new.value_min), func.coalesce(new.value_min, c.value_min))
+        values['value_max'] = greatest(func.coalesce(c.value_max, new.value_max),
+                                       func.coalesce(new.value_max, c.value_max))
+        if dialect_name == 'mysql':
+            return stmt.on_duplicate_key_update(**values)
+        return stmt.on_conflict_do_update(index_elements=[c[time_column], *(c[d] for d in ROLLUP_DIMENSIONS)],
+                                          set_=values)
+
+    def _raw_measures(self, d):
+        columns = [
+            func.count().label('record_count'),
+            func.count(d.monitor_value).label('value_count'),
+            func.coalesce(func.sum(d.monitor_value), 0).label('value_sum'),
+            func.min(d.monitor_value).label('value_min'),
+            func.max(d.monitor_value).label('value_max'),
+            func.coalesce(func.sum(case((d.is_abnormal == True, 1), else_=0)), 0).label('abnormal_count'),  # noqa: E712
+        ]
+        data_quality = func.coalesce(d.data_quality, DEFAULT_DATA_QUALITY)
+        columns += [func.coalesce(func.sum(case((data_quality == quality, 1), else_=0)), 0).label(name)
+                    for quality, name in QUALITY_COLUMNS.items()]
+        return columns
+
+    def _rollup_measures(self, table):
+        c = table.c
+        columns = [func.coalesce(func.sum(c[name]), 0).label(name) for name in ADDITIVE_MEASURES]
+        columns += [func.min(c.value_min).label('value_min'), func.max(c.value_max).label('value_max')]
+        return columns
+
+    def _rebuild_bucket(self, conn, device_id, indicator_id, region_id, bucket_time):
+        """从原始数据重算一个小时桶，再由小时表重算所在的天"""
+        h = self.hourly.c
+        day = floor_day(bucket_time)
+        key = {'device_id': device_id, 'indicator_id': indicator_id, 'region_id': region_id}
+        source, conditions = self._raw_source(lambda d: [
+            *(d[name] == value for name, value in key.items()),
+            d.collection_time >= bucket_time, d.collection_time < bucket_time + timedelta(hours=1)
+        ])
+        measures = self._raw_measures(source.c)
+
+        conn.execute(self.hourly.delete().where(h.bucket_time == bucket_time,
+                                                *(h[name] == value for name, value in key.items())))
+        conn.execute(self.hourly.insert().from_select(
+            [*key, 'bucket_time', *(col.name for col in measures)],
+            select(*(literal(value, self.hourly.c[name].type) for name, value in key.items()),
+                   literal(bucket_time, h.bucket_time.type), *measures)
+            .select_from(source)
+            .where(*conditions)
+            .having(func.count() > 0)
+        ))
+
+        daily = self.daily.c
+        conn.execute(self.daily.delete().where(daily.stat_date == day.date(),
+                                               *(daily[name] == value for name, value in key.items())))
+        conn.execute(self.daily.insert().from_select(
+            [*key, 'stat_date', *MEASURES],
+            select(*(literal(value, daily[name].type) for name, value in key.items()),
+                   literal(day.date(), daily.stat_date.type), *self._rollup_measures(self.hourly))
+            .where(*(h[name] == value for name, value in key.items()),
+                   h.bucket_time >= day, h.bucket_time < day + timedelta(days=1))
+            .having(func.count() > 0)
+        ))
+
+    # ---------- 批量重建 ----------
+    def _hour_bucket(self, column, dialect_name):
+        if dialect_name == 'mysql':
+            return func.date_format(column, '%Y-%m-%d %H:00:00')
+        if dialect_name == 'sqlite':
+            # 与 SQLAlchemy 在 SQLite 中保存 DATETIME 的格式一致，保证按字符串比较时间正确
+            return func.strftime('%Y-%m-%d %H:00:00.000000', column)
+        if dialect_name == 'postgresql':
+            return func.date_trunc('hour', column)
+        raise NotImplementedError(f'汇总表不支持的数据库: {dialect_name}')
+
+    def rebuild(self, conn, start, end):
+        """从原始数据重建 [start, end) 日期范围内的小时表和天表，返回重建的小时桶数"""
+        start = datetime.combine(start, datetime.min.time())
+        end = datetime.combine(end, datetime.min.time())
+        h = self.hourly.c
+        source, conditions = self._raw_source(lambda d: [d.collection_time >= start, d.collection_time < end])
+        d = source.c
+        bucket = self._hour_bucket(d.collection_time, _dialect_name(conn))
+        dimensions = [d[name] for name in ROLLUP_DIMENSIONS]
+        measures = self._raw_measures(d)
+
+        conn.execute(self.hourly.delete().where(h.bucket_time >= start, h.bucket_time < end))
+        hourly_count = conn.execute(self.hourly.insert().from_select(
+            [*ROLLUP_DIMENSIONS, 'bucket_time', *(col.name for col in measures)],
+            select(*dimensions, bucket, *measures)
+            .where(*conditions)
+            .group_by(*dimensions, bucket)
+        )).rowcount
+
+        day = func.date(h.bucket_time)
+        conn.execute(self.daily.delete().where(self.daily.c.stat_date >= start.date(),
+                                               self.daily.c.stat_date < end.date()))
+        conn.execute(self.daily.insert().from_select(
+            [*ROLLUP_DIMENSIONS, 'stat_date', *MEASURES],
+            select(*(h[name] for name in ROLLUP_DIMENSIONS), day, *self._rollup_measures(self.hourly))
+            .where(h.bucket_time >= start, h.bucket_time < end)
+            .group_by(*(h[name] for name in ROLLUP_DIMENSIONS), day)
+        ))
+        return hourly_count
+
+    def is_empty(self, conn):
+        return conn.execute(select(self.hourly.c.bucket_time).limit(1)).first() is None
+
+    def data_date_range(self, conn):
+        """原始数据的日期范围 (最早, 最晚)，没有数据时返回 (None, None)"""
+        values = []
+        for table in self.data_tables:
+            values += conn.execute(
+                select(func.min(table.c.collection_time), func.max(table.c.collection_time))
+            ).one()
+        # SQLite 中的 MIN/MAX 结果没有经过类型转换
+        values = [datetime.fromisoformat(value) if isinstance(value, str) else value
+                  for value in values if value is not None]
+        if not values:
+            return None, None
+        return min(values).date(), max(values).date()
+
+    # ---------- 查询 ----------
+    def summarize(self, conn, start, end, group_by=('region_id', 'indicator_id')):
+        """汇总 [start, end) 内的数据：{分组键: 汇总值}
+
+        整天读天表、整点小时读小时表、首尾不满一小时的部分读原始数据。
+        """
+        result = {}
+        for segment in split_time_range(start, end):
+            if segment.kind == 'raw':
+                lower, upper = segment.start, segment.end
+                table, conditions = self._raw_source(
+                    lambda d: [d.collection_time >= lower, d.collection_time < upper])
+                measures = self._raw_measures(table.c)
+            elif segment.kind == 'hourly':
+                table, time_column = self.hourly, self.hourly.c.bucket_time
+                measures = self._rollup_measures(self.hourly)
+                conditions = [time_column >= segment.start, time_column < segment.end]
+            else:
+                table, time_column = self.daily, self.daily.c.stat_date
+                measures = self._rollup_measures(self.daily)
+                conditions = [time_column >= segment.start.date(), time_column < segment.end.date()]
+
+            keys = [table.c[name] for name in group_by]
+            rows = conn.execute(
+                select(*keys, *measures)
+                .where(*conditions)
+                .group_by(*keys)
+            ).all()
+            for row in rows:
+                mapping = row._mapping
+                key = tuple(mapping[name] for name in group_by)
+                source = {name: mapping[name] for name in MEASURES}
+                for name in ('value_sum', 'value_min', 'value_max'):
+                    if source[name] is not None:
+                        source[name] = float(source[name])
+                merge_measures(result.setdefault(key, empty_measures()), source)
+        return result
@@ -0,0 +1,268 @@
+# backend/scheduler.py
+"""多工作进程部署时的单实例调度
+
+多个 WSGI 工作进程中只有持有调度锁的一个进程执行定期工作（设备在线状态判定、定期提交
+计数校对和归档任务、实时推送服务等）；其他进程每隔 retry_interval 秒尝试获取锁，
+持有锁的进程退出或与数据库断开后由其中一个接替。
+
+调度锁：
+- FileLock：本机文件锁，进程退出时由操作系统释放，适用于单台主机上的多个工作进程；
+- MySQLLock：MySQL 命名锁（GET_LOCK），持有在一个专用连接上，连接断开时释放，适用于多台主机；
+- AlwaysLeader：不加锁，本进程总是调度进程（单进程运行）。
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+logger = logging.getLogger(__name__)
+
+
+class FileLock:
+    """本机文件锁（非阻塞）"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+        f = open(self.path, 'a+')
+        try:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def check(self):
+        # 文件锁在进程退出或关闭文件前一直有效
+        return self._file is not None
+
+    def release(self):
+        if self._file is not None:
+            self._file.close()  # 关闭文件即释放锁
+            self._file = None
+
+    def describe(self):
+        return f'file:{self.path}'
+
+
+class MySQLLock:
+    """MySQL 命名锁，持有在一个不归还连接池的专用连接上"""
+
+    def __init__(self, engine_getter, name):
+        self._engine_getter = engine_getter
+        self.name = name
+        self._conn = None
+
+    def _query(self, sql):
+        value = self._conn.execute(text(sql), {'name': self.name}).scalar()
+        self._conn.commit()
+        return value
+
+    def acquire(self):
+        if self._conn is not None:
+            return True
+        self._conn = self._engine_getter().connect()
+        try:
+            if self._query("SELECT GET_LOCK(:name, 0)") == 1:
+                return True
+        except Exception:
+            self._drop()
+            raise
+        self._drop()
+        return False
+
+    def check(self):
+        """锁是否仍由本进程持有（连接断开后锁已释放）"""
+        if self._conn is None:
+            return False
+        try:
+            if self._query("SELECT IS_USED_LOCK(:name) = CONNECTION_ID()") == 1:
+                return True
+        except Exception as e:
+            logger.error(f"检查调度锁失败: {str(e)}")
+        self._drop()
+        return False
+
+    def release(self):
+        if self._conn is not None:
+            try:
+                self._query("SELECT RELEASE_LOCK(:name)")
+            except Exception:
+                pass
+            self._drop()
+
+    def _drop(self):
+        try:
+            self._conn.close()
+        except Exception:
+            pass
+        self._conn = None
+
+    def describe(self):
+        return f'mysql:{self.name}'
+
+
+class AlwaysLeader:
+    """不加锁：本进程总是调度进程"""
+
+    def acquire(self):
+        return True
+
+    def check(self):
+        return True
+
+    def release(self):
+        pass
+
+    def describe(self):
+        return 'none'
+
+
+class _Task:
+    __slots__ = ('name', 'interval', 'func', 'next_run', 'runs', 'failures')
+
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_run = 0.0
+        self.runs = 0
+        self.failures = 0
+
+
+class Scheduler:
+    """持有调度锁时按间隔执行已登记的定期任务
+
+    任务在调度线程中依次执行，应很快返回（耗时的工作提交为后台任务）；
+    services 为 (start, stop) 回调，成为调度进程时调用 start，失去调度锁或停止时调用 stop。
+    """
+
+    def __init__(self, lock, tick=1.0, retry_interval=5.0, check_interval=5.0, clock=time.monotonic):
+        self.lock = lock
+        self.tick = tick
+        self.retry_interval = retry_interval
+        self.check_interval = check_interval
+        self._clock = clock
+        self._tasks = []
+        self._services = []
+        self._leader = False
+        self._next_attempt = 0.0
+        self._next_check = 0.0
+        self._elected = 0
+        self._thread = None
+        self._stopping = threading.Event()
+
+    @property
+    def is_leader(self):
+        return self._leader
+
+    def add_task(self, name, interval, func):
+        """登记定期任务：成为调度进程后立即执行一次，之后每隔 interval 秒执行"""
+        self._tasks.append(_Task(name, interval, func))
+
+    def add_service(self, start, stop=None):
+        self._services.append((start, stop))
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stopping.clear()
+            self._thread = threading.Thread(target=self._run, name='scheduler', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        if self._leader:
+            self._demote()
+
+    def _run(self):
+        while not self._stopping.is_set():
+            self.run_once()
+            self._stopping.wait(self.tick)
+
+    def run_once(self):
+        """调度线程的一次循环：未持有锁时尝试获取，持有锁时执行到期的任务"""
+        now = self._clock()
+        if not self._leader:
+            if now < self._next_attempt:
+                return
+            self._next_attempt = now + self.retry_interval
+            try:
+                acquired = self.lock.acquire()
+            except Exception as e:
+                logger.error(f"获取调度锁失败: {str(e)}")
+                return
+            if not acquired:
+                return
+            self._elect(now)
+        elif now >= self._next_check:
+            self._next_check = now + self.check_interval
+            if not self.lock.check():
+                logger.warning(f"调度锁已失去（{self.lock.describe()}），停止定期任务")
+                self._demote()
+                return
+
+        for task in self._tasks:
+            if now >= task.next_run:
+                task.next_run = now + task.interval
+                task.runs += 1
+                try:
+                    task.func()
+                except Exception as e:
+                    task.failures += 1
+                    logger.error(f"定期任务 {task.name} 执行失败: {str(e)}")
+
+    def _elect(self, now):
+        self._leader = True
+        self._elected += 1
+        self._next_check = now + self.check_interval
+        for task in self._tasks:
+            task.next_run = now
+        logger.info(f"本进程（{os.getpid()}）成为调度进程（{self.lock.describe()}）")
+        for start, _ in self._services:
+            try:
+                start()
+            except Exception as e:
+                logger.error(f"启动调度服务失败: {str(e)}")
+
+    def _demote(self):
+        self._leader = False
+        for _, stop in reversed(self._services):
+            if stop:
+                try:
+                    stop()
+                except Exception as e:
+                    logger.error(f"停止调度服务失败: {str(e)}")
+        self.lock.release()
+
+    def stats(self):
+        return {
+            'leader': self._leader,
+            'pid': os.getpid(),
+            'lock': self.lock.describe(),
+            'elected': self._elected,
+            'tasks': [{'name': task.name, 'interval': task.interval, 'runs': task.runs, 'failures': task.failures}
+                      for task in self._tasks],
+        }
@@ -0,0 +1,204 @@
+# backend/series_anomaly.py
+"""按 (设备, 指标) 序列的流式统计异常检测
+
+阈值检查只能发现超出国家标准范围的数据；这里对每条序列维护指数加权（EWMA）的均值和方差，
+以及变化速率（相邻两次上报的差值 / 时间间隔）的 EWMA 均值和方差，每条数据到达时
+先按更新前的状态计算偏离程度（z 分数），再更新状态：
+
+- 水平异常：|监测值 - 均值| / 标准差 超过阈值；
+- 速率异常：|变化速率 - 速率均值| / 速率标准差 超过阈值（突升、突降）。
+
+每条序列的状态是固定大小的若干个数（约 56 字节），保存在按序列编号索引的 numpy 数组中，
+10 万条序列约占 6MB（另有序列键到编号的映射），处理一条数据的开销与历史数据量无关。
+样本数不足 min_samples 时只更新状态、不判定异常；此前使用累计平均（权重 1/n），
+使冷启动阶段的均值和方差不偏低。监测值或采集时间不是有限数（NaN、无穷大）的数据跳过，
+否则一条坏数据会使序列的均值和方差永久变为 NaN。
+"""
+import threading
+
+import numpy as np
+
+# 每条序列的状态数组：(名称, 类型)
+STATE_FIELDS = (
+    ('mean', np.float64), ('var', np.float64), ('count', np.uint32),
+    ('rate_mean', np.float64), ('rate_var', np.float64), ('rate_count', np.uint32),
+    ('last_value', np.float64), ('last_time', np.float64),
+)
+
+
+class SeriesAnomalyDetector:
+    """流式统计异常检测（线程安全）
+
+    alpha 为 EWMA 的平滑系数；z_threshold、rate_threshold 为水平、速率 z 分数的判定阈值；
+    min_std 为标准差下限，避免恒定序列出现微小波动时 z 分数无穷大。
+    """
+
+    def __init__(self, alpha=0.05, z_threshold=4.0, rate_threshold=4.0, min_samples=30,
+                 min_std=1e-6, capacity=1024):
+        self.alpha = alpha
+        self.z_threshold = z_threshold
+        self.rate_threshold = rate_threshold
+        self.min_samples = min_samples
+        self.min_std = min_std
+        self._lock = threading.Lock()
+        self._index = {}
+        self._state = {name: np.zeros(capacity, dtype=dtype) for name, dtype in STATE_FIELDS}
+        self._flagged = {'level': 0, 'rate': 0}
+
+    def __len__(self):
+        return len(self._index)
+
+    def reset(self):
+        with self._lock:
+            self._index = {}
+            for name, array in self._state.items():
+                array[:] = 0
+            self._flagged = {'level': 0, 'rate': 0}
+
+    def _slots(self, keys):
+        """序列键对应的编号，新序列分配编号（容量不足时按倍数扩容）"""
+        index = self._index
+        slots = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.int64, count=len(keys))
+        capacity = len(self._state['mean'])
+        if len(index) > capacity:
+            capacity = max(len(index), capacity * 2)
+            for name, array in self._state.items():
+                grown = np.zeros(capacity, dtype=array.dtype)
+                grown[:len(array)] = array
+                self._state[name] = grown
+        return slots
+
+    def _ewma(self, slots, x, mask, prefix):
+        """按 mask 选中的位置用 x 更新 EWMA 均值和方差，返回更新前的 z 分数和样本数"""
+        s = self._state
+        slots, x = slots[mask], x[mask]
+        mean, var, count = s[prefix + 'mean'][slots], s[prefix + 'var'][slots], s[prefix + 'count'][slots]
+        z = (x - mean) / np.maximum(np.sqrt(var), self.min_std)
+
+        # 冷启动阶段按累计平均更新，样本足够后权重固定为 alpha
+        weight = np.maximum(self.alpha, 1.0 / (count + 1.0))
+        diff = x - mean
+        increment = weight * diff
+        s[prefix + 'mean'][slots] = mean + increment
+        s[prefix + 'var'][slots] = (1.0 - weight) * (var + diff * increment)
+        s[prefix + 'count'][slots] = count + 1
+        return z, count
+
+    def _step(self, slots, values, times):
+        """处理一组互不相同的序列的各一条数据"""
+        s = self._state
+        n = len(slots)
+        level_z = np.zeros(n)
+        rate_z = np.zeros(n)
+        level_ready = np.zeros(n, dtype=bool)
+        rate_ready = np.zeros(n, dtype=bool)
+
+        # 变化速率：只对时间晚于上一条的数据计算（补录的历史数据只更新水平状态）
+        seen = s['count'][slots] > 0
+        elapsed = times - s['last_time'][slots]
+        forward = seen & (elapsed > 0)
+        if forward.any():
+            rate = (values[forward] - s['last_value'][slots[forward]]) / elapsed[forward]
+            rates = np.zeros(n)
+            rates[forward] = rate
+            z, count = self._ewma(slots, rates, forward, 'rate_')
+            rate_z[forward] = z
+            rate_ready[forward] = count >= self.min_samples
+
+        z, count = self._ewma(slots, values, np.ones(n, dtype=bool), '')
+        level_z[:] = z
+        level_ready[:] = count >= self.min_samples
+
+        latest = ~seen | forward
+        s['last_value'][slots[latest]] = values[latest]
+        s['last_time'][slots[latest]] = times[latest]
+        return level_z, rate_z, level_ready, rate_ready
+
+    def update(self, keys, values, times, record=True):
+        """按到达顺序处理一批数据，返回 (水平 z 分数, 速率 z 分数, 水平异常, 速率异常) 四个数组
+
+        keys 为序列键（如 (设备, 指标)）列表，values 为监测值，times 为采集时间戳（秒）。
+        同一批中同一序列有多条数据时按出现顺序依次更新，其余序列向量化处理。
+        record=False 时不计入异常统计（预热）。不是有限数的数据跳过（z 分数为 0，不判定异常）。
+        """
+        values = np.asarray(values, dtype=np.float64)
+        times = np.asarray(times, dtype=np.float64)
+        n = len(values)
+        valid = np.isfinite(values) & np.isfinite(times)
+        if not valid.all():
+            level_z, rate_z, level_flag, rate_flag = (
+                np.zeros(n), np.zeros(n), np.zeros(n, dtype=bool), np.zeros(n, dtype=bool))
+            kept = np.flatnonzero(valid)
+            if len(kept):
+                results = self.update([keys[i] for i in kept.tolist()], values[kept], times[kept], record)
+                for out, result in zip((level_z, rate_z, level_flag, rate_flag), results):
+                    out[kept] = result
+            return level_z, rate_z, level_flag, rate_flag
+
+        level_z = np.zeros(n)
+        rate_z = np.zeros(n)
+        level_flag = np.zeros(n, dtype=bool)
+        rate_flag = np.zeros(n, dtype=bool)
+        if not n:
+            return level_z, rate_z, level_flag, rate_flag
+
+        with self._lock:
+            slots = self._slots(keys)
+            # 每条数据在所属序列中的序号：序号相同的数据属于不同序列，可以一起处理
+            order = np.argsort(slots, kind='stable')
+            sorted_slots = slots[order]
+            starts = np.flatnonzero(np.r_[True, sorted_slots[1:] != sorted_slots[:-1]])
+            group_start = np.repeat(starts, np.diff(np.r_[starts, n]))
+            rank = np.empty(n, dtype=np.int64)
+            rank[order] = np.arange(n) - group_start
+
+            for r in range(int(rank.max()) + 1):
+                rows = np.flatnonzero(rank == r)
+                z, rz, level_ready, rate_ready = self._step(slots[rows], values[rows], times[rows])
+                level_z[rows] = z
+                rate_z[rows] = rz
+                level_flag[rows] = level_ready & (np.abs(z) > self.z_threshold)
+                rate_flag[rows] = rate_ready & (np.abs(rz) > self.rate_threshold)
+
+            if record:
+                self._flagged['level'] += int(level_flag.sum())
+                self._flagged['rate'] += int(rate_flag.sum())
+        return level_z, rate_z, level_flag, rate_flag
+
+    def warm_start(self, batches):
+        """用历史数据预热状态（一次扫描），batches 为按采集时间排序的 (keys, values, times) 分块
+
+        预热数据只更新状态，不计入异常统计；返回处理的条数。
+        """
+        total = 0
+        for keys, values, times in batches:
+            self.update(keys, values, times, record=False)
+            total += len(keys)
+        return total
+
+    def series_state(self, key):
+        """序列的当前状态（均值、标准差、样本数等），没有数据时返回 None"""
+        with self._lock:
+            slot = self._index.get(key)
+            if slot is None:
+                return None
+            s = self._state
+            return {
+                'mean': float(s['mean'][slot]),
+                'std': float(np.sqrt(s['var'][slot])),
+                'count': int(s['count'][slot]),
+                'rate_mean': float(s['rate_mean'][slot]),
+                'rate_std': float(np.sqrt(s['rate_var'][slot])),
+                'last_value': float(s['last_value'][slot]),
+                'last_time': float(s['last_time'][slot]),
+            }
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self._index),
+                'capacity': len(self._state['mean']),
+                'state_bytes': sum(array.nbytes for array in self._state.values()),
+                'flagged_level': self._flagged['level'],
+                'flagged_rate': self._flagged['rate'],
+            }
@@ -0,0 +1,309 @@
+# backend/series_cache.py
+"""图表查询的序列缓存：按 (设备, 指标) 保存最近若干天数据的列式数组
+
+每条序列是三个并列的 numpy 数组，按采集时间升序：
+- 采集时间：int64（UTC 毫秒时间戳），8 字节；
+- 监测值：float32，4 字节（数据库精度为 4 位小数，float32 有效数字约 7 位，图表足够）；
+- 是否异常：按位压缩的 uint8 位图，每点 1/8 字节。
+
+每点 12.125 字节。加载时预留 1/4 的空余供新数据追加，写满时先丢弃超出保存天数的数据，
+仍不够才按 1.5 倍扩容，因此按约 16 字节/点估算内存：缓存上限 max_points 为 400 万点时
+约 64MB（另有每条序列约 300 字节的固定开销）。超过上限时淘汰最久未查询的序列。
+
+按时间范围取数据用二分查找定位切片；区间统计（最小、最大、均值、异常条数）和降采样
+（按等宽时间桶的 reduceat）都是整段数组运算，不逐点执行 Python 代码。
+
+序列在首次查询时从数据库加载（调用方负责查询），之后跟随本进程提交的修改：新增的数据
+追加到数组（乱序到达的数据按时间归并），修改、删除的数据使所在序列失效，下次查询时重新加载。
+监测值为空的数据不保存。
+"""
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+# 每点字节数：时间戳 + 监测值 + 位图；加载时预留的空余比例、扩容倍数；计入空余后的内存预算（字节/点）
+POINT_BYTES = 8 + 4 + 1 / 8
+SEED_HEADROOM = 1.25
+GROWTH_FACTOR = 1.5
+BUDGET_BYTES_PER_POINT = 16
+
+
+def _get_bits(packed, start, stop):
+    """取位图中 [start, stop) 的位（bool 数组）"""
+    first = start >> 3
+    bits = np.unpackbits(packed[first:(stop + 7) >> 3], bitorder='little')
+    offset = start - (first << 3)
+    return bits[offset:offset + stop - start].astype(bool)
+
+
+def _set_bits(packed, start, values):
+    """从 start 开始写入 values（bool 数组）"""
+    stop = start + len(values)
+    first, last = start >> 3, (stop + 7) >> 3
+    bits = np.unpackbits(packed[first:last], bitorder='little')
+    offset = start - (first << 3)
+    bits[offset:offset + len(values)] = values
+    packed[first:last] = np.packbits(bits, bitorder='little')
+
+
+class _Series:
+    __slots__ = ('times', 'values', 'flags', 'size', 'since')
+
+    def __init__(self, times, values, flags, since):
+        capacity = max(int(len(times) * SEED_HEADROOM), 16)
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float32)
+        self.flags = np.zeros((capacity + 7) >> 3, dtype=np.uint8)
+        self.size = 0
+        self.since = since     # 不早于该时间（毫秒）的数据是完整的
+        self._write(0, times, values, flags)
+        self.size = len(times)
+
+    @property
+    def capacity(self):
+        return len(self.times)
+
+    def nbytes(self):
+        return self.times.nbytes + self.values.nbytes + self.flags.nbytes
+
+    def _write(self, start, times, values, flags):
+        stop = start + len(times)
+        self.times[start:stop] = times
+        self.values[start:stop] = values
+        _set_bits(self.flags, start, flags)
+
+    def _resize(self, capacity):
+        times, values, flags = self.times, self.values, self.flags
+        self.times = np.empty(capacity, dtype=np.int64)
+        self.values = np.empty(capacity, dtype=np.float32)
+        self.flags = np.zeros((capacity + 7) >> 3, dtype=np.uint8)
+        self.times[:self.size] = times[:self.size]
+        self.values[:self.size] = values[:self.size]
+        self.flags[:(self.size + 7) >> 3] = flags[:(self.size + 7) >> 3]
+
+    def trim(self, cutoff):
+        """丢弃早于 cutoff 的数据，返回丢弃的点数"""
+        drop = int(np.searchsorted(self.times[:self.size], cutoff, side='left'))
+        if drop:
+            keep = self.size - drop
+            bits = _get_bits(self.flags, drop, self.size)
+            self.times[:keep] = self.times[drop:self.size]
+            self.values[:keep] = self.values[drop:self.size]
+            self.flags[:] = 0
+            _set_bits(self.flags, 0, bits)
+            self.size = keep
+        self.since = max(self.since, cutoff)
+        return drop
+
+    def append(self, times, values, flags, cutoff):
+        """追加一批数据（任意顺序），早于完整范围的数据忽略；返回新增的点数"""
+        keep = times >= self.since
+        if not keep.all():
+            times, values, flags = times[keep], values[keep], flags[keep]
+        if not len(times):
+            return 0
+        order = np.argsort(times, kind='stable')
+        times, values, flags = times[order], values[order], flags[order]
+
+        needed = self.size + len(times)
+        if needed > self.capacity:
+            needed -= self.trim(cutoff)
+            if needed > self.capacity:
+                self._resize(max(int(self.capacity * GROWTH_FACTOR), needed))
+
+        if self.size and times[0] < self.times[self.size - 1]:
+            # 乱序到达：与已有数据按时间归并（稳定排序，同一时间的数据保持到达顺序）
+            all_times = np.concatenate((self.times[:self.size], times))
+            all_values = np.concatenate((self.values[:self.size], values))
+            all_flags = np.concatenate((_get_bits(self.flags, 0, self.size), flags))
+            order = np.argsort(all_times, kind='stable')
+            self.size = 0
+            self._write(0, all_times[order], all_values[order], all_flags[order])
+            self.size = len(order)
+        else:
+            self._write(self.size, times, values, flags)
+            self.size += len(times)
+        return len(times)
+
+    def slice(self, start, end):
+        """[start, end) 范围内的数据（副本）"""
+        i0, i1 = np.searchsorted(self.times[:self.size], (start, end), side='left').tolist()
+        return self.times[i0:i1].copy(), self.values[i0:i1].copy(), _get_bits(self.flags, i0, i1)
+
+
+def summarize(times, values, flags):
+    """区间统计：条数、最小、最大、均值、异常条数、首末时间"""
+    if not len(times):
+        return {'count': 0, 'min': None, 'max': None, 'mean': None, 'abnormal': 0, 'first': None, 'last': None}
+    return {
+        'count': int(len(times)),
+        'min': float(values.min()),
+        'max': float(values.max()),
+        'mean': float(values.mean(dtype=np.float64)),
+        'abnormal': int(np.count_nonzero(flags)),
+        'first': int(times[0]),
+        'last': int(times[-1]),
+    }
+
+
+def downsample(times, values, flags, start, end, buckets):
+    """把 [start, end) 等分为 buckets 个时间桶，返回各非空桶的起始时间、条数、最小、最大、均值、异常条数
+
+    times 须升序；用二分查找得到各桶的边界，reduceat 按桶整段归约。
+    """
+    edges = start + (np.arange(buckets + 1, dtype=np.int64) * (end - start)) // buckets
+    bounds = np.searchsorted(times, edges, side='left')
+    counts = np.diff(bounds)
+    nonempty = np.flatnonzero(counts)
+    # 去掉空桶后，每个非空桶的起点恰好是上一个非空桶的终点
+    offsets = bounds[:-1][nonempty]
+    if not len(offsets):
+        empty = np.array([], dtype=np.int64)
+        return {'time': empty, 'count': empty, 'min': empty, 'max': empty, 'mean': empty, 'abnormal': empty}
+    sums = np.add.reduceat(values.astype(np.float64), offsets)
+    return {
+        'time': edges[:-1][nonempty],
+        'count': counts[nonempty],
+        'min': np.minimum.reduceat(values, offsets),
+        'max': np.maximum.reduceat(values, offsets),
+        'mean': sums / counts[nonempty],
+        'abnormal': np.add.reduceat(flags.astype(np.int64), offsets),
+    }
+
+
+class SeriesCache:
+    """(设备, 指标) 序列的内存缓存（线程安全）
+
+    retention_days 为保存的天数，0 表示不使用；max_points 为全部序列的点数上限。
+    修改按 (旧数据, 新数据) 字段映射应用，字段为 device_id、indicator_id、collection_time（UTC）、
+    monitor_value、is_abnormal。
+    """
+
+    def __init__(self, retention_days=7, max_points=4_000_000, clock=time.time):
+        self.retention = int(retention_days * 86400 * 1000)
+        self.max_points = max_points
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._series = OrderedDict()   # 键 -> _Series，按最近查询的顺序
+        self._generation = {}          # 键 -> 修改次数（加载期间有修改时不保存加载结果）
+        self._epoch = 0                # clear 的次数
+        self._points = 0
+        self._hits = 0
+        self._misses = 0
+        self._evicted = 0
+
+    @property
+    def enabled(self):
+        return self.retention > 0 and self.max_points > 0
+
+    @staticmethod
+    def to_millis(collection_time):
+        """采集时间（UTC，不带时区）转换为毫秒时间戳"""
+        return int(np.datetime64(collection_time, 'ms').astype(np.int64))
+
+    def window_start(self):
+        """缓存保存的最早时间（毫秒）"""
+        return int(self._clock() * 1000) - self.retention
+
+    def apply(self, changes):
+        """应用已提交的修改：(旧数据, 新数据) 列表，新增时旧数据为 None，删除时新数据为 None"""
+        if not self.enabled or not changes:
+            return
+        appended = {}
+        touched = set()
+        for old, new in changes:
+            if old is not None:
+                touched.add((old['device_id'], old['indicator_id']))
+            if new is None:
+                continue
+            key = (new['device_id'], new['indicator_id'])
+            if old is not None:
+                touched.add(key)
+            elif new.get('monitor_value') is not None and new.get('collection_time') is not None:
+                appended.setdefault(key, []).append(new)
+
+        with self._lock:
+            for key in touched | set(appended):
+                self._generation[key] = self._generation.get(key, 0) + 1
+            # 修改和删除：序列失效，下次查询时重新加载
+            for key in touched:
+                series = self._series.pop(key, None)
+                if series is not None:
+                    self._points -= series.size
+            cutoff = self.window_start()
+            for key, rows in appended.items():
+                series = self._series.get(key)
+                if series is None:
+                    continue
+                times = np.array([self.to_millis(row['collection_time']) for row in rows], dtype=np.int64)
+                values = np.array([float(row['monitor_value']) for row in rows], dtype=np.float32)
+                flags = np.array([bool(row.get('is_abnormal')) for row in rows], dtype=bool)
+                before = series.size
+                series.append(times, values, flags, cutoff)
+                self._points += series.size - before
+            self._evict()
+
+    def clear(self):
+        """清空全部序列（无法逐条应用的批量修改之后）"""
+        with self._lock:
+            self._series.clear()
+            self._generation.clear()
+            self._epoch += 1
+            self._points = 0
+
+    def token(self, key):
+        """加载前取得的标记：加载期间序列有修改或缓存被清空时不保存加载结果"""
+        with self._lock:
+            return self._epoch, self._generation.get(key, 0)
+
+    def seed(self, key, times, values, flags, since, token):
+        """保存从数据库加载的序列：since（毫秒）之后的全部数据，按采集时间升序；返回是否保存"""
+        if not self.enabled:
+            return False
+        with self._lock:
+            if token != (self._epoch, self._generation.get(key, 0)):
+                return False
+            previous = self._series.pop(key, None)
+            if previous is not None:
+                self._points -= previous.size
+            series = _Series(np.asarray(times, dtype=np.int64), np.asarray(values, dtype=np.float32),
+                             np.asarray(flags, dtype=bool), since)
+            self._series[key] = series
+            self._points += series.size
+            self._evict()
+            return key in self._series
+
+    def query(self, key, start, end):
+        """[start, end)（毫秒）范围的 (采集时间, 监测值, 是否异常) 数组；序列未加载或不覆盖该范围时返回 None"""
+        with self._lock:
+            series = self._series.get(key)
+            if series is None or start < series.since:
+                self._misses += 1
+                return None
+            self._series.move_to_end(key)
+            self._hits += 1
+            return series.slice(start, end)
+
+    def _evict(self):
+        while self._points > self.max_points and self._series:
+            _, series = self._series.popitem(last=False)
+            self._points -= series.size
+            self._evicted += 1
+
+    def stats(self):
+        with self._lock:
+            nbytes = sum(series.nbytes() for series in self._series.values())
+            return {
+                'enabled': self.enabled,
+                'series': len(self._series),
+                'points': self._points,
+                'max_points': self.max_points,
+                'bytes': nbytes,
+                'bytes_per_point': round(nbytes / self._points, 2) if self._points else None,
+                'budget_bytes': self.max_points * BUDGET_BYTES_PER_POINT,
+                'hits': self._hits,
+                'misses': self._misses,
+                'evicted': self._evicted,
+            }
@@ -0,0 +1,207 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, String, Text, BigInteger, Integer,
+                        Boolean, DateTime)
+
+from alert_store import AlertStore, TableAlertStore
+
+
+class FakeClock:
+    def __init__(self, now=1700000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class AlertStoreTest(unittest.TestCase):
+    """提醒存储测试"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.store = AlertStore(per_key_limit=3, ttl=3600, max_alerts=10, dedupe_window=1800,
+                                clock=self.clock)
+
+    def add(self, device_id, indicator_id='I1', alert_type='data_abnormal'):
+        key = f"{alert_type}_{device_id}_{indicator_id}"
+        return self.store.add(key, {'device_id': device_id, 'indicator_id': indicator_id,
+                                    'alert_type': alert_type, 'message': key})
+
+    def test_dedupe_until_handled_or_window_passed(self):
+        """去重窗口内有未处理提醒时不再创建，处理后或超过窗口后可以创建"""
+        key = 'data_abnormal_D1_I1'
+        self.assertTrue(self.store.should_create(key))
+        self.add('D1')
+        self.assertFalse(self.store.should_create(key))
+        self.store.mark_handled(key)
+        self.assertTrue(self.store.should_create(key))
+        self.add('D1')
+        self.clock.now += 1800
+        self.assertTrue(self.store.should_create(key))
+
+    def test_ring_buffer_keeps_latest(self):
+        """每个提醒键只保留最近的若干条"""
+        for _ in range(5):
+            self.add('D1')
+            self.clock.now += 1
+        alerts = self.store.query(device_id='D1')
+        self.assertEqual(len(alerts), 3)
+        self.assertEqual(len(self.store), 3)
+        self.assertGreater(alerts[0]['time'], alerts[-1]['time'])
+
+    def test_device_index_is_exact(self):
+        """按设备查询不会匹配到前缀相同的其他设备"""
+        self.add('D1')
+        self.add('D10')
+        self.add('D1', alert_type='device_fault', indicator_id='')
+        self.assertEqual({a['device_id'] for a in self.store.query(device_id='D1')}, {'D1'})
+        self.assertEqual(len(self.store.query(device_id='D1', alert_type='device_fault')), 1)
+        self.assertEqual(len(self.store.query(alert_type='data_abnormal')), 2)
+
+    def test_ttl_eviction(self):
+        """超过存活时间的提醒被淘汰，空的提醒键同时从索引中删除"""
+        self.add('D1')
+        self.clock.now += 3601
+        self.add('D2')
+        self.assertEqual(self.store.query(device_id='D1'), [])
+        self.assertNotIn('data_abnormal_D1_I1', self.store)
+        self.assertEqual(len(self.store), 1)
+
+    def test_hard_cap(self):
+        """总量超过上限时淘汰最旧的提醒"""
+        for i in range(25):
+            self.add(f'D{i}')
+            self.clock.now += 1
+        self.assertEqual(len(self.store), 10)
+        self.assertNotIn('data_abnormal_D0_I1', self.store)
+        self.assertIn('data_abnormal_D24_I1', self.store)
+
+    def test_query_returns_copies(self):
+        """查询结果是副本，修改后不影响存储中的提醒"""
+        self.add('D1')
+        self.store.query()[0]['handled'] = True
+        self.assertEqual(len(self.store.query()), 1)
+
+    def test_concurrent_adds_respect_cap(self):
+        """并发写入时总量不超过上限"""
+        store = AlertStore(per_key_limit=5, max_alerts=100)
+
+        def worker(n):
+            for i in range(500):
+                store.add(f'data_abnormal_D{n}_{i % 40}', {'device_id': f'D{n}', 'alert_type': 'data_abnormal'})
+
+        threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(store), 100)
+        self.assertLessEqual(store.stats()['index_size'], 200)
+
+    def test_changes_since(self):
+        """只返回指定版本之后新增或处理的提醒，整体清除后要求重新加载"""
+        self.add('D1')
+        version = self.store.version
+        self.assertFalse(self.store.changes_since(version)['changed'])
+        self.add('D2')
+        self.store.mark_handled('data_abnormal_D1_I1')
+        changes = self.store.changes_since(version)
+        self.assertEqual([(a['device_id'], a['handled']) for a in changes['alerts']], [('D2', False), ('D1', True)])
+        self.store.clear()
+        self.assertTrue(self.store.changes_since(version)['reset'])
+
+    def test_listeners(self):
+        """新增、处理、清除后通知回调，回调异常不影响写入"""
+        events = []
+        self.store.add_listener(lambda kind, payload: events.append((kind, payload.get('alert_key'))))
+        self.store.add_listener(lambda kind, payload: 1 / 0)
+        self.add('D1')
+        self.store.mark_handled('data_abnormal_D1_I1')
+        self.store.mark_handled('missing')
+        self.store.clear()
+        self.assertEqual(events, [('added', 'data_abnormal_D1_I1'), ('handled', 'data_abnormal_D1_I1'),
+                                  ('cleared', None)])
+        self.assertEqual(len(self.store), 0)
+
+
+def make_alert_tables(metadata):
+    alert_table = Table(
+        'device_alert', metadata,
+        Column('alert_id', Integer, primary_key=True, autoincrement=True),
+        Column('alert_key', String(100), nullable=False),
+        Column('device_id', String(20)),
+        Column('indicator_id', String(20)),
+        Column('alert_type', String(30)),
+        Column('message', String(500)),
+        Column('payload', Text),
+        Column('handled', Boolean, nullable=False, default=False),
+        Column('handled_at', DateTime),
+        Column('created_at', DateTime, nullable=False),
+        Column('version', BigInteger, nullable=False)
+    )
+    version_table = Table(
+        'data_version', metadata,
+        Column('name', String(50), primary_key=True),
+        Column('version', BigInteger, nullable=False, default=0)
+    )
+    return alert_table, version_table
+
+
+class TableAlertStoreTest(unittest.TestCase):
+    """共享提醒存储测试：两个实例共用一个SQLite文件，模拟两个工作进程"""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        tables = make_alert_tables(MetaData())
+        self.worker_a = TableAlertStore(lambda: self.engine, *tables, check_interval=0, create_tables=True)
+        self.worker_b = TableAlertStore(lambda: self.engine, *tables, check_interval=0)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def add(self, store, device_id):
+        return store.add(f'data_abnormal_{device_id}_I1', {'device_id': device_id, 'indicator_id': 'I1',
+                                                           'alert_type': 'data_abnormal'})
+
+    def test_write_behind_then_shared(self):
+        """新增提醒先进入缓冲区，写库后其他工作进程可见，并参与去重"""
+        self.add(self.worker_a, 'D1')
+        self.assertEqual(len(self.worker_a.query()), 1)
+        self.worker_a.flush()
+        self.assertEqual([a['device_id'] for a in self.worker_b.query()], ['D1'])
+        self.assertFalse(self.worker_b.should_create('data_abnormal_D1_I1'))
+
+    def test_clear_applies_to_all_workers(self):
+        """一个工作进程处理提醒后，其他工作进程立即看不到该提醒"""
+        self.add(self.worker_a, 'D1')
+        self.add(self.worker_a, 'D2')
+        self.worker_a.flush()
+        self.assertEqual(len(self.worker_b.query()), 2)
+        self.assertTrue(self.worker_b.mark_handled('data_abnormal_D1_I1'))
+        self.assertFalse(self.worker_b.mark_handled('data_abnormal_D9_I1'))
+        self.assertEqual([a['device_id'] for a in self.worker_a.query()], ['D2'])
+        self.worker_b.clear()
+        self.assertEqual(self.worker_a.query(), [])
+
+    def test_changes_since(self):
+        """版本号不变时没有变化；之后只返回变化的提醒"""
+        self.add(self.worker_a, 'D1')
+        self.worker_a.flush()
+        version = self.worker_b.version
+        self.assertFalse(self.worker_b.changes_since(version)['changed'])
+        self.add(self.worker_a, 'D2')
+        self.worker_a.flush()
+        self.worker_b.mark_handled('data_abnormal_D1_I1')
+        changes = self.worker_b.changes_since(version)
+        self.assertTrue(changes['changed'])
+        self.assertEqual([(a['device_id'], a['handled']) for a in changes['alerts']], [('D2', False), ('D1', True)])
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,381 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# 未指定数据库时使用临时SQLite库，避免测试连接业务库
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ.setdefault('YW2_DATABASE_URI', f'sqlite:///{_db_path}')
+
+from sqlalchemy import event
+
+import app as app_module
+from app import (app, db, RegionInfo, MonitorIndicator, MonitorDevice, EnvironmentData, EnvironmentDataArchive,
+                 DataCounter, HOT_DATA_DAYS)
+
+
+class QueryCounter:
+    """统计代码块中执行的SQL语句条数"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _on_execute(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._on_execute)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._on_execute)
+
+
+@unittest.skipUnless(app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'),
+                     '查询次数测试只在临时SQLite库上运行')
+class ApiQueryCountTest(unittest.TestCase):
+    """接口查询次数不随返回条数增长"""
+
+    DEVICE_COUNT = 60
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(RegionInfo(region_id='QR1', region_name='测试区域'))
+            for i in range(1, 4):
+                db.session.add(MonitorIndicator(indicator_id=f'QI{i}', indicator_name=f'测试指标{i}',
+                                                unit='mg/L', standard_upper=10.0, standard_lower=5.0,
+                                                monitor_freq='小时'))
+            for i in range(1, cls.DEVICE_COUNT + 1):
+                db.session.add(MonitorDevice(device_id=f'QD{i:03d}', device_type='测试传感器',
+                                             region_id='QR1', operation_status='正常'))
+            db.session.commit()
+            cls.engine = db.engine
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        if os.environ['YW2_DATABASE_URI'] == f'sqlite:///{_db_path}':
+            os.remove(_db_path)
+
+    def setUp(self):
+        app_module.alert_store.clear()
+
+    def add_data_alerts(self, count):
+        """按 设备 x 指标 生成互不重复的数据异常警报"""
+        with app.app_context():
+            for i in range(count):
+                device_id = f'QD{i % self.DEVICE_COUNT + 1:03d}'
+                indicator = app_module.reference_cache.indicator(f'QI{i // self.DEVICE_COUNT % 3 + 1}')
+                app_module.record_data_abnormal_alert(device_id, indicator, f'QED{i:06d}', 20.0, '测试异常')
+
+    def count_queries(self, url):
+        self.client.get(url)  # 预热参考数据缓存
+        with QueryCounter(self.engine) as counter:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return counter.count, response.get_json()
+
+    def test_device_alerts_constant_queries(self):
+        """/api/alerts/device 的查询次数与警报条数无关"""
+        self.add_data_alerts(5)
+        few_queries, few = self.count_queries('/api/alerts/device')
+
+        app_module.alert_store.clear()
+        self.add_data_alerts(150)
+        many_queries, many = self.count_queries('/api/alerts/device')
+
+        self.assertEqual(few['count'], 5)
+        self.assertEqual(many['count'], 150)
+        self.assertLessEqual(many_queries, 2)
+        self.assertEqual(few_queries, many_queries)
+
+    def add_environment_data(self, count):
+        """写入 count 条异常数据（分布在全部设备和指标上，采集时间在最近几小时内）"""
+        now = datetime.utcnow()
+        with app.app_context():
+            # 批量删除不经过计数器，一并清空计数表
+            db.session.query(EnvironmentData).delete()
+            db.session.query(EnvironmentDataArchive).delete()
+            db.session.query(DataCounter).delete()
+            app_module.recent_readings.clear()
+            app_module.series_cache.clear()
+            for i in range(count):
+                db.session.add(EnvironmentData(
+                    data_id=f'QED{i:06d}', indicator_id=f'QI{i % 3 + 1}',
+                    device_id=f'QD{i % self.DEVICE_COUNT + 1:03d}', region_id='QR1',
+                    collection_time=now - timedelta(minutes=i), monitor_value=20.0,
+                    is_abnormal=True, abnormal_reason='测试异常'
+                ))
+            db.session.commit()
+
+    def test_environment_data_lists_constant_queries(self):
+        """环境数据列表接口的查询次数与返回条数无关"""
+        urls = [
+            '/api/environment/data/all?per_page=200',
+            '/api/environment/data/recent',
+            '/api/environment/data/abnormal',
+            '/api/environment/data/by-alert?device_id=QD001&indicator_id=QI1',
+        ]
+        self.add_environment_data(3)
+        few = {url: self.count_queries(url) for url in urls}
+        self.add_environment_data(180)
+        many = {url: self.count_queries(url) for url in urls}
+
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(few[url][0], many[url][0])
+                # 不满一页时还要查询归档表
+                self.assertLessEqual(many[url][0], 3)
+        self.assertEqual(len(many['/api/environment/data/all?per_page=200'][1]['data']), 180)
+        self.assertEqual(many['/api/environment/data/all?per_page=200'][1]['pagination']['total'], 180)
+        self.assertEqual(many['/api/environment/data/abnormal'][1]['count'], 180)
+        self.assertEqual(len(many['/api/environment/data/by-alert?device_id=QD001&indicator_id=QI1'][1]['data']), 3)
+
+    def test_cursor_pagination_walks_all_rows(self):
+        """游标分页按 (采集时间, 数据ID) 倒序遍历全部数据，不重复也不遗漏"""
+        self.add_environment_data(45)
+        with app.app_context():
+            # 与前一条采集时间相同的数据，检验数据ID作为第二排序键
+            db.session.get(EnvironmentData, 'QED000011').collection_time = \
+                db.session.get(EnvironmentData, 'QED000010').collection_time
+            db.session.commit()
+
+        seen = []
+        url = '/api/environment/data/all?per_page=10&cursor='
+        page_queries = set()
+        while True:
+            queries, body = self.count_queries(url)
+            page_queries.add(queries)
+            seen.extend(item['data_id'] for item in body['data'])
+            if not body['pagination']['has_more']:
+                break
+            url = f"/api/environment/data/all?per_page=10&cursor={body['pagination']['next_cursor']}"
+
+        self.assertEqual(len(seen), 45)
+        self.assertEqual(len(set(seen)), 45)
+        # 最后一页不满时还要查询归档表
+        self.assertEqual(page_queries, {1, 2})
+
+        _, body = self.count_queries('/api/environment/data/all?per_page=10&cursor=&include_total=1')
+        self.assertEqual(body['pagination']['total'], 45)
+        response = self.client.get('/api/environment/data/all?cursor=not-a-cursor')
+        self.assertEqual(response.status_code, 400)
+
+    def test_archived_data_read_through(self):
+        """归档后列表、分页、总数和按ID查询与归档前一致"""
+        self.add_environment_data(30)
+        with app.app_context():
+            # 一半数据改为早于热表保留期
+            for i in range(15, 30):
+                db.session.get(EnvironmentData, f'QED{i:06d}').collection_time -= timedelta(days=HOT_DATA_DAYS + 1)
+            db.session.commit()
+        before = self.client.get('/api/environment/data/all?per_page=100').get_json()
+
+        with app.app_context():
+            summary = app_module.archive_environment_data(batch_size=4)
+            self.assertEqual(summary['moved'], 15)
+            self.assertEqual(db.session.query(EnvironmentData).count(), 15)
+            self.assertEqual(db.session.query(EnvironmentDataArchive).count(), 15)
+
+        after = self.client.get('/api/environment/data/all?per_page=100').get_json()
+        self.assertEqual(after['data'], before['data'])
+        self.assertEqual(after['pagination']['total'], 30)
+        page = self.client.get('/api/environment/data/all?per_page=7&page=3').get_json()
+        self.assertEqual(page['data'], before['data'][14:21])
+        self.assertEqual(self.client.get('/api/environment/data/abnormal').get_json()['count'], 30)
+
+        seen = []
+        url = '/api/environment/data/all?per_page=8&cursor='
+        while url:
+            body = self.client.get(url).get_json()
+            seen.extend(item['data_id'] for item in body['data'])
+            cursor = body['pagination']['next_cursor']
+            url = f'/api/environment/data/all?per_page=8&cursor={cursor}' if cursor else None
+        self.assertEqual(seen, [item['data_id'] for item in before['data']])
+
+        body = self.client.get('/api/environment/data/QED000020').get_json()
+        self.assertEqual(body['data'], before['data'][20])
+
+    def test_environment_data_list_format(self):
+        """列表接口返回的字段与 to_dict 一致"""
+        self.add_environment_data(1)
+        _, body = self.count_queries('/api/environment/data/recent')
+        with app.app_context():
+            expected = db.session.get(EnvironmentData, 'QED000000').to_dict()
+        self.assertEqual(body['data'], [expected])
+
+    def test_recent_data_window_follows_edits(self):
+        """最近数据接口从内存窗口返回，修改、调整、删除后与数据库查询结果一致"""
+        self.add_environment_data(30)
+        urls = ['/api/environment/data/recent', '/api/environment/data/recent?indicator_id=QI2',
+                '/api/environment/data/recent?region_id=QR1&days=1']
+
+        def from_database(url):
+            app_module.recent_readings.clear()
+            return self.client.get(url).get_json()
+
+        expected = {url: from_database(url) for url in urls}
+        for url in urls:
+            with self.subTest(url=url):
+                queries, body = self.count_queries(url)
+                self.assertEqual(queries, 0)
+                self.assertEqual(body, expected[url])
+
+        edited_time = (datetime.utcnow() + timedelta(minutes=5)).strftime('%Y-%m-%d %H:%M:%S')
+        self.client.put('/api/environment/data/QED000010/update',
+                        json={'monitor_value': 7.5, 'collection_time': edited_time})
+        self.client.put('/api/environment/data/QED000005/adjust', json={'monitor_value': 6.0})
+        self.client.delete('/api/environment/data/QED000008/delete')
+
+        cached = {}
+        for url in urls:
+            queries, cached[url] = self.count_queries(url)
+            self.assertEqual(queries, 0)
+        body = cached[urls[0]]
+        self.assertEqual(body['data'][0]['data_id'], 'QED000010')
+        self.assertEqual(body['data'][0]['monitor_value'], 7.5)
+        self.assertNotIn('QED000008', [item['data_id'] for item in body['data']])
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(cached[url], from_database(url))
+
+    def test_chart_series_from_cache(self):
+        """图表数据首次从数据库加载整条序列，之后从内存返回，并跟随新增和修改"""
+        self.add_environment_data(30)
+        now = datetime.utcnow()
+        for i in range(1, 12):
+            self.client.post('/api/environment/data/add', json={
+                'indicator_id': 'QI1', 'device_id': 'QD001', 'region_id': 'QR1', 'monitor_value': 6.0 + i,
+                'collection_time': (now - timedelta(minutes=i * 5)).strftime('%Y-%m-%d %H:%M:%S')
+            })
+        url = '/api/environment/series?device_id=QD001&indicator_id=QI1'
+
+        def from_database(url):
+            app_module.series_cache.clear()
+            body = self.client.get(url).get_json()
+            self.assertEqual(body['source'], 'database')
+            return body
+
+        expected = from_database(url)
+        self.assertEqual(expected['summary']['count'], 12)
+        self.assertEqual(expected['summary']['abnormal'], 8)  # 11~17 超过上限 10，以及写入的 20.0
+        queries, body = self.count_queries(url)
+        self.assertEqual(queries, 0)
+        self.assertEqual(body['source'], 'cache')
+        self.assertEqual(dict(body, source='database'), expected)
+
+        downsampled = self.client.get(url + '&points=3').get_json()
+        self.assertTrue(downsampled['downsampled'])
+        self.assertEqual(sum(downsampled['series']['count']), 12)
+        self.assertEqual(max(downsampled['series']['max']), 20.0)
+
+        self.client.post('/api/environment/data/add', json={
+            'indicator_id': 'QI1', 'device_id': 'QD001', 'region_id': 'QR1', 'monitor_value': 8.0})
+        self.client.put('/api/environment/data/QED000000/update', json={'monitor_value': 7.5})
+        cached = self.client.get(url).get_json()
+        self.assertEqual(cached['summary']['count'], 13)
+        self.assertEqual(dict(cached, source='database'), from_database(url))
+
+        self.assertEqual(self.client.get('/api/environment/series?device_id=QD001').status_code, 400)
+        self.assertEqual(self.client.get(url + '&start_date=2024-01-02&end_date=2024-01-01').status_code, 400)
+
+    def test_export_streams_all_rows(self):
+        """批量导出按行组流式返回时间范围内的全部数据（按采集时间顺序）"""
+        self.add_environment_data(30)
+        today = datetime.utcnow().strftime('%Y-%m-%d')
+        response = self.client.get(f'/api/environment/data/export?start_date={today}&end_date={today}'
+                                   f'&format=csv&row_group_size=7')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('attachment', response.headers['Content-Disposition'])
+        rows = list(csv.reader(io.StringIO(gzip.decompress(response.data).decode('utf-8'))))
+        self.assertEqual(rows[0][0], 'data_id')
+        with app.app_context():
+            expected = sorted(db.session.query(EnvironmentData.data_id, EnvironmentData.collection_time)
+                              .filter(EnvironmentData.collection_time >= datetime.fromisoformat(today)).all(),
+                              key=lambda row: row.collection_time)
+        self.assertEqual([row[0] for row in rows[1:]], [row.data_id for row in expected])
+        self.assertEqual(rows[1][9], '测试指标' + rows[1][1][-1])
+
+        response = self.client.get('/api/environment/data/export?start_date=2024-01-01')
+        self.assertEqual(response.status_code, 400)
+        response = self.client.get(f'/api/environment/data/export?start_date={today}&end_date={today}&format=xlsx')
+        self.assertEqual(response.status_code, 400)
+
+    def test_export_params_bounds(self):
+        args = {'start_date': '2024-01-01', 'end_date': '2024-01-02'}
+        self.assertEqual(app_module.export_params(args)['row_group_size'], app_module.EXPORT_ROW_GROUP_SIZE)
+        self.assertEqual(app_module.export_params({**args, 'row_group_size': '10'})['row_group_size'], 10)
+        self.assertEqual(app_module.export_params({**args, 'row_group_size': str(10 ** 9)})['row_group_size'],
+                         app_module.MAX_EXPORT_ROW_GROUP_SIZE)
+        for value in ('-1', 'abc'):
+            with self.assertRaises(ValueError):
+                app_module.export_params({**args, 'row_group_size': value})
+
+    def test_cleanup_export_files(self):
+        """只删除超过保留时长的导出文件（包括中断导出留下的临时文件）"""
+        export_dir = tempfile.mkdtemp()
+        now = time.time()
+        for name, age in (('old.csv.gz', 7200), ('old.parquet.part', 7200), ('new.csv.gz', 60)):
+            path = os.path.join(export_dir, name)
+            open(path, 'wb').close()
+            os.utime(path, (now - age, now - age))
+        with mock.patch.object(app_module, 'EXPORT_DIR', export_dir):
+            self.assertEqual(app_module.cleanup_export_files(retention=3600, now=now), 2)
+            self.assertEqual(os.listdir(export_dir), ['new.csv.gz'])
+            self.assertEqual(app_module.cleanup_export_files(retention=3600, now=now), 0)
+        shutil.rmtree(export_dir)
+        with mock.patch.object(app_module, 'EXPORT_DIR', export_dir):
+            self.assertEqual(app_module.cleanup_export_files(), 0)
+
+    def test_device_alerts_do_not_mutate_store(self):
+        """返回的阈值信息不写回存储中的警报"""
+        self.add_data_alerts(1)
+        _, body = self.count_queries('/api/alerts/device')
+        self.assertEqual(body['alerts'][0]['threshold_upper'], 10.0)
+        stored = app_module.alert_store.query()[0]
+        self.assertNotIn('threshold_upper', stored)
+
+    def test_reference_endpoints_revalidate_without_queries(self):
+        """参考数据接口带 ETag，重新验证时不访问数据库；修改后返回新的内容和 ETag"""
+        for url in ('/api/indicators', '/api/regions', '/api/devices/types', '/api/devices/management'):
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            etag = first.headers['ETag']
+            self.assertIn('Last-Modified', first.headers)
+            with QueryCounter(self.engine) as counter:
+                cached = self.client.get(url)
+                revalidated = self.client.get(url, headers={'If-None-Match': etag})
+            self.assertEqual(counter.count, 0, url)
+            self.assertEqual(cached.get_data(), first.get_data())
+            self.assertEqual(revalidated.status_code, 304)
+            self.assertEqual(revalidated.get_data(), b'')
+
+        etag = self.client.get('/api/indicators').headers['ETag']
+        self.client.put('/api/indicators/QI1/update', json={'indicator_name': '测试指标1'})
+        # 内容不变时 ETag 不变
+        self.assertEqual(self.client.get('/api/indicators', headers={'If-None-Match': etag}).status_code, 304)
+        self.client.put('/api/indicators/QI1/update', json={'indicator_name': '改名指标'})
+        changed = self.client.get('/api/indicators', headers={'If-None-Match': etag})
+        self.client.put('/api/indicators/QI1/update', json={'indicator_name': '测试指标1'})
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed.headers['ETag'], etag)
+        self.assertEqual(changed.get_json()['indicators'][0]['indicator_name'], '改名指标')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,54 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from bench_suite import summarize_latencies, compare_baselines, generate_readings
+
+
+class BenchSuiteTest(unittest.TestCase):
+    """基准测试工具的统计、基线比较和合成数据测试（不访问数据库）"""
+
+    def test_summarize_latencies(self):
+        summary = summarize_latencies(list(range(1, 101)), errors=2, elapsed=2.0)
+        self.assertEqual(summary['requests'], 100)
+        self.assertEqual(summary['errors'], 2)
+        self.assertAlmostEqual(summary['p50_ms'], 50.5)
+        self.assertAlmostEqual(summary['p95_ms'], 95.05)
+        self.assertAlmostEqual(summary['p99_ms'], 99.01)
+        self.assertEqual(summary['max_ms'], 100)
+        self.assertEqual(summary['throughput_rps'], 50)
+
+        empty = summarize_latencies([], errors=0, elapsed=1.0)
+        self.assertNotIn('p50_ms', empty)
+        self.assertEqual(empty['throughput_rps'], 0)
+
+    def test_compare_baselines(self):
+        baseline = {'endpoints': {'slow': {'p95_ms': 10.0}, 'fast': {'p95_ms': 0.5},
+                                  'stable': {'p95_ms': 20.0}, 'removed': {'p95_ms': 1.0}}}
+        current = {'endpoints': {'slow': {'p95_ms': 15.0}, 'fast': {'p95_ms': 0.9},
+                                 'stable': {'p95_ms': 21.0}, 'added': {'p95_ms': 1.0}}}
+        result = {name: regressed for name, _, _, _, regressed in compare_baselines(baseline, current, 0.2)}
+        # fast 变慢 80% 但不足 1ms，视为测量抖动
+        self.assertEqual(result, {'slow': True, 'fast': False, 'stable': False})
+
+    def test_generate_readings(self):
+        series = [('D1', 'R1', 'I1', 0.0, 35.0), ('D2', 'R2', 'I2', 6.5, 8.5)]
+        start = datetime(2026, 1, 1)
+        rows = generate_readings(series, 0, 1000, 1000, start, 86400, 0.1, np.random.default_rng(1))
+
+        self.assertEqual(len(rows), 1000)
+        self.assertEqual([row['device_id'] for row in rows[:4]], ['D1', 'D2', 'D1', 'D2'])
+        times = [row['collection_time'] for row in rows]
+        self.assertEqual(times, sorted(times))
+        self.assertTrue(start <= times[0] and times[-1] < start + timedelta(days=1))
+        for row in rows:
+            _, _, _, lower, upper = series[0] if row['device_id'] == 'D1' else series[1]
+            self.assertEqual(row['is_abnormal'], not lower <= row['monitor_value'] <= upper)
+            self.assertEqual(row['abnormal_reason'] is not None, row['is_abnormal'])
+        abnormal = sum(row['is_abnormal'] for row in rows)
+        self.assertTrue(50 < abnormal < 150)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,187 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime, timedelta
+
+# 未指定数据库时使用临时SQLite库，避免测试连接业务库
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ.setdefault('YW2_DATABASE_URI', f'sqlite:///{_db_path}')
+
+from sqlalchemy import text
+
+import app as app_module
+from app import app, db, RegionInfo, MonitorDevice
+
+
+class CalibrationCycleTest(unittest.TestCase):
+    """校准周期换算和校准状态判断"""
+
+    def test_parse_calibration_days(self):
+        cases = {'30天': 30, '7日': 7, '3月': 90, '1年': 365, ' 2 年': 730, '15': 15, '每月': 0, None: None}
+        for cycle, days in cases.items():
+            with self.subTest(cycle=cycle):
+                self.assertEqual(app_module.parse_calibration_days(cycle), days)
+
+    def test_compute_calibration_fields(self):
+        installed = date(2024, 1, 1)
+        self.assertEqual(app_module.compute_calibration_fields('30天', installed), (30, date(2024, 1, 31)))
+        self.assertEqual(app_module.compute_calibration_fields('3月', installed), (90, date(2024, 3, 31)))
+        self.assertEqual(app_module.compute_calibration_fields('1年', installed), (365, date(2024, 12, 31)))
+        self.assertEqual(app_module.compute_calibration_fields('1年', None), (365, None))
+        self.assertEqual(app_module.compute_calibration_fields(None, installed), (None, None))
+
+    def test_calibration_status(self):
+        today = date(2024, 6, 1)
+        status = app_module.get_calibration_status
+        soon = app_module.CALIBRATION_DUE_SOON_DAYS
+        self.assertEqual(status(None, today, None, today), '未设置校准周期')
+        self.assertEqual(status('30天', None, None, today), '安装时间未知')
+        self.assertEqual(status('30天', today, today - timedelta(days=1), today), '逾期未校准')
+        self.assertEqual(status('30天', today, today, today), '逾期未校准')
+        self.assertEqual(status('30天', today, today + timedelta(days=1), today), '即将到期')
+        self.assertEqual(status('30天', today, today + timedelta(days=soon), today), '即将到期')
+        self.assertEqual(status('30天', today, today + timedelta(days=soon + 1), today), '正常')
+
+
+@unittest.skipUnless(app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'),
+                     '校准字段测试只在临时SQLite库上运行')
+class CalibrationColumnsTest(unittest.TestCase):
+    """设备写入时维护校准天数和到期日；已有设备表的字段升级和回填"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(RegionInfo(region_id='CR1', region_name='测试区域'))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        if os.path.exists(_db_path):
+            os.remove(_db_path)
+
+    def setUp(self):
+        with app.app_context():
+            MonitorDevice.query.delete()
+            db.session.commit()
+
+    def add_device(self, device_id, cycle, installed, status='正常'):
+        db.session.add(MonitorDevice(device_id=device_id, device_type='测试传感器', region_id='CR1',
+                                     install_time=installed, calibration_cycle=cycle, operation_status=status))
+
+    def device_fields(self, device_id):
+        row = db.session.execute(
+            text("SELECT calibration_days, next_calibration_due FROM monitor_device WHERE device_id = :id"),
+            {'id': device_id}).one()
+        due = row.next_calibration_due
+        return row.calibration_days, date.fromisoformat(due) if isinstance(due, str) else due
+
+    def test_insert_and_update_recompute(self):
+        installed = date(2024, 1, 1)
+        with app.app_context():
+            self.add_device('CD1', '30天', installed)
+            self.add_device('CD2', '3月', installed)
+            self.add_device('CD3', '1年', installed)
+            self.add_device('CD4', None, installed)
+            self.add_device('CD5', '1年', None)
+            db.session.commit()
+            self.assertEqual(self.device_fields('CD1'), (30, date(2024, 1, 31)))
+            self.assertEqual(self.device_fields('CD2'), (90, date(2024, 3, 31)))
+            self.assertEqual(self.device_fields('CD3'), (365, date(2024, 12, 31)))
+            self.assertEqual(self.device_fields('CD4'), (None, None))
+            self.assertEqual(self.device_fields('CD5'), (365, None))
+
+            # 修改周期、安装时间或清空周期时重新计算
+            device = db.session.get(MonitorDevice, 'CD1')
+            device.calibration_cycle = '2月'
+            db.session.commit()
+            self.assertEqual(self.device_fields('CD1'), (60, date(2024, 3, 1)))
+            device.install_time = date(2024, 2, 1)
+            db.session.commit()
+            self.assertEqual(self.device_fields('CD1'), (60, date(2024, 4, 1)))
+            device.calibration_cycle = None
+            db.session.commit()
+            self.assertEqual(self.device_fields('CD1'), (None, None))
+            device = db.session.get(MonitorDevice, 'CD4')
+            device.calibration_cycle = '10天'
+            db.session.commit()
+            self.assertEqual(self.device_fields('CD4'), (10, date(2024, 1, 11)))
+
+    def test_need_calibration_classification(self):
+        """逾期（到期日不晚于今天）、即将到期、正常的分类和排序；故障设备不在提醒范围内"""
+        today = datetime.now().date()
+        with app.app_context():
+            self.add_device('CD1', '30天', today - timedelta(days=30))   # 今天到期
+            self.add_device('CD2', '30天', today - timedelta(days=40))   # 已逾期
+            self.add_device('CD3', '30天', today - timedelta(days=25))   # 5 天后到期
+            self.add_device('CD4', '1年', today)                        # 正常
+            self.add_device('CD5', None, today)
+            self.add_device('CD6', '30天', None, status='离线')
+            self.add_device('CD7', '30天', today - timedelta(days=40), status='故障')
+            db.session.commit()
+
+        devices = self.client.get('/api/devices/need-calibration').get_json()['devices']
+        statuses = {device['device_id']: device['calibration_status'] for device in devices}
+        self.assertEqual(statuses, {'CD1': '逾期未校准', 'CD2': '逾期未校准', 'CD3': '即将到期', 'CD4': '正常',
+                                    'CD5': '未设置校准周期', 'CD6': '安装时间未知'})
+        order = [app_module.CALIBRATION_STATUS_ORDER.get(device['calibration_status'], 4) for device in devices]
+        self.assertEqual(order, sorted(order))
+
+        with app.app_context():
+            rows = {row['device_id']: row for row in app_module.load_device_rows()}
+        self.assertEqual(rows['CD7']['calibration_status'], '逾期未校准')
+        self.assertEqual(app_module.device_row_to_dict(rows['CD7'])['calibration_status'], '正常')
+        for device_id, row in rows.items():
+            self.assertEqual(row['calibration_status'], app_module.get_calibration_status(
+                row['calibration_cycle'], row['install_time'], row['next_calibration_due']))
+
+    def test_upgrade_adds_and_backfills_columns(self):
+        """旧的设备表没有校准到期字段：补充字段并回填，再次执行时不改动"""
+        with app.app_context():
+            MonitorDevice.__table__.drop(db.engine)
+            with db.engine.begin() as conn:
+                conn.execute(text(
+                    "CREATE TABLE monitor_device (device_id VARCHAR(20) PRIMARY KEY, device_type VARCHAR(50) NOT NULL, "
+                    "region_id VARCHAR(20) NOT NULL, install_time DATE, calibration_cycle VARCHAR(8), "
+                    "operation_status VARCHAR(10) NOT NULL, comm_proto VARCHAR(50), status_update_time DATETIME)"))
+                conn.execute(text(
+                    "INSERT INTO monitor_device (device_id, device_type, region_id, install_time, calibration_cycle, "
+                    "operation_status, status_update_time) VALUES "
+                    "('CD1', '测试传感器', 'CR1', '2024-01-01', '3月', '正常', '2024-05-01 08:00:00'), "
+                    "('CD2', '测试传感器', 'CR1', '2024-01-01', NULL, '正常', '2024-05-01 08:00:00'), "
+                    "('CD3', '测试传感器', 'CR1', NULL, '1年', '正常', '2024-05-01 08:00:00')"))
+            try:
+                app_module.upgrade_device_calibration_columns()
+                columns = {column['name'] for column in db.inspect(db.engine).get_columns('monitor_device')}
+                self.assertTrue({'calibration_days', 'next_calibration_due'} <= columns)
+                indexes = {index['name'] for index in db.inspect(db.engine).get_indexes('monitor_device')}
+                self.assertIn('ix_monitor_device_next_calibration_due', indexes)
+                self.assertEqual(self.device_fields('CD1'), (90, date(2024, 3, 31)))
+                self.assertEqual(self.device_fields('CD2'), (None, None))
+                self.assertEqual(self.device_fields('CD3'), (365, None))
+                # 回填不改写状态时间
+                self.assertEqual(db.session.execute(text(
+                    "SELECT status_update_time FROM monitor_device WHERE device_id = 'CD1'")).scalar()[:19],
+                    '2024-05-01 08:00:00')
+
+                # 其他业务线直接修改了周期：再次执行时只更新不一致的设备
+                db.session.execute(text("UPDATE monitor_device SET calibration_cycle = '30天' WHERE device_id = 'CD1'"))
+                db.session.commit()
+                app_module.upgrade_device_calibration_columns()
+                self.assertEqual(self.device_fields('CD1'), (30, date(2024, 1, 31)))
+            finally:
+                db.session.remove()
+                with db.engine.begin() as conn:
+                    conn.execute(text("DROP TABLE monitor_device"))
+                MonitorDevice.__table__.create(db.engine)
+
+
+if __name__ == '__main__':
+    unittest.main()
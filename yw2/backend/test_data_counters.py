@@ -0,0 +1,117 @@
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, String, Date, DateTime, BigInteger,
+                        Boolean, select)
+
+from data_counters import DataCounters, CounterDeltas
+
+
+class DataCountersTest(unittest.TestCase):
+    """环境数据计数器测试（使用临时SQLite库作为替身）"""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        metadata = MetaData()
+        self.counter_table = Table(
+            'data_counter', metadata,
+            Column('region_id', String(20), primary_key=True),
+            Column('indicator_id', String(20), primary_key=True),
+            Column('stat_date', Date, primary_key=True),
+            Column('total_count', BigInteger, nullable=False, default=0),
+            Column('abnormal_count', BigInteger, nullable=False, default=0)
+        )
+        self.data_table = Table(
+            'environment_data', metadata,
+            Column('data_id', String(20), primary_key=True),
+            Column('region_id', String(20)),
+            Column('indicator_id', String(20)),
+            Column('collection_time', DateTime),
+            Column('is_abnormal', Boolean)
+        )
+        metadata.create_all(self.engine)
+        self.counters = DataCounters(self.counter_table)
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def insert_data(self, rows):
+        """像应用一样在同一事务中写入数据并累加计数"""
+        with self.engine.begin() as conn:
+            conn.execute(self.data_table.insert(), rows)
+            deltas = CounterDeltas()
+            deltas.add_rows(rows)
+            self.counters.apply(conn, deltas)
+
+    def make_rows(self, count, day, abnormal_every=3, start=0):
+        return [{'data_id': f'ED{start + i:06d}', 'region_id': 'R1', 'indicator_id': 'I1',
+                 'collection_time': datetime.combine(day, datetime.min.time()).replace(hour=i % 24),
+                 'is_abnormal': i % abnormal_every == 0}
+                for i in range(count)]
+
+    def totals(self, recent_since=date(2026, 1, 1), today=date(2026, 1, 2)):
+        with self.engine.connect() as conn:
+            return self.counters.totals(conn, recent_since, today)
+
+    def test_apply_accumulates(self):
+        """多次写入累加到同一计数行"""
+        self.insert_data(self.make_rows(10, date(2026, 1, 1)))
+        self.insert_data(self.make_rows(5, date(2026, 1, 1), start=10))
+        self.insert_data(self.make_rows(6, date(2026, 1, 2), start=20))
+        totals = self.totals(today=date(2026, 1, 2))
+        self.assertEqual(totals['total_count'], 21)
+        self.assertEqual(totals['abnormal_count'], 4 + 2 + 2)
+        self.assertEqual(totals['today_count'], 6)
+        with self.engine.connect() as conn:
+            self.assertEqual(len(conn.execute(select(self.counter_table)).all()), 2)
+            self.assertEqual(self.counters.count(conn, region_id='R1', indicator_id='I1'), 21)
+            self.assertEqual(self.counters.count(conn, region_id='R2'), 0)
+
+    def test_negative_deltas(self):
+        """删除和恢复正常按负增量扣减"""
+        rows = self.make_rows(9, date(2026, 1, 1))
+        self.insert_data(rows)
+        deltas = CounterDeltas()
+        deltas.add_rows(rows[:3], sign=-1)
+        deltas.add_counts('R1', 'I1', date(2026, 1, 1), 0, -1)
+        with self.engine.begin() as conn:
+            self.counters.apply(conn, deltas)
+        totals = self.totals()
+        self.assertEqual(totals['total_count'], 6)
+        self.assertEqual(totals['abnormal_count'], 3 - 1 - 1)
+
+    def test_reconcile_corrects_drift_only(self):
+        """校对修正绕过应用的修改，计数一致时不写入"""
+        self.insert_data(self.make_rows(10, date(2026, 1, 1)))
+        with self.engine.begin() as conn:
+            # 绕过计数的写入和修改
+            conn.execute(self.data_table.insert(), self.make_rows(4, date(2026, 1, 3), start=100))
+            conn.execute(self.data_table.update().values(is_abnormal=False))
+
+        with self.engine.begin() as conn:
+            checked, corrected = self.counters.reconcile(conn, self.data_table, date(2026, 1, 1), date(2026, 2, 1))
+        self.assertEqual((checked, corrected), (2, 2))
+        totals = self.totals()
+        self.assertEqual(totals['total_count'], 14)
+        self.assertEqual(totals['abnormal_count'], 0)
+
+        with self.engine.begin() as conn:
+            self.assertEqual(self.counters.reconcile(conn, self.data_table, date(2026, 1, 1), date(2026, 2, 1))[1], 0)
+
+    def test_reconcile_removes_counts_without_data(self):
+        """数据已全部删除的日期，校对后不再保留计数行"""
+        self.insert_data(self.make_rows(3, date(2026, 1, 1)))
+        with self.engine.begin() as conn:
+            conn.execute(self.data_table.delete())
+            self.assertEqual(self.counters.date_range(conn, self.data_table), (date(2026, 1, 1), date(2026, 1, 1)))
+            self.counters.reconcile(conn, self.data_table, date(2026, 1, 1), date(2026, 1, 2))
+            self.assertTrue(self.counters.is_empty(conn))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
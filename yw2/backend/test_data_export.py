@@ -0,0 +1,73 @@
+import csv
+import gzip
+import io
+import unittest
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import data_export
+
+FIELDS = (('data_id', 'string'), ('collection_time', 'timestamp'), ('monitor_value', 'float'),
+          ('is_abnormal', 'bool'), ('abnormal_reason', 'string'))
+BASE = datetime(2024, 1, 1)
+
+
+def batches(total, size):
+    rows = [(f'ED{i:05d}', BASE + timedelta(minutes=i), Decimal(i) / 4 if i % 7 else None, i % 5 == 0,
+             '测试异常' if i % 5 == 0 else None) for i in range(total)]
+    return [rows[start:start + size] for start in range(0, total, size)]
+
+
+class DataExportTest(unittest.TestCase):
+    """批量导出：格式选择、CSV 回退、按块写出、流式输出"""
+
+    def test_resolve_format(self):
+        self.assertEqual(data_export.resolve_format('csv'), 'csv')
+        self.assertEqual(data_export.resolve_format(None), 'parquet' if data_export.pa else 'csv')
+        with self.assertRaises(ValueError):
+            data_export.resolve_format('xlsx')
+        if data_export.pa is None:
+            with self.assertRaises(ValueError):
+                data_export.resolve_format('parquet')
+
+    def test_csv_export(self):
+        sink = io.BytesIO()
+        stats = data_export.write_export(batches(25, 10), sink, 'csv', FIELDS)
+        self.assertEqual(stats, {'format': 'csv', 'rows': 25, 'row_groups': 3})
+
+        rows = list(csv.reader(io.StringIO(gzip.decompress(sink.getvalue()).decode('utf-8'))))
+        self.assertEqual(rows[0], [name for name, _ in FIELDS])
+        self.assertEqual(len(rows), 26)
+        self.assertEqual(rows[6], ['ED00005', '2024-01-01 00:05:00', '1.25', 'True', '测试异常'])
+        self.assertEqual(rows[8][2], '')
+
+    def test_stream_matches_file(self):
+        streamed = list(data_export.stream_export(batches(25, 10), 'csv', FIELDS))
+        self.assertGreater(len(streamed), 0)
+        sink = io.BytesIO()
+        data_export.write_export(batches(25, 10), sink, 'csv', FIELDS)
+        self.assertEqual(gzip.decompress(b''.join(streamed)), gzip.decompress(sink.getvalue()))
+
+    @unittest.skipUnless(data_export.pa, '未安装 pyarrow')
+    def test_columnar_exports(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        sink = io.BytesIO()
+        stats = data_export.write_export(batches(25, 10), sink, 'parquet', FIELDS)
+        self.assertEqual(stats['row_groups'], 3)
+        parquet = pq.ParquetFile(io.BytesIO(sink.getvalue()))
+        self.assertEqual(parquet.metadata.num_row_groups, 3)
+        table = parquet.read()
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.column('monitor_value')[5].as_py(), 1.25)
+        self.assertIsNone(table.column('monitor_value')[7].as_py())
+
+        streamed = b''.join(data_export.stream_export(batches(25, 10), 'arrow', FIELDS))
+        table = pa.ipc.open_stream(streamed).read_all()
+        self.assertEqual(table.num_rows, 25)
+        self.assertEqual(table.column('collection_time')[3].as_py(), BASE + timedelta(minutes=3))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
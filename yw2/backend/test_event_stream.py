@@ -0,0 +1,149 @@
+import socket
+import time
+import unittest
+
+from event_stream import EventHub, EventStreamServer, EventForwarder
+
+
+class EventHubTest(unittest.TestCase):
+    """事件缓冲区：按序号读取、缓冲区溢出、事件编号的纪元"""
+
+    def test_frames_since(self):
+        hub = EventHub(capacity=3)
+        for i in range(5):
+            hub.publish('readings', {'n': i})
+        frames, latest, complete = hub.frames_since(3)
+        self.assertTrue(complete)
+        self.assertEqual(latest, 5)
+        self.assertEqual([frame.split(b'\n')[2] for frame in frames], [b'data: {"n":3}', b'data: {"n":4}'])
+        self.assertEqual(hub.frames_since(5), ([], 5, True))
+        # 需要的事件已被挤出缓冲区
+        self.assertFalse(hub.frames_since(1)[2])
+
+    def test_parse_event_id(self):
+        hub = EventHub()
+        hub.publish('alert', {})
+        self.assertEqual(hub.parse_event_id(f'{hub.epoch}-1'), 1)
+        self.assertEqual(hub.parse_event_id(f'{hub.epoch}-99'), 1)
+        self.assertIsNone(hub.parse_event_id('0-1'))
+        self.assertIsNone(hub.parse_event_id(None))
+
+
+class EventStreamServerTest(unittest.TestCase):
+    """SSE 服务：多个订阅连接共用一个线程，断线后从 Last-Event-ID 继续"""
+
+    def setUp(self):
+        self.hub = EventHub()
+        self.server = EventStreamServer(self.hub, host='127.0.0.1', port=0, heartbeat=0.2, publish_port=0)
+        self.assertTrue(self.server.start())
+        self.sockets = []
+
+    def tearDown(self):
+        for sock in self.sockets:
+            sock.close()
+        self.server.stop()
+
+    def connect(self, path='/api/stream', last_event_id=None):
+        sock = socket.create_connection(('127.0.0.1', self.server.port), timeout=2)
+        headers = f"Last-Event-ID: {last_event_id}\r\n" if last_event_id else ''
+        sock.sendall(f"GET {path} HTTP/1.1\r\nHost: test\r\n{headers}\r\n".encode('latin-1'))
+        self.sockets.append(sock)
+        return sock
+
+    def read_until(self, sock, marker):
+        data = b''
+        deadline = time.time() + 2
+        while marker not in data and time.time() < deadline:
+            data += sock.recv(65536)
+        return data.decode('utf-8')
+
+    def wait_subscribers(self, count):
+        deadline = time.time() + 2
+        while self.server.stats()['subscribers'] < count and time.time() < deadline:
+            time.sleep(0.01)
+
+    def test_push_to_subscribers(self):
+        subscribers = [self.connect() for _ in range(20)]
+        self.wait_subscribers(20)
+        self.hub.publish('readings', {'data': [{'data_id': 'ED000001'}]})
+        for sock in subscribers:
+            body = self.read_until(sock, b'ED000001')
+            self.assertIn('text/event-stream', body)
+            self.assertIn('event: readings', body)
+        self.assertIn(': ping', self.read_until(subscribers[0], b': ping'))
+
+    def test_resume_and_reset(self):
+        self.hub.publish('alert', {'n': 1})
+        self.hub.publish('alert', {'n': 2})
+        body = self.read_until(self.connect(last_event_id=f'{self.hub.epoch}-1'), b'"n":2')
+        self.assertNotIn('"n":1', body)
+        self.assertIn('"n":2', body)
+
+        # 服务重启前的事件编号：要求整体重新加载
+        self.assertIn('event: reset', self.read_until(self.connect(last_event_id='0-5'), b'reset'))
+
+    def test_unknown_path(self):
+        self.assertIn('404', self.read_until(self.connect('/other'), b'\r\n'))
+
+    def test_forwarded_events(self):
+        forwarder = EventForwarder(f'http://127.0.0.1:{self.server.publish_port}/api/stream/publish')
+        subscriber = self.connect()
+        self.wait_subscribers(1)
+        self.assertTrue(forwarder.flush([('readings', {'data': [{'data_id': 'ED000002'}]})]))
+        self.assertIn('event: readings', self.read_until(subscriber, b'ED000002'))
+
+        # 推送服务不可用期间丢失的事件：恢复后先发送 reset
+        unreachable = EventForwarder('http://127.0.0.1:9/api/stream/publish', timeout=0.5)
+        self.assertFalse(unreachable.flush([('alert', {'n': 1})]))
+        unreachable.url = forwarder.url
+        self.assertTrue(unreachable.flush([('alert', {'n': 2})]))
+        body = self.read_until(subscriber, b'"n":2')
+        self.assertIn('event: reset', body)
+        self.assertNotIn('"n":1', body)
+        self.assertEqual(self.server.stats()['forwarded'], 3)
+
+    def test_forwarding_requires_token(self):
+        self.server.publish_token = 'secret'
+        url = f'http://127.0.0.1:{self.server.publish_port}/api/stream/publish'
+        self.assertFalse(EventForwarder(url).flush([('alert', {})]))
+        self.assertTrue(EventForwarder(url, token='secret').flush([('alert', {})]))
+
+    def test_publish_not_served_on_subscriber_port(self):
+        """订阅端口（可能经反向代理对外提供）不接受转发"""
+        url = f'http://127.0.0.1:{self.server.port}/api/stream/publish'
+        self.assertFalse(EventForwarder(url).flush([('alert', {})]))
+        self.assertEqual(self.server.stats()['forwarded'], 0)
+
+    def post_publish(self, body, content_type='application/json'):
+        sock = socket.create_connection(('127.0.0.1', self.server.publish_port), timeout=2)
+        self.sockets.append(sock)
+        sock.sendall(f"POST /api/stream/publish HTTP/1.1\r\nHost: test\r\nContent-Type: {content_type}\r\n"
+                     f"Content-Length: {len(body)}\r\n\r\n".encode('latin-1') + body)
+        return self.read_until(sock, b'\r\n')
+
+    def test_publish_rejects_unknown_event_types(self):
+        """事件类型不在 EVENT_TYPES 中（包括带换行、企图注入 SSE 帧的类型）时整批拒绝"""
+        subscriber = self.connect()
+        self.wait_subscribers(1)
+        for body in (b'[["alert\\ndata: {}\\n\\nevent: reset", {}]]', b'[["unknown", {}]]',
+                     b'[["alert"]]', b'{"alert": {}}'):
+            with self.subTest(body=body):
+                self.assertIn('400', self.post_publish(body))
+        self.assertIn('415', self.post_publish(b'[["alert", {}]]', content_type='text/plain'))
+        self.assertIn('204', self.post_publish(b'[["alert", {"n": 3}]]'))
+        body = self.read_until(subscriber, b'"n":3')
+        self.assertNotIn('reset', body)
+        self.assertEqual(self.server.stats()['forwarded'], 1)
+
+    def test_hub_rejects_unknown_event_types(self):
+        with self.assertRaises(ValueError):
+            self.hub.publish('alert\nevent: reset', {})
+
+    def test_public_publish_host_requires_token(self):
+        with self.assertRaises(ValueError):
+            EventStreamServer(self.hub, publish_host='0.0.0.0', publish_port=0)
+        EventStreamServer(self.hub, publish_host='0.0.0.0', publish_port=0, publish_token='secret')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
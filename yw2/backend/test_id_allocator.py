@@ -0,0 +1,61 @@
+import os
+import tempfile
+import threading
+import unittest
+
+from sqlalchemy import create_engine, text
+
+from id_allocator import DataIdAllocator
+
+
+class DataIdAllocatorTest(unittest.TestCase):
+    """号段分配器测试（使用临时SQLite库作为替身）"""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        with self.engine.begin() as conn:
+            conn.execute(text("CREATE TABLE id_sequence (seq_name VARCHAR(50) PRIMARY KEY, next_val BIGINT NOT NULL)"))
+            conn.execute(text("CREATE TABLE environment_data (data_id VARCHAR(20) PRIMARY KEY)"))
+            conn.execute(text("INSERT INTO environment_data (data_id) VALUES ('ED000099'), ('ED1000000'), ('T1ED00001')"))
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def test_continues_from_existing_max(self):
+        """序列从现有最大编号之后开始（按数值而不是字符串比较）"""
+        allocator = DataIdAllocator(lambda: self.engine, block_size=10)
+        self.assertEqual(allocator.next_id(), 'ED1000001')
+        self.assertEqual(allocator.next_ids(2), ['ED1000002', 'ED1000003'])
+
+    def test_concurrent_allocators_never_overlap(self):
+        """多个分配器（模拟多个进程）并发取号时不产生重复ID"""
+        allocators = [DataIdAllocator(lambda: self.engine, block_size=7) for _ in range(4)]
+        results = [[] for _ in allocators]
+
+        def worker(index):
+            for _ in range(50):
+                results[index].append(allocators[index].next_id())
+
+        threads = [threading.Thread(target=worker, args=(i,)) for i in range(len(allocators))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        all_ids = [data_id for ids in results for data_id in ids]
+        self.assertEqual(len(all_ids), 200)
+        self.assertEqual(len(set(all_ids)), 200)
+
+    def test_large_request_spans_blocks(self):
+        """一次请求超过号段大小时仍返回连续编号"""
+        allocator = DataIdAllocator(lambda: self.engine, block_size=3)
+        ids = allocator.next_ids(10)
+        self.assertEqual(len(set(ids)), 10)
+        self.assertEqual(ids[0], 'ED1000001')
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,233 @@
+import glob
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime
+
+from ingest_queue import IngestQueue, IngestQueueFull, DEAD_LETTER_FILE, OWNER_LOCK_FILE
+
+
+def make_row(data_id, value=1.0):
+    return {'data_id': data_id, 'device_id': 'D1', 'indicator_id': 'I1',
+            'collection_time': datetime(2024, 1, 1, 8, 0, 0), 'monitor_value': value}
+
+
+class RecordingWriter:
+    """记录写入的批次；fail(rows) 返回要抛出的异常（不抛出时返回 None）"""
+
+    def __init__(self, fail=None):
+        self.fail = fail
+        self.batches = []
+        self.calls = 0
+        self.written = threading.Event()
+
+    def __call__(self, rows):
+        self.calls += 1
+        error = self.fail(rows) if self.fail else None
+        if error:
+            raise error
+        self.batches.append([row['data_id'] for row in rows])
+        self.written.set()
+
+    @property
+    def data_ids(self):
+        return [data_id for batch in self.batches for data_id in batch]
+
+
+class IngestQueueTest(unittest.TestCase):
+    """异步写入队列测试（写库函数用替身）"""
+
+    def setUp(self):
+        self.spill_dir = tempfile.mkdtemp()
+        self.queues = []
+
+    def tearDown(self):
+        for queue in self.queues:
+            queue.stop(timeout=2.0)
+        shutil.rmtree(self.spill_dir, ignore_errors=True)
+
+    def make_queue(self, writer, **options):
+        options.setdefault('spill_dir', self.spill_dir)
+        options.setdefault('max_retry_delay', 0.01)
+        queue = IngestQueue(writer, **options)
+        self.queues.append(queue)
+        return queue
+
+    def wait_until(self, condition, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if condition():
+                return
+            time.sleep(0.01)
+        self.fail(f'条件未在 {timeout} 秒内满足')
+
+    def dead_letters(self):
+        path = os.path.join(self.spill_dir, DEAD_LETTER_FILE)
+        if not os.path.exists(path):
+            return []
+        with open(path, encoding='utf-8') as f:
+            return [json.loads(line) for line in f]
+
+    def test_full_queue_rejects(self):
+        """队列已满时拒绝新记录（接口返回 429），不落盘"""
+        queue = self.make_queue(RecordingWriter(), maxsize=2, spill_dir=None)
+        queue.submit(make_row('A1'))
+        queue.submit(make_row('A2'))
+        with self.assertRaises(IngestQueueFull):
+            queue.submit(make_row('A3'))
+
+        metrics = queue.metrics()
+        self.assertEqual(metrics['accepted'], 2)
+        self.assertEqual(metrics['rejected'], 1)
+        self.assertEqual(metrics['queue_depth'], 2)
+
+    def test_flush_writes_batches(self):
+        writer = RecordingWriter()
+        queue = self.make_queue(writer, batch_size=3, flush_interval=0.05)
+        queue.start()
+        for i in range(7):
+            queue.submit(make_row(f'B{i}'))
+        self.wait_until(lambda: queue.metrics()['flushed_rows'] == 7)
+
+        self.assertEqual(sorted(writer.data_ids), [f'B{i}' for i in range(7)])
+        self.assertTrue(all(len(batch) <= 3 for batch in writer.batches))
+
+    def test_replay_after_crash(self):
+        """进程崩溃后，其他进程启动时补写落盘文件中尚未入库的记录（已入库的按ID去重）"""
+        crashed = self.make_queue(RecordingWriter(), batch_size=100, flush_interval=3600)
+        crashed.start()
+        for i in range(5):
+            crashed.submit(make_row(f'C{i}', value=float(i)))
+        # 模拟崩溃：锁随进程退出释放，落盘文件留在原处
+        crashed._owner_lock.close()
+        crashed._owner_lock = None
+
+        writer = RecordingWriter()
+        recovered = self.make_queue(writer, existing_ids=lambda ids: {'C0', 'C3'} & set(ids))
+        recovered.start()
+
+        self.assertEqual(writer.data_ids, ['C1', 'C2', 'C4'])
+        self.assertFalse(os.path.exists(crashed._owner_dir))
+
+    def test_live_owner_not_recovered(self):
+        """仍在运行的进程的落盘目录不被接管"""
+        running = self.make_queue(RecordingWriter(), batch_size=100, flush_interval=3600)
+        running.start()
+        running.submit(make_row('L1'))
+
+        writer = RecordingWriter()
+        other = self.make_queue(writer)
+        other.start()
+
+        self.assertEqual(writer.data_ids, [])
+        self.assertTrue(os.path.exists(running._owner_dir))
+
+    def write_orphan(self, lines):
+        owner_dir = os.path.join(self.spill_dir, 'worker-orphan')
+        os.makedirs(owner_dir)
+        open(os.path.join(owner_dir, OWNER_LOCK_FILE), 'w').close()
+        with open(os.path.join(owner_dir, 'ingest-000000000001.jsonl'), 'w', encoding='utf-8') as f:
+            f.write('\n'.join(lines) + '\n')
+        return owner_dir
+
+    def test_corrupt_spill_lines_quarantined(self):
+        """无法解析的落盘行移入死信文件，其余记录照常补写，启动不中断"""
+        good = json.dumps({'data_id': 'G1', 'collection_time': '2024-01-01T08:00:00', 'monitor_value': 1.0})
+        good2 = json.dumps({'data_id': 'G2', 'collection_time': None, 'monitor_value': 2.0})
+        owner_dir = self.write_orphan([
+            good,
+            '{"data_id": "H1", "collection_ti',          # 崩溃时写了半行
+            '[1, 2, 3]',                                  # 不是对象
+            json.dumps({'data_id': 'H2', 'collection_time': 'not-a-date'}),
+            json.dumps({'monitor_value': 3.0}),           # 缺少数据ID
+            good2,
+        ])
+
+        writer = RecordingWriter()
+        queue = self.make_queue(writer)
+        queue.start()
+
+        self.assertEqual(writer.data_ids, ['G1', 'G2'])
+        self.assertFalse(os.path.exists(owner_dir))
+        dead = self.dead_letters()
+        self.assertEqual(len(dead), 4)
+        self.assertTrue(all('raw' in entry and entry['error'] for entry in dead))
+        self.assertEqual(queue.metrics()['dead_lettered'], 4)
+        self.assertTrue(queue.running)
+
+    def test_recovery_keeps_files_on_transient_error(self):
+        """补写时数据库暂时不可用：启动不中断，保留落盘目录待下次启动"""
+        owner_dir = self.write_orphan([json.dumps({'data_id': 'T1', 'collection_time': None})])
+        queue = self.make_queue(RecordingWriter(fail=lambda rows: ConnectionError('数据库不可用')))
+        queue.start()
+
+        self.assertTrue(queue.running)
+        self.assertTrue(glob.glob(os.path.join(owner_dir, 'ingest-*.jsonl')))
+
+        writer = RecordingWriter()
+        retry = self.make_queue(writer)
+        retry.start()
+        self.assertEqual(writer.data_ids, ['T1'])
+        self.assertFalse(os.path.exists(owner_dir))
+
+    def test_permanently_failing_batch(self):
+        """永久性错误：拆批定位出坏记录移入死信文件，其余记录写入，落盘段被释放"""
+        def fail(rows):
+            if any(row['data_id'].startswith('BAD') for row in rows):
+                return ValueError('外键约束失败')
+            return None
+
+        writer = RecordingWriter(fail=fail)
+        queue = self.make_queue(writer, batch_size=8, flush_interval=0.05, segment_size=4)
+        queue.start()
+        ids = ['P0', 'P1', 'BAD2', 'P3', 'P4', 'P5', 'BAD6', 'P7']
+        for data_id in ids:
+            queue.submit(make_row(data_id))
+        self.wait_until(lambda: queue.metrics()['flush_count'] == 1)
+
+        self.assertEqual(sorted(writer.data_ids), sorted(i for i in ids if not i.startswith('BAD')))
+        self.assertEqual(sorted(entry['row']['data_id'] for entry in self.dead_letters()), ['BAD2', 'BAD6'])
+        metrics = queue.metrics()
+        self.assertEqual(metrics['dead_lettered'], 2)
+        self.assertEqual(metrics['flushed_rows'], 6)
+        self.assertEqual(metrics['queue_depth'], 0)
+        # 已写完的旧段文件被删除，只剩当前段
+        self.assertEqual(len(glob.glob(os.path.join(queue._owner_dir, 'ingest-*.jsonl'))), 1)
+
+        # 后续记录照常写入
+        queue.submit(make_row('P8'))
+        self.wait_until(lambda: 'P8' in writer.data_ids)
+
+    def test_transient_error_retried(self):
+        """暂时性错误整批重试，不拆批、不进死信文件"""
+        failures = [ConnectionError('连接断开'), ConnectionError('连接断开')]
+        writer = RecordingWriter(fail=lambda rows: failures.pop() if failures else None)
+        queue = self.make_queue(writer, batch_size=3, flush_interval=0.05)
+        queue.start()
+        for i in range(3):
+            queue.submit(make_row(f'R{i}'))
+        self.wait_until(lambda: queue.metrics()['flushed_rows'] == 3)
+
+        self.assertEqual(writer.batches, [['R0', 'R1', 'R2']])
+        self.assertEqual(queue.metrics()['failed_flushes'], 2)
+        self.assertEqual(self.dead_letters(), [])
+
+    def test_custom_transient_classifier(self):
+        """由 is_transient 判断哪些错误重试"""
+        failures = [RuntimeError('锁等待超时')]
+        writer = RecordingWriter(fail=lambda rows: failures.pop() if failures else None)
+        queue = self.make_queue(writer, batch_size=2, flush_interval=0.05,
+                                is_transient=lambda e: isinstance(e, RuntimeError))
+        queue.start()
+        queue.submit(make_row('K1'))
+        queue.submit(make_row('K2'))
+        self.wait_until(lambda: queue.metrics()['flushed_rows'] == 2)
+        self.assertEqual(writer.batches, [['K1', 'K2']])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import tempfile
+import threading
+import time
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, String, Text, BigInteger,
+                        Boolean, DateTime)
+
+from job_runner import JobRunner, JOB_SUCCEEDED, JOB_FAILED, JOB_CANCELLED, JOB_INTERRUPTED
+
+
+def make_job_table(metadata):
+    return Table(
+        'background_job', metadata,
+        Column('job_id', String(32), primary_key=True),
+        Column('job_type', String(50), nullable=False),
+        Column('status', String(20), nullable=False),
+        Column('params', Text),
+        Column('rows_processed', BigInteger, nullable=False, default=0),
+        Column('rows_total', BigInteger),
+        Column('message', String(200)),
+        Column('result', Text),
+        Column('error', Text),
+        Column('cancel_requested', Boolean, nullable=False, default=False),
+        Column('created_at', DateTime, nullable=False),
+        Column('started_at', DateTime),
+        Column('finished_at', DateTime),
+        Column('updated_at', DateTime, nullable=False)
+    )
+
+
+class JobRunnerTest(unittest.TestCase):
+    """后台任务执行器测试（使用临时SQLite库作为替身）"""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        metadata = MetaData()
+        self.table = make_job_table(metadata)
+        metadata.create_all(self.engine)
+        self.runner = JobRunner(lambda: self.engine, self.table, progress_interval=0)
+
+    def tearDown(self):
+        self.runner.shutdown()
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def wait_finished(self, job_id, timeout=5.0):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            job = self.runner.get(job_id)
+            if job['status'] not in ('pending', 'running'):
+                return job
+            time.sleep(0.02)
+        self.fail(f'任务未在 {timeout} 秒内结束')
+
+    def test_job_result_and_progress(self):
+        """任务结果与进度写入任务表"""
+        def count_job(ctx, n):
+            ctx.set_total(n)
+            for i in range(1, n + 1):
+                ctx.progress(i)
+            return {'sum': n * (n + 1) // 2}
+
+        self.runner.register('count', count_job)
+        job = self.wait_finished(self.runner.submit('count', {'n': 10}))
+        self.assertEqual(job['status'], JOB_SUCCEEDED)
+        self.assertEqual(job['result'], {'sum': 55})
+        self.assertEqual(job['rows_processed'], 10)
+        self.assertEqual(job['progress'], 100.0)
+        self.assertEqual(job['params'], {'n': 10})
+
+    def test_failed_job_records_error(self):
+        """任务抛出异常时记录错误信息"""
+        def broken_job(ctx):
+            raise ValueError('坏数据')
+
+        self.runner.register('broken', broken_job)
+        job = self.wait_finished(self.runner.submit('broken'))
+        self.assertEqual(job['status'], JOB_FAILED)
+        self.assertEqual(job['error'], '坏数据')
+
+    def test_cancel_running_job(self):
+        """运行中的任务在下一次汇报进度时退出"""
+        started = threading.Event()
+
+        def endless_job(ctx):
+            started.set()
+            i = 0
+            while True:
+                i += 1
+                ctx.progress(i)
+                time.sleep(0.01)
+
+        self.runner.register('endless', endless_job)
+        job_id = self.runner.submit('endless')
+        self.assertTrue(started.wait(5))
+        self.runner.cancel(job_id)
+        job = self.wait_finished(job_id)
+        self.assertEqual(job['status'], JOB_CANCELLED)
+        self.assertTrue(job['cancel_requested'])
+
+    def test_cancel_from_other_process(self):
+        """其他工作进程写入的取消标记也能生效"""
+        started = threading.Event()
+
+        def endless_job(ctx):
+            started.set()
+            while True:
+                ctx.progress(0)
+                time.sleep(0.01)
+
+        self.runner.register('endless', endless_job)
+        job_id = self.runner.submit('endless')
+        self.assertTrue(started.wait(5))
+        other = JobRunner(lambda: self.engine, self.table)
+        other.cancel(job_id)
+        self.assertEqual(self.wait_finished(job_id)['status'], JOB_CANCELLED)
+
+    def test_recover_marks_stale_jobs_interrupted(self):
+        """心跳超时的未完成任务在重启后标记为已中断"""
+        stale = datetime.utcnow() - timedelta(hours=1)
+        with self.engine.begin() as conn:
+            conn.execute(self.table.insert().values(
+                job_id='stale', job_type='count', status='running', params='{}',
+                rows_processed=5, rows_total=10, cancel_requested=False,
+                created_at=stale, started_at=stale, updated_at=stale
+            ))
+        self.assertEqual(self.runner.recover(), 1)
+        job = self.runner.get('stale')
+        self.assertEqual(job['status'], JOB_INTERRUPTED)
+        self.assertEqual(job['rows_processed'], 5)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
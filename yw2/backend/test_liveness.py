@@ -0,0 +1,102 @@
+import unittest
+
+from liveness import TimerWheel, LivenessTracker
+
+
+class FakeClock:
+    def __init__(self, now=1000000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TimerWheelTest(unittest.TestCase):
+    """时间轮：不提前到期、超过一圈的键等到所在的圈、取消"""
+
+    def test_expiry(self):
+        wheel = TimerWheel(tick=1.0, slots=10, start=100.0)
+        wheel.schedule('a', 103.5)
+        wheel.schedule('b', 125.0)  # 超过一圈
+        wheel.schedule('c', 104.0)
+        tick = wheel.schedule('d', 105.0)
+        wheel.cancel('d', tick)
+        self.assertEqual(len(wheel), 3)
+
+        self.assertEqual(wheel.advance(103.9), [])
+        self.assertEqual(wheel.advance(104.0), ['a'])
+        self.assertEqual(wheel.advance(115.0), ['c'])
+        self.assertEqual(wheel.advance(125.5), [])
+        self.assertEqual(wheel.advance(126.0), ['b'])
+        self.assertEqual(len(wheel), 0)
+
+    def test_long_gap_checks_each_slot_once(self):
+        wheel = TimerWheel(tick=1.0, slots=10, start=0.0)
+        for i in range(30):
+            wheel.schedule(i, i + 0.5)
+        self.assertEqual(sorted(wheel.advance(1000.0)), list(range(30)))
+
+
+class LivenessTrackerTest(unittest.TestCase):
+    """心跳跟踪：超时离线、恢复上报、按设备表对齐"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.tracker = LivenessTracker(default_interval=3600, tolerance=2.0, tick=1.0, slots=600,
+                                       clock=self.clock)
+
+    def advance(self, seconds):
+        self.clock.now += seconds
+        return self.tracker.check()
+
+    def test_missed_heartbeats_go_offline(self):
+        self.tracker.sync({'D1': True, 'D2': True, 'D3': None})
+        self.tracker.heartbeat('D1', interval=60)
+        self.assertEqual(self.tracker.drain_changes(), ([], []))
+
+        self.assertEqual(self.advance(119), 0)
+        self.tracker.heartbeat('D1', interval=60)
+        self.assertEqual(self.advance(119), 0)
+        self.assertEqual(self.advance(2), 1)
+        self.assertEqual(self.tracker.drain_changes(), ([], ['D1']))
+
+        # D2 没有上报，按默认间隔超时
+        self.assertEqual(self.advance(7200), 1)
+        self.assertEqual(self.tracker.drain_changes(), ([], ['D2']))
+        self.assertEqual(self.tracker.stats()['timers'], 0)
+
+    def test_heartbeat_brings_device_back_online(self):
+        self.tracker.sync({'D1': False})
+        self.tracker.heartbeat('D1', interval=60)
+        self.assertTrue(self.tracker.is_online('D1'))
+        self.assertEqual(self.tracker.drain_changes(), (['D1'], []))
+
+    def test_stale_readings_are_not_heartbeats(self):
+        self.tracker.sync({'D1': False})
+        self.assertFalse(self.tracker.heartbeat('D1', interval=60, seen_at=self.clock.now - 3600))
+        self.assertTrue(self.tracker.heartbeat('D1', interval=60, seen_at=self.clock.now - 60))
+        self.assertEqual(self.advance(61), 1)
+
+    def test_sync_follows_device_table(self):
+        self.tracker.sync({'D1': True, 'D2': True})
+        # 手工改为离线、删除设备
+        self.tracker.sync({'D1': False})
+        self.assertFalse(self.tracker.is_online('D1'))
+        self.assertEqual(self.tracker.stats()['tracked'], 1)
+        self.assertEqual(self.advance(10000), 0)
+
+        # 有待写回的变化时不按设备表覆盖
+        self.tracker.heartbeat('D1')
+        self.tracker.sync({'D1': False})
+        self.assertTrue(self.tracker.is_online('D1'))
+
+    def test_restore_changes_after_failed_write(self):
+        self.tracker.sync({'D1': True})
+        self.advance(7201)
+        online, offline = self.tracker.drain_changes()
+        self.tracker.restore_changes(online, offline)
+        self.assertEqual(self.tracker.drain_changes(), ([], ['D1']))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,103 @@
+import unittest
+from datetime import datetime, timedelta
+
+from recent_readings import RecentReadings
+
+BASE = datetime(2024, 1, 1)
+
+
+def reading(i, region='R1', indicator='I1', minutes=None):
+    return {'data_id': f'ED{i:04d}', 'collection_time': BASE + timedelta(minutes=i if minutes is None else minutes),
+            'region_id': region, 'indicator_id': indicator, 'monitor_value': float(i)}
+
+
+class RecentReadingsTest(unittest.TestCase):
+    """最近数据窗口：覆盖判断、容量淘汰、加载期间的并发修改"""
+
+    def setUp(self):
+        self.window = RecentReadings(capacity=10, key_capacity=5)
+
+    def newest(self, rows, since, limit, **filters):
+        """与数据库查询相同的结果（倒序）"""
+        matched = [row for row in rows if row['collection_time'] >= since
+                   and all(row[field] == value for field, value in filters.items())]
+        return sorted(matched, key=RecentReadings.sort_key, reverse=True)[:limit]
+
+    def test_not_loaded_until_seeded(self):
+        self.window.apply([(None, reading(1))])
+        self.assertIsNone(self.window.query(BASE, 3))
+        self.assertEqual(self.window.stats()['misses'], 1)
+
+    def test_seed_then_follow_inserts_and_eviction(self):
+        rows = [reading(i) for i in range(8)]
+        token = self.window.token()
+        self.assertTrue(self.window.seed(self.newest(rows, BASE, 3), BASE, 3, token))
+
+        # 取满 limit 条加载：只有不早于第 3 新的数据是完整的
+        self.assertEqual(self.window.query(BASE, 3), self.newest(rows, BASE, 3))
+        self.assertIsNone(self.window.query(BASE, 4))
+
+        new_rows = [reading(i) for i in range(8, 20)]
+        self.window.apply([(None, row) for row in new_rows])
+        rows += new_rows
+        self.assertEqual(self.window.query(BASE, 10), self.newest(rows, BASE, 10))
+        # 超过容量后下界提高，更早的起始时间需要查询数据库
+        self.assertIsNone(self.window.query(BASE, 11))
+        self.assertEqual(self.window.stats()['rows'], 10)
+
+    def test_edit_and_delete(self):
+        rows = [reading(i) for i in range(6)]
+        since = BASE - timedelta(days=1)
+        self.window.seed(self.newest(rows, since, 10), since, 10, self.window.token())
+
+        moved = dict(rows[1], collection_time=BASE + timedelta(hours=1), monitor_value=99.0)
+        self.window.apply([(rows[1], moved), (rows[4], None)])
+        rows = [moved if row is rows[1] else row for row in rows if row is not rows[4]]
+        self.assertEqual(self.window.query(since, 10), self.newest(rows, since, 10))
+
+    def test_filtered_index(self):
+        rows = [reading(i, region=f'R{i % 2}', indicator=f'I{i % 3}') for i in range(12)]
+        since = BASE
+        self.assertTrue(self.window.seed(self.newest(rows, since, 3, region_id='R1'), since, 3,
+                                         self.window.token(), region_id='R1'))
+        # 同时按两个字段过滤的结果不加载
+        self.assertFalse(self.window.seed([], since, 3, self.window.token(), region_id='R1', indicator_id='I1'))
+
+        extra = reading(20, region='R1', indicator='I2')
+        self.window.apply([(None, extra), (None, reading(21, region='R0'))])
+        rows += [extra, reading(21, region='R0')]
+        self.assertEqual(self.window.query(since, 3, region_id='R1'), self.newest(rows, since, 3, region_id='R1'))
+        self.assertEqual(self.window.query(since, 1, region_id='R1', indicator_id='I2'), [extra])
+        self.assertIsNone(self.window.query(since, 3, indicator_id='I2'))
+        self.assertIsNone(self.window.query(since, 3))
+
+    def test_changes_during_seed_are_replayed(self):
+        rows = [reading(i) for i in range(5)]
+        token = self.window.token()
+        snapshot = self.newest(rows, BASE, 10)
+        # 查询数据库期间提交的修改：一条新增（查询结果中没有），一条删除（查询结果中仍有）
+        self.window.apply([(None, reading(5)), (rows[2], None)])
+        self.assertTrue(self.window.seed(snapshot, BASE, 10, token))
+        expected = self.newest(rows[:2] + rows[3:] + [reading(5)], BASE, 10)
+        self.assertEqual(self.window.query(BASE, 10), expected)
+
+    def test_seed_rejected_after_clear_or_log_overflow(self):
+        token = self.window.token()
+        self.window.clear()
+        self.assertFalse(self.window.seed([], BASE, 10, token))
+
+        window = RecentReadings(capacity=10, key_capacity=5, log_size=2)
+        token = window.token()
+        window.apply([(None, reading(i)) for i in range(3)])
+        self.assertFalse(window.seed([], BASE, 10, token))
+        self.assertTrue(window.seed([], BASE, 10, window.token()))
+
+    def test_disabled(self):
+        window = RecentReadings(capacity=0)
+        window.apply([(None, reading(1))])
+        self.assertFalse(window.seed([], BASE, 10, window.token()))
+        self.assertIsNone(window.query(BASE, 10))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,133 @@
+import unittest
+from unittest import mock
+
+from reference_cache import ReferenceDataCache, IndicatorRef, DeviceRef, RegionRef
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+
+class FakeDatabase:
+    """版本号和三张参考数据表的替身，记录读取版本号和加载的次数"""
+
+    def __init__(self):
+        self.version = 1
+        self.indicators = {'I1': IndicatorRef('I1', '溶解氧', 'mg/L', 10.0, 5.0, '小时')}
+        self.devices = {'D1': DeviceRef('D1', '水质监测仪', 'R1', None, '30天', '正常', 'MQTT')}
+        self.regions = {'R1': RegionRef('R1', '一号区域')}
+        self.version_reads = 0
+        self.loads = 0
+
+    def read_version(self):
+        self.version_reads += 1
+        return self.version
+
+    def load(self):
+        self.loads += 1
+        return dict(self.indicators), dict(self.devices), dict(self.regions)
+
+
+class ReferenceDataCacheTest(unittest.TestCase):
+    """参考数据缓存：版本号比对、未命中时强制比对、定期重新加载（时钟和数据库用替身）"""
+
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = mock.patch('reference_cache.time', self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.db = FakeDatabase()
+        self.cache = ReferenceDataCache(self.db.load, self.db.read_version, check_interval=2.0, max_age=300.0)
+
+    def test_version_checked_only_after_interval(self):
+        first = self.cache.snapshot()
+        self.assertEqual((first.version, first.generation), (1, 1))
+        self.assertEqual(self.cache.indicator('I1').indicator_name, '溶解氧')
+
+        # 检查间隔内不读取版本号
+        self.clock.now += 1.0
+        self.assertIs(self.cache.snapshot(), first)
+        self.assertEqual((self.db.version_reads, self.db.loads), (1, 1))
+
+        # 超过检查间隔：版本号未变，不重新加载
+        self.clock.now += 1.5
+        self.assertIs(self.cache.snapshot(), first)
+        self.assertEqual((self.db.version_reads, self.db.loads), (2, 1))
+
+    def test_version_bump_reloads(self):
+        self.cache.snapshot()
+        self.db.version = 2
+        self.db.devices['D1'] = self.db.devices['D1']._replace(operation_status='故障')
+
+        # 检查间隔内仍使用旧快照
+        self.assertEqual(self.cache.device('D1').operation_status, '正常')
+        self.clock.now += 2.0
+        self.assertEqual(self.cache.device('D1').operation_status, '故障')
+        self.assertEqual(self.cache.version, 2)
+        self.assertEqual(self.db.loads, 2)
+
+    def test_invalidate_checks_version_immediately(self):
+        self.cache.snapshot()
+        self.db.version = 2
+        self.db.regions['R2'] = RegionRef('R2', '二号区域')
+        self.cache.invalidate()
+        self.assertEqual(self.cache.regions(), self.db.regions)
+        self.assertEqual(self.cache.snapshot().generation, 2)
+
+    def test_miss_forces_version_check(self):
+        """未命中时不等检查间隔，强制比对一次版本号，取到其他进程刚新增的数据"""
+        self.cache.snapshot()
+        self.db.version = 2
+        self.db.indicators['I2'] = IndicatorRef('I2', '浊度', 'NTU', 5.0, 0.0, '小时')
+
+        self.assertEqual(self.cache.indicator('I2').unit, 'NTU')
+        self.assertEqual((self.db.version_reads, self.db.loads), (2, 2))
+
+    def test_miss_for_unknown_key_does_not_reload(self):
+        self.cache.snapshot()
+        self.assertIsNone(self.cache.device('D9'))
+        self.assertIsNone(self.cache.device(None))
+        # 版本号未变：只多读一次版本号，不重新加载
+        self.assertEqual((self.db.version_reads, self.db.loads), (2, 1))
+
+    def test_repeated_misses_rate_limited(self):
+        """连续未命中时每个检查间隔最多强制比对一次版本号"""
+        self.cache.snapshot()
+        for i in range(100):
+            self.assertIsNone(self.cache.device(f'X{i}'))
+            self.assertIsNone(self.cache.indicator(f'X{i}'))
+        self.assertEqual((self.db.version_reads, self.db.loads), (2, 1))
+
+        # 间隔内新增的数据在下一个间隔取到
+        self.db.version = 2
+        self.db.devices['D2'] = DeviceRef('D2', '气象站', 'R1', None, None, '正常', 'HTTP')
+        self.clock.now += 1.0
+        self.assertIsNone(self.cache.device('D2'))
+        self.assertEqual(self.db.version_reads, 2)
+        self.clock.now += 1.0
+        self.assertEqual(self.cache.device('D2').device_type, '气象站')
+        self.assertEqual(self.db.loads, 2)
+
+    def test_max_age_reloads_without_version_bump(self):
+        """区域表由其他业务线维护、不递增版本号，超过 max_age 后仍会重新加载"""
+        first = self.cache.snapshot()
+        self.db.regions['R1'] = RegionRef('R1', '改名后的区域')
+
+        self.clock.now += 299.0
+        self.assertIs(self.cache.snapshot(), first)
+        self.assertEqual(self.cache.region('R1').region_name, '一号区域')
+
+        # 超过 max_age 后的下一次版本号比对时重新加载
+        self.clock.now += 2.0
+        snapshot = self.cache.snapshot()
+        self.assertEqual((snapshot.version, snapshot.generation), (1, 2))
+        self.assertEqual(self.cache.region('R1').region_name, '改名后的区域')
+        self.assertEqual(self.db.loads, 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,179 @@
+import os
+import random
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+
+from sqlalchemy import (create_engine, MetaData, Table, Column, String, Date, DateTime, BigInteger,
+                        Boolean, Numeric)
+
+from rollups import DataRollups, RollupDeltas, split_time_range
+
+
+def rollup_columns():
+    return [
+        Column('device_id', String(20), primary_key=True),
+        Column('indicator_id', String(20), primary_key=True),
+        Column('region_id', String(20), primary_key=True),
+        Column('record_count', BigInteger, nullable=False, default=0),
+        Column('value_count', BigInteger, nullable=False, default=0),
+        Column('value_sum', Numeric(20, 4), nullable=False, default=0),
+        Column('value_min', Numeric(10, 4)),
+        Column('value_max', Numeric(10, 4)),
+        Column('abnormal_count', BigInteger, nullable=False, default=0),
+        Column('excellent_count', BigInteger, nullable=False, default=0),
+        Column('good_count', BigInteger, nullable=False, default=0),
+        Column('medium_count', BigInteger, nullable=False, default=0),
+        Column('poor_count', BigInteger, nullable=False, default=0)
+    ]
+
+
+class SplitTimeRangeTest(unittest.TestCase):
+    """报告时间范围拆分"""
+
+    def test_whole_days_use_daily_only(self):
+        segments = split_time_range(datetime(2026, 1, 1), datetime(2026, 3, 1))
+        self.assertEqual([s.kind for s in segments], ['daily'])
+
+    def test_edges(self):
+        segments = split_time_range(datetime(2026, 1, 1, 10, 15), datetime(2026, 1, 5, 7, 30))
+        self.assertEqual([(s.kind, s.start, s.end) for s in segments], [
+            ('raw', datetime(2026, 1, 1, 10, 15), datetime(2026, 1, 1, 11)),
+            ('hourly', datetime(2026, 1, 1, 11), datetime(2026, 1, 2)),
+            ('daily', datetime(2026, 1, 2), datetime(2026, 1, 5)),
+            ('hourly', datetime(2026, 1, 5), datetime(2026, 1, 5, 7)),
+            ('raw', datetime(2026, 1, 5, 7), datetime(2026, 1, 5, 7, 30)),
+        ])
+
+    def test_within_one_hour(self):
+        segments = split_time_range(datetime(2026, 1, 1, 10, 15), datetime(2026, 1, 1, 10, 45))
+        self.assertEqual([s.kind for s in segments], ['raw'])
+
+
+class DataRollupsTest(unittest.TestCase):
+    """汇总表增量维护与按时间段查询（使用临时SQLite库作为替身）"""
+
+    def setUp(self):
+        fd, self.db_path = tempfile.mkstemp(suffix='.db')
+        os.close(fd)
+        self.engine = create_engine(f"sqlite:///{self.db_path}")
+        metadata = MetaData()
+        self.data_table = Table(
+            'environment_data', metadata,
+            Column('data_id', String(20), primary_key=True),
+            Column('indicator_id', String(20)),
+            Column('device_id', String(20)),
+            Column('region_id', String(20)),
+            Column('collection_time', DateTime),
+            Column('monitor_value', Numeric(10, 4)),
+            Column('data_quality', String(2)),
+            Column('is_abnormal', Boolean)
+        )
+        hourly = Table('environment_data_hourly', metadata,
+                       Column('bucket_time', DateTime, primary_key=True), *rollup_columns())
+        daily = Table('environment_data_daily', metadata,
+                      Column('stat_date', Date, primary_key=True), *rollup_columns())
+        metadata.create_all(self.engine)
+        self.rollups = DataRollups(hourly, daily, self.data_table)
+
+        rng = random.Random(7)
+        start = datetime(2026, 1, 1)
+        self.rows = [{
+            'data_id': f'ED{i:06d}', 'indicator_id': rng.choice(['I1', 'I2']), 'device_id': f'D{i % 3}',
+            'region_id': 'R1', 'collection_time': start + timedelta(seconds=rng.randint(0, 20 * 86400)),
+            'monitor_value': round(rng.uniform(0, 50), 2) if i % 11 else None,
+            'data_quality': rng.choice(['优', '良', '中', '差']), 'is_abnormal': i % 5 == 0
+        } for i in range(2000)]
+
+    def tearDown(self):
+        self.engine.dispose()
+        os.remove(self.db_path)
+
+    def insert(self, rows):
+        with self.engine.begin() as conn:
+            conn.execute(self.data_table.insert(), rows)
+            deltas = RollupDeltas()
+            deltas.add_rows(rows)
+            self.rollups.apply(conn, deltas)
+
+    def expected(self, start, end):
+        result = {}
+        for row in self.rows:
+            if start <= row['collection_time'] < end:
+                item = result.setdefault((row['region_id'], row['indicator_id']), [0, 0, None, 0])
+                item[0] += 1
+                item[3] += bool(row['is_abnormal'])
+                if row['monitor_value'] is not None:
+                    item[1] += row['monitor_value']
+                    item[2] = row['monitor_value'] if item[2] is None else max(item[2], row['monitor_value'])
+        return result
+
+    def assert_matches(self, start, end):
+        with self.engine.connect() as conn:
+            summary = self.rollups.summarize(conn, start, end)
+        expected = self.expected(start, end)
+        self.assertEqual(set(summary), set(expected))
+        for key, (count, value_sum, value_max, abnormal) in expected.items():
+            self.assertEqual(summary[key]['record_count'], count)
+            self.assertAlmostEqual(summary[key]['value_sum'], value_sum, places=2)
+            self.assertEqual(summary[key]['value_max'], value_max)
+            self.assertEqual(summary[key]['abnormal_count'], abnormal)
+
+    def test_incremental_matches_raw(self):
+        """分批写入（含迟到数据）后，各种时间范围的汇总与原始数据一致"""
+        self.insert(self.rows[:1500])
+        self.insert(self.rows[1500:])  # 采集时间随机分布，相当于迟到的数据
+        self.assert_matches(datetime(2026, 1, 1), datetime(2026, 1, 21))
+        self.assert_matches(datetime(2026, 1, 3, 10, 17, 5), datetime(2026, 1, 9, 4, 59, 59))
+        self.assert_matches(datetime(2026, 1, 3, 10, 17), datetime(2026, 1, 3, 10, 40))
+
+    def test_dirty_bucket_recomputed(self):
+        """删除当前最大值后，重算的时间桶得到新的最大值"""
+        self.insert(self.rows)
+        target = max((r for r in self.rows if r['monitor_value'] is not None), key=lambda r: r['monitor_value'])
+        with self.engine.begin() as conn:
+            conn.execute(self.data_table.delete().where(self.data_table.c.data_id == target['data_id']))
+            deltas = RollupDeltas()
+            deltas.mark_dirty(target['device_id'], target['indicator_id'], target['region_id'],
+                              target['collection_time'])
+            self.rollups.apply(conn, deltas)
+        self.rows.remove(target)
+        self.assert_matches(datetime(2026, 1, 1), datetime(2026, 1, 21))
+
+    def test_rebuild_matches_incremental(self):
+        """批量重建的结果与增量维护一致"""
+        with self.engine.begin() as conn:
+            conn.execute(self.data_table.insert(), self.rows)
+            self.assertEqual(self.rollups.data_date_range(conn),
+                             (datetime(2026, 1, 1).date(), max(r['collection_time'] for r in self.rows).date()))
+        with self.engine.begin() as conn:
+            self.assertGreater(self.rollups.rebuild(conn, datetime(2026, 1, 1).date(), datetime(2026, 2, 1).date()), 0)
+        self.assert_matches(datetime(2026, 1, 1), datetime(2026, 1, 21))
+        self.assert_matches(datetime(2026, 1, 2, 3, 30), datetime(2026, 1, 2, 18, 45))
+
+    def rollup_tables(self):
+        with self.engine.connect() as conn:
+            return {table.name: sorted(tuple(row) for row in conn.execute(table.select()))
+                    for table in (self.rollups.hourly, self.rollups.daily)}
+
+    def test_incremental_and_rebuild_count_quality_alike(self):
+        """数据质量为空的数据在增量累加和重建中按同一规则计数，两者的汇总表完全一致"""
+        for row in self.rows[::7]:
+            row['data_quality'] = None
+        self.insert(self.rows)
+        incremental = self.rollup_tables()
+
+        with self.engine.begin() as conn:
+            conn.execute(self.rollups.hourly.delete())
+            conn.execute(self.rollups.daily.delete())
+            self.rollups.rebuild(conn, datetime(2026, 1, 1).date(), datetime(2026, 2, 1).date())
+        self.assertEqual(self.rollup_tables(), incremental)
+
+        with self.engine.connect() as conn:
+            summary = self.rollups.summarize(conn, datetime(2026, 1, 1), datetime(2026, 1, 21))
+        medium = sum(1 for row in self.rows if row['data_quality'] in ('中', None))
+        self.assertEqual(sum(item['medium_count'] for item in summary.values()), medium)
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
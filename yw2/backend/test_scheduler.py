@@ -0,0 +1,81 @@
+import os
+import tempfile
+import unittest
+
+from scheduler import Scheduler, FileLock
+
+
+class FakeClock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SchedulerTest(unittest.TestCase):
+    """单实例调度：文件锁选出一个调度进程、定期任务按间隔执行、调度进程退出后接替"""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, 'scheduler.lock')
+        self.clock = FakeClock()
+        self.calls = []
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def scheduler(self, name):
+        scheduler = Scheduler(FileLock(self.path), retry_interval=5.0, clock=self.clock)
+        scheduler.add_task('tick', 10.0, lambda: self.calls.append(name))
+        scheduler.add_service(lambda: self.calls.append(f'{name} start'), lambda: self.calls.append(f'{name} stop'))
+        return scheduler
+
+    def test_single_leader_and_failover(self):
+        first, second = self.scheduler('a'), self.scheduler('b')
+        first.run_once()
+        second.run_once()
+        self.assertTrue(first.is_leader)
+        self.assertFalse(second.is_leader)
+        self.assertEqual(self.calls, ['a start', 'a'])
+
+        # 任务按间隔执行，未到期时不执行
+        self.clock.now += 5
+        first.run_once()
+        self.clock.now += 5
+        first.run_once()
+        self.assertEqual(self.calls[-1:], ['a'])
+        self.assertEqual(first.stats()['tasks'][0]['runs'], 2)
+
+        # 调度进程退出（释放文件锁）后，其他进程在下次重试时接替
+        first.stop()
+        self.assertEqual(self.calls[-1], 'a stop')
+        second.run_once()
+        self.assertTrue(second.is_leader)
+        self.assertEqual(self.calls[-2:], ['b start', 'b'])
+        second.stop()
+
+    def test_retry_interval_and_task_failure(self):
+        holder = FileLock(self.path)
+        self.assertTrue(holder.acquire())
+        scheduler = self.scheduler('a')
+        scheduler.run_once()
+        holder.release()
+        # 重试间隔内不再尝试获取锁
+        self.clock.now += 1
+        scheduler.run_once()
+        self.assertFalse(scheduler.is_leader)
+        self.clock.now += 5
+        scheduler.run_once()
+        self.assertTrue(scheduler.is_leader)
+
+        # 任务失败不影响调度线程
+        scheduler.add_task('broken', 1.0, lambda: 1 / 0)
+        self.clock.now += 1
+        scheduler.run_once()
+        self.assertEqual(scheduler.stats()['tasks'][1]['failures'], 1)
+        scheduler.stop()
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,92 @@
+import unittest
+
+import numpy as np
+
+from series_anomaly import SeriesAnomalyDetector
+
+
+class SeriesAnomalyDetectorTest(unittest.TestCase):
+    """流式统计异常检测：水平异常、速率异常、同批多条、预热"""
+
+    def setUp(self):
+        self.detector = SeriesAnomalyDetector(alpha=0.1, z_threshold=4.0, rate_threshold=4.0, min_samples=10,
+                                              capacity=2)
+        self.rng = np.random.default_rng(7)
+
+    def feed(self, key, values, start=0.0, step=60.0):
+        times = start + step * np.arange(len(values))
+        return self.detector.update([key] * len(values), values, times)
+
+    def test_cold_start_matches_sample_statistics(self):
+        values = self.rng.normal(20.0, 2.0, 5)
+        self.feed('A', values)
+        state = self.detector.series_state('A')
+        self.assertAlmostEqual(state['mean'], values.mean())
+        self.assertAlmostEqual(state['std'], values.std())
+        self.assertEqual(state['count'], 5)
+        self.assertIsNone(self.detector.series_state('B'))
+
+    def test_level_and_rate_anomalies(self):
+        _, _, level_flag, _ = self.feed('A', self.rng.normal(20.0, 1.0, 200))
+        self.assertLessEqual(level_flag.sum(), 1)
+
+        # 突升：水平和速率同时异常
+        _, _, level_flag, rate_flag = self.detector.update(['A'], [40.0], [200 * 60.0])
+        self.assertTrue(level_flag[0])
+        self.assertTrue(rate_flag[0])
+
+        # 补录的历史数据只更新水平状态，不计算速率
+        _, rate_z, _, _ = self.detector.update(['A'], [20.0], [0.0])
+        self.assertEqual(rate_z[0], 0)
+        self.assertEqual(self.detector.series_state('A')['last_value'], 40.0)
+
+    def test_not_flagged_before_min_samples(self):
+        _, _, level_flag, _ = self.feed('A', [1.0] * 5 + [100.0])
+        self.assertFalse(level_flag.any())
+
+    def test_batch_with_repeated_series_matches_one_by_one(self):
+        keys = [('D%d' % (i % 3), 'I1') for i in range(60)]
+        values = self.rng.normal(10.0, 1.0, 60)
+        times = np.repeat(np.arange(20) * 60.0, 3)
+        batch = self.detector.update(keys, values, times)
+
+        single = SeriesAnomalyDetector(alpha=0.1, min_samples=10)
+        for i, key in enumerate(keys):
+            level_z, rate_z, _, _ = single.update([key], values[i:i + 1], times[i:i + 1])
+            self.assertAlmostEqual(batch[0][i], level_z[0])
+            self.assertAlmostEqual(batch[1][i], rate_z[0])
+        self.assertEqual(self.detector.series_state(('D1', 'I1')), single.series_state(('D1', 'I1')))
+        self.assertEqual(self.detector.stats()['series'], 3)
+        self.assertGreaterEqual(self.detector.stats()['capacity'], 3)
+
+    def test_warm_start_is_not_counted(self):
+        values = self.rng.normal(5.0, 0.5, 100)
+        rows = self.detector.warm_start([(['A'] * 50, values[:50], np.arange(50.0)),
+                                         (['A'] * 50, values[50:], np.arange(50.0, 100.0))])
+        self.assertEqual(rows, 100)
+        self.assertEqual(self.detector.stats()['flagged_level'], 0)
+        _, _, level_flag, _ = self.detector.update(['A'], [50.0], [100.0])
+        self.assertTrue(level_flag[0])
+        self.assertEqual(self.detector.stats()['flagged_level'], 1)
+
+    def test_non_finite_values_skipped(self):
+        """NaN、无穷大不更新状态，也不判定异常"""
+        values = self.rng.normal(20.0, 1.0, 20)
+        self.feed('A', values)
+        before = self.detector.series_state('A')
+
+        level_z, rate_z, level_flag, rate_flag = self.detector.update(
+            ['A', 'A', 'B', 'A'], [np.nan, np.inf, 5.0, 21.0], [1300.0, 1360.0, 1360.0, np.nan])
+        self.assertFalse(level_flag.any() or rate_flag.any())
+        self.assertTrue(np.isfinite(level_z).all() and np.isfinite(rate_z).all())
+        self.assertEqual(self.detector.series_state('A'), before)
+        self.assertEqual(self.detector.series_state('B')['count'], 1)
+
+        self.detector.update(['A'], [21.0], [1400.0])
+        state = self.detector.series_state('A')
+        self.assertEqual(state['count'], 21)
+        self.assertTrue(np.isfinite(state['mean']) and np.isfinite(state['std']))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,122 @@
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from series_cache import SeriesCache, downsample, summarize
+
+BASE = datetime(2024, 1, 8)
+KEY = ('D1', 'I1')
+
+
+def reading(minutes, value, abnormal=False, key=KEY):
+    return {'device_id': key[0], 'indicator_id': key[1], 'collection_time': BASE + timedelta(minutes=minutes),
+            'monitor_value': value, 'is_abnormal': abnormal}
+
+
+def millis(minutes):
+    return SeriesCache.to_millis(BASE + timedelta(minutes=minutes))
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class SeriesCacheTest(unittest.TestCase):
+    """图表序列缓存：加载后跟随新增、乱序归并、修改失效、加载期间的并发修改、点数上限"""
+
+    def setUp(self):
+        self.clock = FakeClock(millis(0) / 1000)
+        self.cache = SeriesCache(retention_days=1, max_points=1000, clock=self.clock)
+
+    def seed(self, times, values, flags, key=KEY):
+        since = self.cache.window_start()
+        return self.cache.seed(key, np.array(times, dtype=np.int64), np.array(values), np.array(flags), since,
+                               self.cache.token(key))
+
+    def test_seed_append_and_slice(self):
+        self.assertIsNone(self.cache.query(KEY, millis(-60), millis(60)))
+        self.assertTrue(self.seed([millis(-30), millis(-20)], [1.0, 2.0], [False, True]))
+        self.cache.apply([(None, reading(i, float(i), i % 3 == 0)) for i in range(50)])
+        # 乱序到达的数据按时间归并
+        self.cache.apply([(None, reading(-25, 9.5, True))])
+
+        times, values, flags = self.cache.query(KEY, millis(-30), millis(3))
+        self.assertEqual(times.tolist(), [millis(-30), millis(-25), millis(-20), millis(0), millis(1), millis(2)])
+        self.assertEqual(values.tolist(), [1.0, 9.5, 2.0, 0.0, 1.0, 2.0])
+        self.assertEqual(flags.tolist(), [False, True, True, True, False, False])
+        # 早于保存范围的起点需要查询数据库
+        self.assertIsNone(self.cache.query(KEY, millis(-2000), millis(0)))
+        self.assertEqual(self.cache.stats()['points'], 53)
+
+    def test_edit_invalidates_and_concurrent_seed_rejected(self):
+        self.seed([millis(-10)], [1.0], [False])
+        old = reading(-10, 1.0)
+        self.cache.apply([(old, dict(old, monitor_value=3.0))])
+        self.assertIsNone(self.cache.query(KEY, millis(-60), millis(0)))
+
+        # 加载期间提交的修改：加载结果可能不包含它，不保存
+        token = self.cache.token(KEY)
+        self.cache.apply([(None, reading(1, 2.0))])
+        self.assertFalse(self.cache.seed(KEY, np.array([millis(-10)]), np.array([3.0]), np.array([False]),
+                                         self.cache.window_start(), token))
+        token = self.cache.token(KEY)
+        self.cache.clear()
+        self.assertFalse(self.cache.seed(KEY, np.array([], dtype=np.int64), np.array([]), np.array([], dtype=bool),
+                                         self.cache.window_start(), token))
+
+    def test_growth_trims_expired_points(self):
+        self.seed([millis(-1400 + i) for i in range(20)], [1.0] * 20, [True] * 20)
+        self.clock.now = millis(50) / 1000
+        self.cache.apply([(None, reading(i, float(i), i % 2 == 1)) for i in range(10)])
+        # 写满时先丢弃超出保存天数（1 天）的数据，位图随之平移
+        self.assertIsNone(self.cache.query(KEY, millis(-1391), millis(10)))
+        times, values, flags = self.cache.query(KEY, millis(-1390), millis(10))
+        self.assertEqual(times[0], millis(-1390))
+        self.assertEqual(len(times), 10 + 10)
+        self.assertEqual(flags.tolist(), [True] * 10 + [i % 2 == 1 for i in range(10)])
+
+    def test_eviction_and_memory_budget(self):
+        for i in range(5):
+            self.seed(list(range(300)), np.ones(300), np.zeros(300, dtype=bool), key=(f'D{i}', 'I1'))
+        stats = self.cache.stats()
+        self.assertLessEqual(stats['points'], 1000)
+        self.assertEqual(stats['evicted'], 2)
+        self.assertLessEqual(stats['bytes_per_point'], 16)
+
+    def test_summary_and_downsample_match_loops(self):
+        rng = np.random.default_rng(1)
+        times = np.sort(rng.integers(0, 10000, 500)).astype(np.int64)
+        values = rng.normal(10, 3, 500).astype(np.float32)
+        flags = rng.random(500) < 0.1
+
+        summary = summarize(times, values, flags)
+        self.assertEqual(summary['count'], 500)
+        self.assertAlmostEqual(summary['mean'], float(np.mean(values.astype(np.float64))), places=6)
+        self.assertEqual(summary['abnormal'], int(flags.sum()))
+
+        result = downsample(times, values, flags, 0, 10000, 7)
+        self.assertEqual(len(result['time']), 7)
+        for i, start in enumerate(result['time'].tolist()):
+            end = (i + 1) * 10000 // 7
+            mask = (times >= start) & (times < end)
+            self.assertEqual(result['count'][i], mask.sum())
+            self.assertEqual(result['min'][i], values[mask].min())
+            self.assertEqual(result['max'][i], values[mask].max())
+            self.assertEqual(result['abnormal'][i], flags[mask].sum())
+        self.assertEqual(int(result['count'].sum()), 500)
+        self.assertEqual(len(downsample(times[:0], values[:0], flags[:0], 0, 10, 3)['time']), 0)
+
+    def test_disabled(self):
+        cache = SeriesCache(retention_days=0)
+        cache.apply([(None, reading(0, 1.0))])
+        self.assertFalse(cache.seed(KEY, [], [], [], 0, cache.token(KEY)))
+        self.assertIsNone(cache.query(KEY, 0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main(verbosity=2)
@@ -0,0 +1,494 @@
+import io
+import os
+import tempfile
+import unittest
+from datetime import datetime, timedelta
+from unittest import mock
+
+# 未指定数据库时使用临时SQLite库，避免测试连接业务库
+_db_fd, _db_path = tempfile.mkstemp(suffix='.db')
+os.close(_db_fd)
+os.environ.setdefault('YW2_DATABASE_URI', f'sqlite:///{_db_path}')
+
+import app as app_module
+from app import app, db, RegionInfo, MonitorIndicator, MonitorDevice, EnvironmentData, EnvironmentDataArchive, DataCounter
+from ingest_queue import IngestQueue
+
+
+@unittest.skipUnless(app.config['SQLALCHEMY_DATABASE_URI'].startswith('sqlite'),
+                     '上传接口测试只在临时SQLite库上运行')
+class UploadApiTest(unittest.TestCase):
+    """环境数据上传接口：写入成功后才产生预警等副作用"""
+
+    @classmethod
+    def setUpClass(cls):
+        cls.client = app.test_client()
+        with app.app_context():
+            db.drop_all()
+            db.create_all()
+            db.session.add(RegionInfo(region_id='UR1', region_name='测试区域'))
+            db.session.add(MonitorIndicator(indicator_id='UI1', indicator_name='测试指标', unit='mg/L',
+                                            standard_upper=10.0, standard_lower=5.0, monitor_freq='小时'))
+            db.session.add(MonitorDevice(device_id='UD1', device_type='测试传感器',
+                                         region_id='UR1', operation_status='正常'))
+            db.session.commit()
+
+    @classmethod
+    def tearDownClass(cls):
+        with app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        if os.path.exists(_db_path):
+            os.remove(_db_path)
+
+    def setUp(self):
+        app_module.alert_store.clear()
+        app_module.series_detector.reset()
+        with app.app_context():
+            db.session.query(EnvironmentData).delete()
+            db.session.query(EnvironmentDataArchive).delete()
+            db.session.query(DataCounter).delete()
+            db.session.commit()
+            app_module.recent_readings.clear()
+            app_module.series_cache.clear()
+
+    def data_alerts(self):
+        return app_module.alert_store.query(alert_type='data_abnormal')
+
+    def upload(self, value, query=''):
+        return self.client.post(f'/api/environment/data/upload{query}', json={
+            'device_id': 'UD1', 'indicator_id': 'UI1', 'monitor_value': value,
+            'collection_time': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        })
+
+    def test_abnormal_upload_records_alert_after_commit(self):
+        response = self.upload(20.0)
+        self.assertEqual(response.status_code, 201)
+        alerts = self.data_alerts()
+        self.assertEqual(len(alerts), 1)
+        self.assertEqual(alerts[0]['data_id'], response.get_json()['data_id'])
+
+    def test_failed_write_records_no_alert(self):
+        """写入失败（数据ID冲突）时不记录预警"""
+        with app.app_context():
+            db.session.add(EnvironmentData(data_id='UED000001', indicator_id='UI1', device_id='UD1',
+                                           region_id='UR1', collection_time=datetime.utcnow() - timedelta(hours=1),
+                                           monitor_value=6.0))
+            db.session.commit()
+        with mock.patch.object(app_module.data_id_allocator, 'next_id', return_value='UED000001'):
+            response = self.upload(20.0)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.data_alerts(), [])
+
+    def test_full_queue_returns_429_without_alert(self):
+        """异步上传队列已满时返回 429，被拒绝的数据不记录预警"""
+        queue = IngestQueue(app_module._write_queued_rows, maxsize=0)
+        with mock.patch.object(app_module, 'ingest_queue', queue):
+            try:
+                response = self.upload(20.0, '?async=1')
+            finally:
+                queue.stop()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response.headers['Retry-After'], '1')
+        self.assertEqual(self.data_alerts(), [])
+
+    def test_queued_upload_records_alert_after_write(self):
+        """异步上传：写入线程提交后记录预警"""
+        queue = IngestQueue(app_module._write_queued_rows, batch_size=10, flush_interval=60)
+        with mock.patch.object(app_module, 'ingest_queue', queue):
+            try:
+                response = self.upload(20.0, '?async=1')
+                self.assertEqual(response.status_code, 202)
+                self.assertEqual(self.data_alerts(), [])
+            finally:
+                queue.stop()
+        self.assertEqual(queue.metrics()['flushed_rows'], 1)
+        self.assertEqual(len(self.data_alerts()), 1)
+
+    def test_update_records_alert_after_commit(self):
+        """修改监测值：提交成功后才记录预警，修改失败回滚时不记录"""
+        with app.app_context():
+            db.session.add(EnvironmentData(data_id='UED000003', indicator_id='UI1', device_id='UD1',
+                                           region_id='UR1', collection_time=datetime.utcnow(), monitor_value=6.0))
+            db.session.commit()
+        series_before = self.series_count()
+
+        # 监测值已处理、采集时间格式错误导致整个修改回滚
+        response = self.client.put('/api/environment/data/UED000003/update',
+                                   json={'monitor_value': 20.0, 'collection_time': '2024/01/01'})
+        self.assertEqual(response.status_code, 500)
+        self.assertEqual(self.data_alerts(), [])
+        with app.app_context():
+            self.assertEqual(float(db.session.get(EnvironmentData, 'UED000003').monitor_value), 6.0)
+
+        response = self.client.put('/api/environment/data/UED000003/update', json={'monitor_value': 20.0})
+        self.assertEqual(response.status_code, 200)
+        alerts = self.data_alerts()
+        self.assertEqual([(alert['data_id'], alert['value']) for alert in alerts], [('UED000003', 20.0)])
+        # 修改后的值不是新的观测，不更新统计状态
+        self.assertEqual(self.series_count(), series_before)
+
+    def test_heartbeat_poll_covers_late_readings(self):
+        """其他进程写入、采集时间已超过 10 分钟的数据：回看最长心跳超时时长的轮询仍计为心跳"""
+        with app.app_context():
+            db.session.add(EnvironmentData(data_id='UED000002', indicator_id='UI1', device_id='UD1',
+                                           region_id='UR1', collection_time=datetime.utcnow() - timedelta(hours=1),
+                                           monitor_value=6.0))
+            db.session.commit()
+            with mock.patch.object(app_module.device_liveness, 'heartbeat') as heartbeat:
+                self.assertEqual(app_module.poll_device_heartbeats(), 0)
+                self.assertEqual(app_module.poll_device_heartbeats(lookback=None), 1)
+        device_id, interval, _ = heartbeat.call_args.args
+        self.assertEqual((device_id, interval), ('UD1', 3600))
+        self.assertGreaterEqual(app_module.max_heartbeat_timeout(), 2 * 3600)
+
+    def series_count(self):
+        state = app_module.series_detector.series_state(('UD1', 'UI1'))
+        return state['count'] if state else 0
+
+    def bulk_item(self, value, **fields):
+        return {'device_id': 'UD1', 'indicator_id': 'UI1', 'region_id': 'UR1', 'monitor_value': value,
+                'collection_time': datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S'), **fields}
+
+    def test_series_state_updated_after_commit(self):
+        """统计异常检测状态只由已提交的数据更新"""
+        data_id = self.upload(6.0).get_json()['data_id']
+        self.assertEqual(self.series_count(), 1)
+
+        # 写入失败（数据ID冲突）
+        with mock.patch.object(app_module.data_id_allocator, 'next_id', return_value=data_id):
+            self.assertEqual(self.upload(6.0).status_code, 400)
+        self.assertEqual(self.series_count(), 1)
+
+        # 批量模式整批回滚
+        response = self.client.post('/api/environment/data/batch-upload?mode=bulk',
+                                    json=[self.bulk_item(6.0), self.bulk_item(7.0, device_id='UNKNOWN')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.series_count(), 1)
+
+        response = self.client.post('/api/environment/data/batch-upload?mode=bulk',
+                                    json=[self.bulk_item(6.0), self.bulk_item(7.0)])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.series_count(), 3)
+
+    def test_non_finite_value_rejected(self):
+        """NaN、无穷大的监测值被拒绝，不写入也不改变统计状态"""
+        for value in ('NaN', 'Infinity', float('nan')):
+            with self.subTest(value=value):
+                self.assertEqual(self.upload(value).status_code, 400)
+        response = self.client.post('/api/environment/data/batch-upload?mode=bulk',
+                                    json=[self.bulk_item(6.0), self.bulk_item('nan')])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('有限', response.get_json()['errors'][0])
+        self.assertEqual(self.series_count(), 0)
+        with app.app_context():
+            self.assertEqual(EnvironmentData.query.count(), 0)
+
+    def stream_upload(self, body, fmt, chunk_size=2):
+        return self.client.post(f'/api/environment/data/stream-upload?format={fmt}&chunk_size={chunk_size}',
+                                data=body, content_type='application/octet-stream')
+
+    def test_stream_upload_ndjson(self):
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        lines = [
+            f'{{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 6.5, "collection_time": "{now}"}}',
+            '',
+            f'{{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 12, "region_id": "UR1"}}',
+            f'{{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 7, "data_quality": "高"}}',
+        ]
+        response = self.stream_upload(('\ufeff' + '\n'.join(lines) + '\n').encode('utf-8'), 'ndjson')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertTrue(result['success'])
+        self.assertEqual(result['summary']['inserted'], 3)
+        self.assertEqual(result['summary']['chunks'], 2)
+        with app.app_context():
+            rows = EnvironmentData.query.order_by(EnvironmentData.monitor_value).all()
+            self.assertEqual([(r.region_id, r.data_quality, r.is_abnormal) for r in rows],
+                             [('UR1', '中', False), ('UR1', '高', False), ('UR1', '中', True)])
+
+    def test_stream_upload_ndjson_bad_lines(self):
+        """无效行（JSON错误、非对象、非UTF-8编码、校验失败）逐行报告，其余行照常写入"""
+        body = b'\n'.join([
+            '{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 6}'.encode('utf-8'),
+            b'{"device_id": "UD1", ',
+            b'[1, 2]',
+            b'{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 6, "note": "\xff\xfe"}',
+            '{"device_id": "UD9", "indicator_id": "UI1", "monitor_value": 6}'.encode('utf-8'),
+            '{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 8}'.encode('utf-8'),
+        ]) + b'\n'
+        response = self.stream_upload(body, 'ndjson')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertNotIn('error', result)
+        self.assertEqual(result['summary']['total_lines'], 6)
+        self.assertEqual(result['summary']['inserted'], 2)
+        self.assertEqual(result['summary']['failed'], 4)
+        errors = result['errors']
+        self.assertTrue(errors[0].startswith('第2行JSON解析失败'))
+        self.assertEqual(errors[1], '第3行应为JSON对象')
+        self.assertTrue(errors[2].startswith('第4行不是有效的UTF-8编码'))
+        self.assertIn('第5行的监测设备不存在', errors[3])
+
+    def test_stream_upload_csv(self):
+        now = datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')
+        body = '\n'.join([
+            'device_id,indicator_id,monitor_value,collection_time,data_quality',
+            f'UD1,UI1,6.5,{now},',
+            'UD1,UI1,abc,,',
+            'UD1,UI1,7',
+            '',
+            f'UD1,UI1,20,{now},高',
+        ]).encode('utf-8') + b'\nUD1,UI1,\xc3\x28,,\n' + b'UD1,UI1,9,,\n'
+        response = self.stream_upload(body, 'csv')
+        self.assertEqual(response.status_code, 200)
+        result = response.get_json()
+        self.assertEqual(result['summary']['inserted'], 3)
+        self.assertEqual(len(result['errors']), 3)
+        self.assertTrue(result['errors'][0].startswith('第3行处理失败'))
+        self.assertEqual(result['errors'][1], '第4行字段数(3)与表头(5)不一致')
+        self.assertTrue(result['errors'][2].startswith('第7行不是有效的UTF-8编码'))
+        with app.app_context():
+            qualities = sorted(r.data_quality for r in EnvironmentData.query.all())
+            self.assertEqual(qualities, ['中', '中', '高'])
+
+    def test_stream_upload_oversized_line(self):
+        """超过单行长度上限的行（包括结尾没有换行符的行）逐行报错并跳过，其余行照常写入"""
+        good = '{"device_id": "UD1", "indicator_id": "UI1", "monitor_value": 6}'.encode('utf-8')
+        oversized = b'{"device_id": "UD1", "note": "' + b'x' * 500 + b'"}'
+        csv_good = b'UD1,UI1,6'
+        with mock.patch.object(app_module, 'MAX_STREAM_LINE_BYTES', 100):
+            for fmt, lines in (('ndjson', [good, oversized, good, oversized]),
+                               ('csv', [b'device_id,indicator_id,monitor_value', csv_good,
+                                        b'UD1,UI1,' + b'9' * 500, csv_good, b'UD1,UI1,' + b'9' * 500])):
+                with self.subTest(fmt=fmt):
+                    response = self.stream_upload(b'\n'.join(lines), fmt)
+                    self.assertEqual(response.status_code, 200)
+                    result = response.get_json()
+                    self.assertEqual(result['summary']['inserted'], 2)
+                    bad_lines = [i + 1 for i, line in enumerate(lines) if len(line) > 100]
+                    self.assertEqual(result['errors'], [f'第{n}行超过单行长度上限(100字节)' for n in bad_lines])
+
+    def test_stream_readline_is_bounded(self):
+        """逐行读取时每次调用 readline 都带长度上限"""
+        class RecordingStream(io.BytesIO):
+            sizes = []
+
+            def readline(self, size=-1):
+                self.sizes.append(size)
+                return super().readline(size)
+
+        stream = RecordingStream(b'{"a": 1}\n' + b'x' * 1000 + b'\n{"b": 2}\n')
+        with mock.patch.object(app_module, 'MAX_STREAM_LINE_BYTES', 100):
+            records = list(app_module.iter_stream_records(stream, 'ndjson'))
+        self.assertEqual(records, [(1, {'a': 1}, None), (2, None, '超过单行长度上限(100字节)'), (3, {'b': 2}, None)])
+        # 读取一行最多 上限+1 字节，丢弃超长行的剩余部分时按缓冲区大小分段读取
+        limit = max(101, app_module.STREAM_READ_BUFFER_SIZE)
+        self.assertTrue(all(0 < size <= limit for size in RecordingStream.sizes))
+
+    def test_batch_upload_keeps_field_semantics(self):
+        """批量模式与逐条模式一致：region_id 必须有效（不按设备区域补齐），缺省 data_quality 为“中”"""
+        for mode in ('bulk', 'legacy'):
+            with self.subTest(mode=mode):
+                response = self.client.post(f'/api/environment/data/batch-upload?mode={mode}',
+                                            json=[self.bulk_item(6.0, region_id='')])
+                self.assertEqual(response.status_code, 400)
+                self.assertIn('区域不存在', response.get_json()['errors'][0])
+
+                response = self.client.post(f'/api/environment/data/batch-upload?mode={mode}',
+                                            json=[self.bulk_item(6.0), self.bulk_item(7.0, data_quality='低')])
+                self.assertEqual(response.status_code, 200)
+                with app.app_context():
+                    rows = EnvironmentData.query.filter(
+                        EnvironmentData.data_id.in_(response.get_json()['data_ids'])
+                    ).order_by(EnvironmentData.monitor_value).all()
+                    self.assertEqual([r.data_quality for r in rows], ['中', '低'])
+
+    def stored_rows(self, data_ids):
+        with app.app_context():
+            rows = EnvironmentData.query.filter(EnvironmentData.data_id.in_(data_ids)).all()
+            by_id = {row.data_id: row for row in rows}
+            return [(by_id[i].device_id, by_id[i].region_id, by_id[i].collection_time, float(by_id[i].monitor_value),
+                     by_id[i].data_quality, by_id[i].is_abnormal, by_id[i].abnormal_reason) for i in data_ids]
+
+    def test_bulk_matches_legacy_around_threshold(self):
+        """数据量跨过 BULK_UPLOAD_THRESHOLD 自动切换到批量模式前后，写入结果一致"""
+        base = datetime.utcnow().replace(microsecond=0) - timedelta(hours=1)
+        values = [4.9999, 5.0, 7.5, 10.0, 10.0001, -3.0, 25.5]
+        items = [self.bulk_item(value, collection_time=(base + timedelta(minutes=i)).strftime('%Y-%m-%d %H:%M:%S'),
+                                data_quality=('高', '中', '低')[i % 3])
+                 for i, value in enumerate(values)]
+        threshold = len(items)
+        with mock.patch.object(app_module, 'BULK_UPLOAD_THRESHOLD', threshold):
+            with mock.patch.object(app_module.EnvironmentMonitorService, 'bulk_upload_environment_data',
+                                   wraps=app_module.EnvironmentMonitorService.bulk_upload_environment_data) as bulk:
+                legacy = self.client.post('/api/environment/data/batch-upload', json=items[:threshold - 1])
+                self.assertEqual(bulk.call_count, 0)
+                legacy_last = self.client.post('/api/environment/data/batch-upload?mode=legacy', json=items[-1:])
+                full = self.client.post('/api/environment/data/batch-upload', json=items)
+                self.assertEqual(bulk.call_count, 1)
+
+        self.assertEqual(legacy.status_code, 200)
+        self.assertEqual(full.status_code, 200)
+        legacy_ids = legacy.get_json()['data_ids'] + legacy_last.get_json()['data_ids']
+        self.assertEqual(self.stored_rows(legacy_ids), self.stored_rows(full.get_json()['data_ids']))
+        self.assertEqual([row[5] for row in self.stored_rows(legacy_ids)],
+                         [True, False, False, False, True, True, True])
+
+    def test_bulk_errors_match_legacy(self):
+        """批量模式逐条报告错误，错误信息与逐条模式一致"""
+        items = [self.bulk_item(6.0), self.bulk_item(6.0, device_id='UD9'), self.bulk_item(6.0, indicator_id='UI9'),
+                 {'device_id': 'UD1'}, self.bulk_item('abc')]
+        responses = {mode: self.client.post(f'/api/environment/data/batch-upload?mode={mode}', json=items)
+                     for mode in ('bulk', 'legacy')}
+        for response in responses.values():
+            self.assertEqual(response.status_code, 400)
+        bulk_errors, legacy_errors = (responses[mode].get_json()['errors'] for mode in ('bulk', 'legacy'))
+        self.assertEqual(bulk_errors[:3], legacy_errors[:3])
+        self.assertEqual(len(bulk_errors), 4)
+        self.assertTrue(bulk_errors[3].startswith('第5条数据处理失败'))
+
+    def test_bulk_null_threshold_is_item_error(self):
+        """指标阈值为空时只有该条数据报错，不使整批返回 500"""
+        snapshot = app_module.reference_cache.snapshot()
+        indicator = snapshot.indicators['UI1']
+        with mock.patch.dict(snapshot.indicators, {'UI2': indicator._replace(indicator_id='UI2', standard_upper=None)}):
+            response = self.client.post('/api/environment/data/batch-upload?mode=bulk',
+                                        json=[self.bulk_item(6.0), self.bulk_item(6.0, indicator_id='UI2')])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.get_json()['errors'], ['第2条数据的监测指标未设置阈值范围: UI2'])
+
+    def add_recalc_rows(self):
+        """7 条状态与阈值不符或相符的数据：3 条应标记为异常，2 条应清除异常，2 条不变"""
+        now = datetime.utcnow().replace(microsecond=0)
+        specs = [(20.0, False), (6.0, True), (1.0, False), (6.0, False), (30.0, True), (7.0, True), (-2.0, False)]
+        with app.app_context():
+            # 批量删除不经过计数器，一并清空计数表
+            db.session.query(EnvironmentData).delete()
+            db.session.query(DataCounter).delete()
+            for i, (value, flagged) in enumerate(specs):
+                db.session.add(EnvironmentData(
+                    data_id=f'UEDR{i:05d}', indicator_id='UI1', device_id='UD1', region_id='UR1',
+                    collection_time=now - timedelta(minutes=i), monitor_value=value, is_abnormal=flagged,
+                    abnormal_reason='旧原因' if flagged else None))
+            db.session.commit()
+        return len(specs)
+
+    def test_recalculate_chunk_boundaries(self):
+        """分块边界（块大小 1、整除、恰好等于总数、大于总数）不影响标记和清除的条数"""
+        for chunk_size in (1, 3, 7, 8, 100):
+            with self.subTest(chunk_size=chunk_size):
+                total = self.add_recalc_rows()
+                app_module.alert_store.clear()
+                response = self.client.post('/api/environment/data/recalculate-abnormal',
+                                            json={'chunk_size': chunk_size})
+                self.assertEqual(response.status_code, 200)
+                summary = response.get_json()['summary']
+                self.assertEqual(summary['abnormal'], 4)
+                self.assertEqual(summary['newly_abnormal'], 3)
+                self.assertEqual(summary['cleared'], 2)
+                self.assertEqual(summary['chunks'], total // chunk_size + 1)
+                self.assertEqual(summary['alerts'], 1)  # 30 分钟内同一设备/指标只记录一次
+                with app.app_context():
+                    flagged = {row.data_id: row.is_abnormal for row in EnvironmentData.query.all()}
+                self.assertEqual([flagged[f'UEDR{i:05d}'] for i in range(total)],
+                                 [True, False, True, False, True, False, True])
+                count = self.client.get('/api/environment/data/abnormal-count').get_json()['count']
+                self.assertEqual(count, 4)
+
+                # 再次计算没有变化
+                summary = self.client.post('/api/environment/data/recalculate-abnormal-by-indicator',
+                                           json={'indicator_id': 'UI1', 'chunk_size': chunk_size}).get_json()['summary']
+                self.assertEqual((summary['newly_abnormal'], summary['cleared']), (0, 0))
+
+    def test_recalculate_chunk_size_validation(self):
+        for url, body in (('/api/environment/data/recalculate-abnormal', {}),
+                          ('/api/environment/data/recalculate-abnormal-by-indicator', {'indicator_id': 'UI1'})):
+            for chunk_size in (0, -1, 'abc', None):
+                with self.subTest(url=url, chunk_size=chunk_size):
+                    response = self.client.post(url, json={**body, 'chunk_size': chunk_size})
+                    self.assertEqual(response.status_code, 400)
+                    self.assertIn('chunk_size', response.get_json()['error'])
+        # 超过上限时按上限处理
+        self.add_recalc_rows()
+        response = self.client.post('/api/environment/data/recalculate-abnormal', json={'chunk_size': 10 ** 12})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['summary']['chunks'], 1)
+
+    def add_archived_rows(self, specs):
+        """直接写入归档表（早于热表下界的数据）：specs 为 [(监测值, 是否已标记异常)]"""
+        old = app_module.hot_data_boundary() - timedelta(days=1)
+        with app.app_context():
+            for i, (value, flagged) in enumerate(specs):
+                db.session.add(EnvironmentDataArchive(
+                    data_id=f'UEDA{i:05d}', indicator_id='UI1', device_id='UD1', region_id='UR1',
+                    collection_time=old - timedelta(minutes=i), monitor_value=value, data_quality='中',
+                    is_abnormal=flagged, abnormal_reason='旧原因' if flagged else None))
+            db.session.commit()
+
+    def test_archived_data_is_read_only(self):
+        """归档数据可以按ID读取；修改、调整、删除返回“已归档，只读”，数据不变"""
+        self.add_archived_rows([(6.0, False)])
+        response = self.client.get('/api/environment/data/UEDA00000')
+        self.assertEqual(response.status_code, 200)
+
+        for method, url, body in (
+                ('put', '/api/environment/data/UEDA00000/update', {'monitor_value': 20.0}),
+                ('put', '/api/environment/data/UEDA00000/update-value', {'monitor_value': 20.0}),
+                ('put', '/api/environment/data/UEDA00000/adjust', {'monitor_value': 20.0}),
+                ('delete', '/api/environment/data/UEDA00000/delete', None)):
+            with self.subTest(url=url):
+                response = getattr(self.client, method)(url, json=body)
+                self.assertEqual(response.status_code, 409)
+                self.assertTrue(response.get_json()['archived'])
+
+        with app.app_context():
+            row = db.session.get(EnvironmentDataArchive, 'UEDA00000')
+            self.assertEqual((float(row.monitor_value), row.is_abnormal), (6.0, False))
+        response = self.client.put('/api/environment/data/UEDX00000/update', json={'monitor_value': 6.0})
+        self.assertEqual(response.status_code, 404)
+
+    def test_recalculate_includes_archive(self):
+        """重新计算同时修正归档数据的异常状态，归档数据不生成预警"""
+        self.add_recalc_rows()
+        self.add_archived_rows([(20.0, False), (6.0, True), (7.0, False)])
+        app_module.alert_store.clear()
+        summary = self.client.post('/api/environment/data/recalculate-abnormal',
+                                   json={'chunk_size': 2}).get_json()['summary']
+        self.assertEqual(summary['newly_abnormal'], 4)
+        self.assertEqual(summary['cleared'], 3)
+        self.assertEqual(summary['chunks'], 4 + 2)
+        self.assertEqual(summary['alerts'], 1)
+        self.assertTrue(all(alert['data_id'].startswith('UEDR') for alert in self.data_alerts()))
+        with app.app_context():
+            flagged = {row.data_id: row.is_abnormal for row in EnvironmentDataArchive.query.all()}
+        self.assertEqual(flagged, {'UEDA00000': True, 'UEDA00001': False, 'UEDA00002': False})
+
+    def test_recalculate_job_progress_counts_scanned_rows(self):
+        """后台任务的总行数包含归档表，进度为实际扫描的行数，不超过总行数"""
+        class RecordingContext:
+            def __init__(self):
+                self.rows_total = None
+                self.reports = []
+
+            def set_total(self, rows_total):
+                self.rows_total = rows_total
+
+            def progress(self, rows_processed):
+                self.reports.append(rows_processed)
+
+        self.add_recalc_rows()
+        self.add_archived_rows([(20.0, False), (6.0, True), (7.0, False)])
+        for indicator_id in (None, 'UI1'):
+            with self.subTest(indicator_id=indicator_id):
+                ctx = RecordingContext()
+                with app.app_context():
+                    app_module._recalculate_abnormal_job(ctx, indicator_id=indicator_id, chunk_size=3)
+                self.assertEqual(ctx.rows_total, 10)
+                # 热表 7 行：3、3、1；归档表 3 行：3，再确认后面没有数据
+                self.assertEqual(ctx.reports, [3, 6, 7, 10, 10])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,14 @@
+# backend/wsgi.py
+"""生产部署入口（多工作进程 WSGI 服务器）
+
+    flask --app app init-db                    # 部署时执行一次：创建表、补充字段（--test-data 插入测试数据）
+    gunicorn -w 4 -b 0.0.0.0:5001 wsgi:app
+
+每个工作进程启动时只启动本进程的后台服务，不修改表结构；定期任务和实时推送服务
+只在取得调度锁的一个进程中运行（见 scheduler.py）。后台线程在工作进程中启动，
+不要使用 gunicorn 的 --preload（在主进程中导入后 fork 出的工作进程没有这些线程）。
+多个工作进程共享设备提醒时设置 YW2_ALERT_BACKEND=table。
+"""
+from app import create_app
+
+app = create_app()
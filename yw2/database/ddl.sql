@@ -18,6 +18,9 @@ CREATE TABLE IF NOT EXISTS monitor_device (
     operation_status VARCHAR(10) NOT NULL CHECK (operation_status IN ('正常', '故障', '离线')),
     comm_proto VARCHAR(50),
     status_update_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    -- 由 calibration_cycle、install_time 推导，应用写入设备时维护
+    calibration_days INT,
+    next_calibration_due DATE,
     FOREIGN KEY (region_id) REFERENCES region_info(region_id)
 );
 
@@ -37,11 +40,128 @@ CREATE TABLE IF NOT EXISTS environment_data (
     FOREIGN KEY (region_id) REFERENCES region_info(region_id)
 );
 
+-- 4. 编号序列表（数据ID按号段预留，替代 SELECT MAX(data_id)）
+CREATE TABLE IF NOT EXISTS id_sequence (
+    seq_name VARCHAR(50) PRIMARY KEY,
+    next_val BIGINT NOT NULL DEFAULT 1
+);
+
+-- 5. 数据版本号表（指标/设备等参考数据修改后递增，各工作进程据此刷新缓存）
+CREATE TABLE IF NOT EXISTS data_version (
+    name VARCHAR(50) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0
+);
+INSERT IGNORE INTO data_version (name, version) VALUES ('reference_data', 0);
+
+-- 6. 后台任务表（重新计算、报告等耗时操作的状态与进度）
+CREATE TABLE IF NOT EXISTS background_job (
+    job_id VARCHAR(32) PRIMARY KEY,
+    job_type VARCHAR(50) NOT NULL,
+    status VARCHAR(20) NOT NULL DEFAULT 'pending',
+    params TEXT,
+    rows_processed BIGINT NOT NULL DEFAULT 0,
+    rows_total BIGINT,
+    message VARCHAR(200),
+    result MEDIUMTEXT,
+    error TEXT,
+    cancel_requested BOOLEAN NOT NULL DEFAULT FALSE,
+    created_at DATETIME NOT NULL,
+    started_at DATETIME,
+    finished_at DATETIME,
+    updated_at DATETIME NOT NULL,
+    INDEX idx_job_status_updated (status, updated_at),
+    INDEX idx_job_created (created_at)
+);
+
+-- 7. 设备提醒表（多个工作进程共享提醒，YW2_ALERT_BACKEND=table 时使用）
+CREATE TABLE IF NOT EXISTS device_alert (
+    alert_id BIGINT AUTO_INCREMENT PRIMARY KEY,
+    alert_key VARCHAR(100) NOT NULL,
+    device_id VARCHAR(20),
+    indicator_id VARCHAR(20),
+    alert_type VARCHAR(30),
+    message VARCHAR(500),
+    payload TEXT,
+    handled BOOLEAN NOT NULL DEFAULT FALSE,
+    handled_at DATETIME,
+    created_at DATETIME NOT NULL,
+    version BIGINT NOT NULL,
+    INDEX idx_alert_key (alert_key),
+    INDEX idx_alert_version (version),
+    INDEX idx_alert_created (created_at),
+    INDEX idx_alert_device (device_id)
+);
+INSERT IGNORE INTO data_version (name, version) VALUES ('alerts', 0);
+
+-- 8. 环境数据计数表（按 区域 x 指标 x 日期 维护，仪表盘统计使用）
+CREATE TABLE IF NOT EXISTS data_counter (
+    region_id VARCHAR(20) NOT NULL,
+    indicator_id VARCHAR(20) NOT NULL,
+    stat_date DATE NOT NULL,
+    total_count BIGINT NOT NULL DEFAULT 0,
+    abnormal_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (region_id, indicator_id, stat_date),
+    INDEX idx_counter_date (stat_date)
+);
+
+-- 9. 环境数据小时汇总表（按 小时 x 设备 x 指标 x 区域，写入时增量维护）
+CREATE TABLE IF NOT EXISTS environment_data_hourly (
+    bucket_time DATETIME NOT NULL,
+    device_id VARCHAR(20) NOT NULL,
+    indicator_id VARCHAR(20) NOT NULL,
+    region_id VARCHAR(20) NOT NULL,
+    record_count BIGINT NOT NULL DEFAULT 0,
+    value_count BIGINT NOT NULL DEFAULT 0,
+    value_sum DECIMAL(20,4) NOT NULL DEFAULT 0,
+    value_min DECIMAL(10,4),
+    value_max DECIMAL(10,4),
+    abnormal_count BIGINT NOT NULL DEFAULT 0,
+    excellent_count BIGINT NOT NULL DEFAULT 0,
+    good_count BIGINT NOT NULL DEFAULT 0,
+    medium_count BIGINT NOT NULL DEFAULT 0,
+    poor_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (bucket_time, device_id, indicator_id, region_id)
+);
+
+-- 10. 环境数据天汇总表（按 日期 x 设备 x 指标 x 区域，写入时增量维护）
+CREATE TABLE IF NOT EXISTS environment_data_daily (
+    stat_date DATE NOT NULL,
+    device_id VARCHAR(20) NOT NULL,
+    indicator_id VARCHAR(20) NOT NULL,
+    region_id VARCHAR(20) NOT NULL,
+    record_count BIGINT NOT NULL DEFAULT 0,
+    value_count BIGINT NOT NULL DEFAULT 0,
+    value_sum DECIMAL(20,4) NOT NULL DEFAULT 0,
+    value_min DECIMAL(10,4),
+    value_max DECIMAL(10,4),
+    abnormal_count BIGINT NOT NULL DEFAULT 0,
+    excellent_count BIGINT NOT NULL DEFAULT 0,
+    good_count BIGINT NOT NULL DEFAULT 0,
+    medium_count BIGINT NOT NULL DEFAULT 0,
+    poor_count BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (stat_date, device_id, indicator_id, region_id)
+);
+
+-- 11. 环境监测数据归档表（超过保留天数的数据由归档任务分批移入，只读；只保留主键和采集时间索引，压缩存储）
+CREATE TABLE IF NOT EXISTS environment_data_archive (
+    data_id VARCHAR(20) PRIMARY KEY,
+    indicator_id VARCHAR(20) NOT NULL,
+    device_id VARCHAR(20) NOT NULL,
+    collection_time TIMESTAMP NOT NULL,
+    monitor_value DECIMAL(10,4),
+    region_id VARCHAR(20) NOT NULL,
+    data_quality CHAR(2) NOT NULL,
+    is_abnormal BOOLEAN DEFAULT FALSE,
+    abnormal_reason VARCHAR(200),
+    INDEX idx_archive_time (collection_time)
+) ROW_FORMAT=COMPRESSED KEY_BLOCK_SIZE=8;
+
 -- 创建索引
 CREATE INDEX idx_indicator_name ON monitor_indicator(indicator_name);
 CREATE INDEX idx_device_region ON monitor_device(region_id);
 CREATE INDEX idx_device_status ON monitor_device(operation_status);
 CREATE INDEX idx_device_status_time ON monitor_device(operation_status, status_update_time);
+CREATE INDEX ix_monitor_device_next_calibration_due ON monitor_device(next_calibration_due);
 CREATE INDEX idx_data_time ON environment_data(collection_time);
 CREATE INDEX idx_data_region ON environment_data(region_id);
 CREATE INDEX idx_data_indicator ON environment_data(indicator_id);
@@ -155,6 +275,7 @@ DELIMITER ;
 DELIMITER //
 CREATE PROCEDURE sp_get_devices_need_calibration()
 BEGIN
+    -- 校准到期日由应用写入设备时预先计算（next_calibration_due），这里不再解析校准周期文本
     SELECT
         md.device_id,
         md.device_type,
@@ -165,32 +286,8 @@ BEGIN
         CASE
             WHEN md.calibration_cycle IS NULL THEN '未设置校准周期'
             WHEN md.install_time IS NULL THEN '安装时间未知'
-            WHEN DATE_ADD(
-                md.install_time,
-                INTERVAL
-                CASE
-                    WHEN md.calibration_cycle LIKE '%天%' OR md.calibration_cycle LIKE '%日%' THEN
-                        CAST(REPLACE(REPLACE(md.calibration_cycle, '天', ''), '日', '') AS UNSIGNED)
-                    WHEN md.calibration_cycle LIKE '%月%' THEN
-                        CAST(REPLACE(md.calibration_cycle, '月', '') AS UNSIGNED) * 30
-                    WHEN md.calibration_cycle LIKE '%年%' THEN
-                        CAST(REPLACE(md.calibration_cycle, '年', '') AS UNSIGNED) * 365
-                    ELSE CAST(md.calibration_cycle AS UNSIGNED)
-                END DAY
-            ) <= CURDATE() THEN '逾期未校准'
-            WHEN DATE_ADD(
-                md.install_time,
-                INTERVAL
-                CASE
-                    WHEN md.calibration_cycle LIKE '%天%' OR md.calibration_cycle LIKE '%日%' THEN
-                        CAST(REPLACE(REPLACE(md.calibration_cycle, '天', ''), '日', '') AS UNSIGNED)
-                    WHEN md.calibration_cycle LIKE '%月%' THEN
-                        CAST(REPLACE(md.calibration_cycle, '月', '') AS UNSIGNED) * 30
-                    WHEN md.calibration_cycle LIKE '%年%' THEN
-                        CAST(REPLACE(md.calibration_cycle, '年', '') AS UNSIGNED) * 365
-                    ELSE CAST(md.calibration_cycle AS UNSIGNED)
-                END DAY
-            ) <= DATE_ADD(CURDATE(), INTERVAL 7 DAY) THEN '即将到期'
+            WHEN md.next_calibration_due <= CURDATE() THEN '逾期未校准'
+            WHEN md.next_calibration_due <= DATE_ADD(CURDATE(), INTERVAL 7 DAY) THEN '即将到期'
             ELSE '正常'
         END as calibration_status
     FROM monitor_device md
@@ -214,43 +311,32 @@ CREATE PROCEDURE IF NOT EXISTS sp_generate_env_monitor_report(
     IN p_end_date DATE
 )
 BEGIN
+    -- 读天汇总表：按日期主键范围扫描，不再对原始数据逐行计算 DATE()
     SELECT
         ri.region_name,
         mi.indicator_name,
         mi.unit,
-        COUNT(*) as total_records,
-        AVG(ed.monitor_value) as avg_value,
-        MIN(ed.monitor_value) as min_value,
-        MAX(ed.monitor_value) as max_value,
-        SUM(CASE WHEN ed.is_abnormal = TRUE THEN 1 ELSE 0 END) as abnormal_count,
-        ROUND(SUM(CASE WHEN ed.is_abnormal = TRUE THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 2) as abnormal_rate,
-        SUM(CASE WHEN ed.data_quality = '优' THEN 1 ELSE 0 END) as excellent_count,
-        SUM(CASE WHEN ed.data_quality = '良' THEN 1 ELSE 0 END) as good_count,
-        SUM(CASE WHEN ed.data_quality = '中' THEN 1 ELSE 0 END) as medium_count,
-        SUM(CASE WHEN ed.data_quality = '差' THEN 1 ELSE 0 END) as poor_count
-    FROM environment_data ed
-    JOIN region_info ri ON ed.region_id = ri.region_id
-    JOIN monitor_indicator mi ON ed.indicator_id = mi.indicator_id
-    WHERE DATE(ed.collection_time) BETWEEN p_start_date AND p_end_date
+        SUM(d.record_count) as total_records,
+        SUM(d.value_sum) / NULLIF(SUM(d.value_count), 0) as avg_value,
+        MIN(d.value_min) as min_value,
+        MAX(d.value_max) as max_value,
+        SUM(d.abnormal_count) as abnormal_count,
+        ROUND(SUM(d.abnormal_count) * 100.0 / SUM(d.record_count), 2) as abnormal_rate,
+        SUM(d.excellent_count) as excellent_count,
+        SUM(d.good_count) as good_count,
+        SUM(d.medium_count) as medium_count,
+        SUM(d.poor_count) as poor_count
+    FROM environment_data_daily d
+    JOIN region_info ri ON d.region_id = ri.region_id
+    JOIN monitor_indicator mi ON d.indicator_id = mi.indicator_id
+    WHERE d.stat_date BETWEEN p_start_date AND p_end_date
     GROUP BY ri.region_name, mi.indicator_name, mi.unit
+    HAVING SUM(d.record_count) > 0
     ORDER BY ri.region_name, mi.indicator_name;
 END//
 DELIMITER ;
 
--- 3. 更新设备运行状态（每小时自动执行）
-DELIMITER //
-CREATE PROCEDURE IF NOT EXISTS sp_auto_update_device_status()
-BEGIN
-    -- 更新超过1小时未上报数据的设备为离线
-    UPDATE monitor_device md
-    SET operation_status = '离线',
-        status_update_time = NOW()
-    WHERE md.operation_status = '正常'
-    AND NOT EXISTS (
-        SELECT 1 FROM environment_data ed
-        WHERE ed.device_id = md.device_id
-        AND ed.collection_time >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
-    )
-    AND md.status_update_time <= DATE_SUB(NOW(), INTERVAL 1 HOUR);
-END//
-DELIMITER ;
\ No newline at end of file
+-- 3. 更新设备运行状态
+-- 设备在线状态由后端按上报心跳跟踪（按指标监测频率判定超时，状态变化批量写回），
+-- 不再需要对每台设备扫描 environment_data 的存储过程。
+DROP PROCEDURE IF EXISTS sp_auto_update_device_status;
\ No newline at end of file
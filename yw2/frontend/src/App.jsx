@@ -1,5 +1,5 @@
 // frontend/src/App.jsx
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import axios from 'axios';
 import './App.css';
 
@@ -7,8 +7,11 @@ import './App.css';
 import IndicatorManagement from './components/IndicatorManagement';
 import EnvironmentDataManagement from './components/EnvironmentDataManagement';
 import DeviceManagement from './components/DeviceManagement';
+import { subscribe, onStatusChange } from './liveStream';
 
 const API_BASE_URL = 'http://192.168.69.97:5001/api';
+// 最近数据列表的条数上限（与 /environment/data/recent 接口一致）
+const RECENT_DATA_LIMIT = 200;
 
 function App() {
   const [activeTab, setActiveTab] = useState('dashboard');
@@ -18,6 +21,10 @@ function App() {
   const [devicesNeedCalibration, setDevicesNeedCalibration] = useState([]);
   const [allDevices, setAllDevices] = useState([]);
   const [loading, setLoading] = useState(false);
+  // 上次完整检查警报时的版本号，版本号没变且没有待处理警报时跳过完整查询
+  const alertVersionRef = useRef({ version: 0, token: null, hasAlerts: false });
+  // 推送事件触发的重新加载定时器（按类型合并）
+  const reloadTimersRef = useRef({});
   const [dashboardStats, setDashboardStats] = useState({
     total_devices: 0,
     normal_devices: 0,
@@ -45,8 +52,34 @@ function App() {
 
   useEffect(() => {
     loadDashboardData();
-    startAutoRefresh();
-    startAlertCheck();
+    checkDeviceAlerts();
+
+    // 推送连接正常时由事件驱动刷新；连接中断时回退为定时轮询
+    let stopPolling = null;
+    const stopStatus = onStatusChange(connected => {
+      if (connected && stopPolling) {
+        stopPolling();
+        stopPolling = null;
+      } else if (!connected && !stopPolling) {
+        stopPolling = startPolling();
+      }
+    });
+    const unsubscribers = [
+      subscribe('readings', applyNewReadings),
+      subscribe('readings_bulk', () => scheduleReload('dashboard')),
+      subscribe('reset', () => {
+        scheduleReload('dashboard');
+        scheduleReload('alerts');
+      }),
+      subscribe('alert', () => scheduleReload('alerts')),
+      subscribe('device_status', applyDeviceStatus),
+      subscribe('reference', () => scheduleReload('devices'))
+    ];
+    return () => {
+      stopStatus();
+      unsubscribers.forEach(unsubscribe => unsubscribe());
+      if (stopPolling) stopPolling();
+    };
   }, []);
 
   // 当标签页切换时重新加载数据
@@ -56,24 +89,111 @@ function App() {
     }
   }, [activeTab]);
 
-  // 自动刷新数据
-  const startAutoRefresh = () => {
-    // 每5分钟刷新一次数据
-    setInterval(() => {
+  // 推送连接中断时的定时轮询，返回停止函数
+  const startPolling = () => {
+    // 每5分钟刷新一次数据，每30秒检查一次警报
+    const dataTimer = setInterval(() => {
       loadDashboardData();
     }, 5 * 60 * 1000);
-  };
-
-  // 检查设备警报
-  const startAlertCheck = () => {
-    // 每30秒检查一次警报
-    setInterval(() => {
+    const alertTimer = setInterval(() => {
       checkDeviceAlerts();
     }, 30 * 1000);
+    return () => {
+      clearInterval(dataTimer);
+      clearInterval(alertTimer);
+    };
+  };
+
+  // 短时间内的多个推送事件合并为一次重新加载
+  const scheduleReload = (kind) => {
+    if (reloadTimersRef.current[kind]) return;
+    reloadTimersRef.current[kind] = setTimeout(() => {
+      reloadTimersRef.current[kind] = null;
+      if (kind === 'dashboard') {
+        loadDashboardData();
+      } else if (kind === 'alerts') {
+        checkDeviceAlerts();
+      } else if (kind === 'devices') {
+        loadDeviceData();
+      }
+    }, 1000);
+  };
+
+  // 推送的新数据直接加入列表并累加统计，不重新查询
+  const applyNewReadings = ({ data = [] }) => {
+    if (data.length === 0) return;
+    const newest = [...data].reverse();
+    const abnormal = newest.filter(item => item.is_abnormal);
+    setRecentData(prev => [...newest, ...prev].slice(0, RECENT_DATA_LIMIT));
+    if (abnormal.length > 0) {
+      setAbnormalData(prev => [...abnormal, ...prev]);
+    }
+    setDashboardStats(prev => ({
+      ...prev,
+      total_data_count: prev.total_data_count + data.length,
+      total_abnormal_count: prev.total_abnormal_count + abnormal.length
+    }));
+  };
+
+  // 近期数据的条数和异常数随列表变化（推送的新数据加入列表后同步更新）
+  useEffect(() => {
+    setDashboardStats(prev => ({
+      ...prev,
+      recent_data_total: recentData.length,
+      recent_abnormal_count: recentData.filter(data => data.is_abnormal).length
+    }));
+  }, [recentData]);
+
+  // 设备在线状态变化：只在 正常 与 离线 之间切换（与后端写回的规则一致）
+  const applyDeviceStatus = ({ online = [], offline = [] }) => {
+    const onlineIds = new Set(online);
+    const offlineIds = new Set(offline);
+    setAllDevices(prev => prev.map(device => {
+      if (onlineIds.has(device.device_id) && device.operation_status === '离线') {
+        return { ...device, operation_status: '正常' };
+      }
+      if (offlineIds.has(device.device_id) && device.operation_status === '正常') {
+        return { ...device, operation_status: '离线' };
+      }
+      return device;
+    }));
+  };
+
+  // 设备相关数据（设备列表、状态统计、待校准设备）
+  const loadDeviceData = async () => {
+    try {
+      const deviceRes = await axios.get(`${API_BASE_URL}/devices/status-summary`);
+      if (deviceRes.data.success) {
+        setDeviceSummary(deviceRes.data.summary || []);
+      }
+      const allDevicesRes = await axios.get(`${API_BASE_URL}/devices/all`);
+      if (allDevicesRes.data.success) {
+        setAllDevices(allDevicesRes.data.devices || []);
+      }
+      const calibrationRes = await axios.get(`${API_BASE_URL}/devices/need-calibration`);
+      if (calibrationRes.data.success) {
+        setDevicesNeedCalibration(calibrationRes.data.devices || []);
+      }
+    } catch (error) {
+      console.error('加载设备数据失败:', error);
+    }
   };
 
   const checkDeviceAlerts = async () => {
     try {
+      // 先查询警报和设备数据的版本号（开销很小）
+      const changesRes = await axios.get(`${API_BASE_URL}/alerts/changes`, {
+        params: { since: alertVersionRef.current.version }
+      });
+      if (changesRes.data.success) {
+        const token = `${changesRes.data.version}:${changesRes.data.reference_version}`;
+        if (token === alertVersionRef.current.token && !alertVersionRef.current.hasAlerts) {
+          return;
+        }
+        alertVersionRef.current.version = changesRes.data.version;
+        alertVersionRef.current.token = token;
+      }
+
       // 获取所有设备状态
       const devicesRes = await axios.get(`${API_BASE_URL}/devices/all`);
       const devices = devicesRes.data.success ? devicesRes.data.devices : [];
@@ -105,6 +225,7 @@ function App() {
         });
 
         setDeviceAlerts(filteredAlertsRaw);
+        alertVersionRef.current.hasAlerts = filteredAlertsRaw.length > 0;
 
         // 如果有新警报且没有显示警报弹窗，显示第一个警报
         if (!showAlertModal && filteredAlerts.length > 0) {
@@ -118,6 +239,7 @@ function App() {
         }
       } else {
         setDeviceAlerts([]);
+        alertVersionRef.current.hasAlerts = false;
       }
     } catch (error) {
       console.error('检查设备警报失败:', error);
@@ -1,6 +1,7 @@
 // src/components/DeviceManagement.jsx
 import React, { useState, useEffect } from 'react';
 import axios from 'axios';
+import { subscribe, onStatusChange } from '../liveStream';
 
 const API_BASE_URL = 'http://192.168.69.97:5001/api';
 
@@ -28,16 +29,57 @@ const DeviceManagement = ({ onDeviceUpdate }) => {
     loadDevices();
     loadDropdownData();
 
-    // 启动实时更新
+    // 启动实时更新：设备变化由服务端推送，推送连接中断时每30秒轮询一次
     if (realTimeUpdates) {
-      const interval = setInterval(() => {
-        loadDevices();
-      }, 30000); // 每30秒更新一次
-
-      return () => clearInterval(interval);
+      let interval = null;
+      let reloadTimer = null;
+      const scheduleReload = () => {
+        if (reloadTimer) return;
+        reloadTimer = setTimeout(() => {
+          reloadTimer = null;
+          loadDevices();
+        }, 1000);
+      };
+      const stopStatus = onStatusChange(connected => {
+        if (connected && interval) {
+          clearInterval(interval);
+          interval = null;
+        } else if (!connected && !interval) {
+          interval = setInterval(() => {
+            loadDevices();
+          }, 30000);
+        }
+      });
+      const unsubscribers = [
+        subscribe('device_status', applyDeviceStatus),
+        subscribe('reference', scheduleReload),
+        subscribe('reset', scheduleReload)
+      ];
+
+      return () => {
+        stopStatus();
+        unsubscribers.forEach(unsubscribe => unsubscribe());
+        if (interval) clearInterval(interval);
+        if (reloadTimer) clearTimeout(reloadTimer);
+      };
     }
   }, [realTimeUpdates]);
 
+  // 设备在线状态变化：只在 正常 与 离线 之间切换（与后端写回的规则一致）
+  const applyDeviceStatus = ({ online = [], offline = [] }) => {
+    const onlineIds = new Set(online);
+    const offlineIds = new Set(offline);
+    setDevices(prev => prev.map(device => {
+      if (onlineIds.has(device.device_id) && device.operation_status === '离线') {
+        return { ...device, operation_status: '正常' };
+      }
+      if (offlineIds.has(device.device_id) && device.operation_status === '正常') {
+        return { ...device, operation_status: '离线' };
+      }
+      return device;
+    }));
+  };
+
   const loadDevices = async () => {
     setLoading(true);
     try {
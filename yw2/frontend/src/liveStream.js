@@ -0,0 +1,67 @@
+// frontend/src/liveStream.js
+// 实时推送订阅：整个页面共用一个 EventSource 连接，各组件按事件类型订阅
+// 事件：readings（新数据）、readings_bulk（批量写入的条数）、alert（提醒变化）、
+//       device_status（设备在线状态变化）、reference（设备/指标/区域变化）、reset（需要整体重新加载）
+
+const STREAM_URL = 'http://192.168.69.97:5002/api/stream';
+const EVENT_TYPES = ['readings', 'readings_bulk', 'alert', 'device_status', 'reference', 'reset'];
+// 服务不可用导致连接关闭后，间隔多久重新尝试连接
+const RECONNECT_DELAY_MS = 30 * 1000;
+
+let source = null;
+const handlers = {};
+const statusHandlers = new Set();
+let connected = false;
+
+const notifyStatus = (value) => {
+  connected = value;
+  statusHandlers.forEach(handler => handler(value));
+};
+
+const ensureConnected = () => {
+  if (source || typeof window.EventSource === 'undefined') {
+    return;
+  }
+  source = new window.EventSource(STREAM_URL);
+  source.onopen = () => notifyStatus(true);
+  source.onerror = () => {
+    // 网络中断时浏览器自动重连（带 Last-Event-ID 从断开处继续）；服务不可用时连接关闭
+    if (source.readyState === window.EventSource.CLOSED) {
+      source = null;
+      setTimeout(ensureConnected, RECONNECT_DELAY_MS);
+    }
+    notifyStatus(false);
+  };
+  EVENT_TYPES.forEach(type => {
+    source.addEventListener(type, (e) => {
+      let data = {};
+      try {
+        data = JSON.parse(e.data);
+      } catch (error) {
+        console.error('解析推送事件失败:', error);
+        return;
+      }
+      (handlers[type] || []).forEach(handler => handler(data));
+    });
+  });
+};
+
+// 订阅事件，返回取消订阅的函数
+export const subscribe = (type, handler) => {
+  handlers[type] = handlers[type] || [];
+  handlers[type].push(handler);
+  ensureConnected();
+  return () => {
+    handlers[type] = handlers[type].filter(h => h !== handler);
+  };
+};
+
+// 订阅连接状态：handler(true) 已连接，handler(false) 连接中断（此时组件应回退为定时轮询）
+export const onStatusChange = (handler) => {
+  statusHandlers.add(handler);
+  ensureConnected();
+  handler(connected);
+  return () => statusHandlers.delete(handler);
+};
+
+export const isSupported = () => typeof window.EventSource !== 'undefined';